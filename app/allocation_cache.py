@@ -0,0 +1,259 @@
+from collections import OrderedDict
+from datetime import date
+from sqlalchemy import event, insert, update
+from sqlalchemy.orm import Session
+from app import routing
+from app.capacity_calendar import CapacityCalendar
+from app.models import DataVersion
+from app.routing import RoutingContext, load_override_map, route_day
+import os
+import threading
+
+# Number of (date, engine, data version) results kept per process
+ALLOCATION_CACHE_SIZE = int(os.getenv("ALLOCATION_CACHE_SIZE", "64"))
+
+_lock = threading.Lock()
+_data_version = None  # The stored version this process's caches were built at; None until first read
+_entries = OrderedDict()
+_context = None
+_calendar = None
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+# Session.info key marking a session whose open transaction has bumped the stored version
+_BUMPED = "data_version_bumped"
+
+
+def _read_version(db: Session):
+    return db.query(DataVersion.version).filter(DataVersion.id == 1).scalar() or 0
+
+
+def _write_version(db: Session, master: bool = False):
+    """Increment the stored version in db's transaction and return the new value.
+
+    master also moves master_version to it, for writes that affect every
+    date and so make every stored draft plan stale.
+    """
+    values = {"version": DataVersion.version + 1}
+    if master:
+        values["master_version"] = DataVersion.version + 1
+    version = db.execute(
+        update(DataVersion).where(DataVersion.id == 1).values(**values).returning(DataVersion.version)
+    ).scalar()
+    if version is None:
+        # Databases not yet upgraded have no counter row
+        version = 1
+        db.execute(insert(DataVersion).values(id=1, version=version, master_version=version if master else 0))
+    db.info[_BUMPED] = True
+    return version
+
+
+def _clear():
+    global _context, _calendar
+    _context = None
+    _calendar = None
+    _entries.clear()
+
+
+def _sync(db: Session):
+    """The stored version, dropping every cache built at another one. Returns it.
+
+    The version lives in the database so that a write in any worker
+    process, or in the watched-folder importer, reaches every other worker
+    on its next lookup.
+    """
+    global _data_version
+    version = _read_version(db)
+    with _lock:
+        if version != _data_version:
+            _clear()
+            _data_version = version
+    return version
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed(session):
+    session.info.pop(_BUMPED, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _bump_rolled_back(session):
+    """Forget caches retagged to a version that was never committed, as another write may commit it with other data"""
+    global _data_version
+    if session.info.pop(_BUMPED, None):
+        with _lock:
+            _clear()
+            _data_version = None
+
+
+def bump_data_version(db: Session):
+    """Mark every cached plan stale, in every worker. Call in the transaction of any write that affects routing, before its commit."""
+    global _data_version
+    version = _write_version(db, master=True)
+    with _lock:
+        _clear()
+        _data_version = version
+
+
+def current_data_version(db: Session):
+    """The current stamp, for callers that persist plans outside the cache"""
+    return _sync(db)
+
+
+def master_data_version(db: Session):
+    """The stamp of the last bump_data_version; stored draft plans routed before it are stale"""
+    return db.query(DataVersion.master_version).filter(DataVersion.id == 1).scalar() or 0
+
+
+def get_routing_context(db: Session):
+    """RoutingContext for the current data version, loaded on first use"""
+    global _context
+    version = _sync(db)
+    with _lock:
+        if _context is not None and _context[0] == version:
+            return _context[1]
+
+    context = RoutingContext.load(db)
+
+    with _lock:
+        if version == _data_version:
+            _context = (version, context)
+    return context
+
+
+def get_capacity_calendar(db: Session):
+    """CapacityCalendar for the current data version, loaded on first use"""
+    global _calendar
+    version = _sync(db)
+    with _lock:
+        if _calendar is not None and _calendar[0] == version:
+            return _calendar[1]
+
+    calendar = CapacityCalendar.load(db)
+
+    with _lock:
+        if version == _data_version:
+            _calendar = (version, calendar)
+    return calendar
+
+
+def get_cached_allocations(db: Session, selected_date: date):
+    """get_allocations with results shared between pages until the data changes.
+
+    Cached lists are shared between requests, so callers must filter into new
+    lists rather than mutate them.
+    """
+    state = get_cached_state(db, selected_date)
+    return state.allocations, state.depot_summaries
+
+
+def get_cached_state(db: Session, selected_date: date, engine: str = None):
+    """The AllocationState for a date and engine at the current data version"""
+    engine = engine or routing.ROUTING_ENGINE
+    version = _sync(db)
+    with _lock:
+        key = (selected_date, engine, version)
+        state = _entries.get(key)
+        if state is not None:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return state
+        _stats["misses"] += 1
+
+    state = route_day(
+        db, selected_date, context=get_routing_context(db), engine=engine, calendar=get_capacity_calendar(db)
+    )
+    _store(key, state)
+    return state
+
+
+def _store(key, state):
+    with _lock:
+        # A write may have landed while we were routing; don't cache a stale plan
+        if key[-1] != _data_version:
+            return
+        _entries[key] = state
+        _entries.move_to_end(key)
+        while len(_entries) > ALLOCATION_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def override_changed(db: Session, override_date: date):
+    """Bump the stamp for a manual override add/delete, keeping what is still valid. Call before committing it.
+
+    Overrides only affect their own date, so other dates' plans are carried
+    forward to the new stamp in this process; other workers drop theirs. If
+    the changed date is cached its plan is replayed from the first affected
+    trailer instead of being re-routed.
+    """
+    global _data_version, _context, _calendar
+    version = _write_version(db)
+    with _lock:
+        # Only carry forward from the version just before ours; anything older may predate other writes
+        previous = _data_version if _data_version == version - 1 else None
+        _data_version = version
+        if _context is not None and _context[0] == previous:
+            _context = (_data_version, _context[1])
+        if _calendar is not None and _calendar[0] == previous:
+            _calendar = (_data_version, _calendar[1])
+
+        replay = []
+        carried = OrderedDict()
+        for (entry_date, engine, entry_version), entry in _entries.items():
+            if entry_version != previous:
+                continue
+            if entry_date == override_date:
+                replay.append(((entry_date, engine, _data_version), entry))
+            else:
+                carried[(entry_date, engine, _data_version)] = entry
+        _entries.clear()
+        _entries.update(carried)
+
+    if replay:
+        # Read in the write's transaction, so it sees the change being committed
+        override_map = load_override_map(db, override_date)
+        for key, state in replay:
+            _store(key, state.with_overrides(override_map))
+
+
+def dates_changed(db: Session, dates):
+    """Bump the stamp for a write that only affects the given dates, such as capacity overrides. Call before committing it.
+
+    Cached plans for other dates and the routing context are carried
+    forward to the new stamp in this process; only the changed dates are
+    routed again. The capacity calendar is reloaded, as it holds the
+    single-date overrides.
+    """
+    global _data_version, _context, _calendar
+    dates = set(dates)
+    version = _write_version(db)
+    with _lock:
+        previous = _data_version if _data_version == version - 1 else None
+        _data_version = version
+        if _context is not None and _context[0] == previous:
+            _context = (_data_version, _context[1])
+
+        carried = OrderedDict(
+            ((entry_date, engine, _data_version), entry)
+            for (entry_date, engine, entry_version), entry in _entries.items()
+            if entry_version == previous and entry_date not in dates
+        )
+        _calendar = None
+        _entries.clear()
+        _entries.update(carried)
+
+
+def cache_stats():
+    """Hit/miss counters and current size, for the admin stats endpoint"""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "data_version": _data_version,
+            "entries": len(_entries),
+            "max_entries": ALLOCATION_CACHE_SIZE,
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "evictions": _stats["evictions"],
+            "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else 0
+        }
@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import NamedTuple
+from app.capacity_calendar import CapacityCalendar
+from app.database import SessionLocal, engine as db_engine
+from app.models import AllocationRun, DailyVolume
+from app.plans import save_plan
+from app.routing import ROUTING_ENGINE, RoutingContext, route_day
+import argparse
+import os
+import time
+
+# Worker processes for date-range routing; one per core unless set
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "0")) or os.cpu_count() or 1
+
+# Per-process session and routing context, set up once by _init_worker
+_worker = {}
+
+
+class DateResult(NamedTuple):
+    """One routed date as sent back from a worker"""
+    date: date
+    allocations: list
+    depot_summaries: list
+    engine: str
+    seconds: float
+
+
+def _init_worker():
+    """Give each worker its own connections, routing context and capacity calendar"""
+    # Connections inherited from the parent can't be shared across processes
+    db_engine.dispose(close=False)
+    db = SessionLocal()
+    _worker["db"] = db
+    _worker["context"] = RoutingContext.load(db)
+    _worker["calendar"] = CapacityCalendar.load(db)
+
+
+def _route_date(selected_date: date, engine: str):
+    started = time.perf_counter()
+    state = route_day(
+        _worker["db"], selected_date, context=_worker["context"], engine=engine, calendar=_worker["calendar"]
+    )
+    _worker["db"].rollback()
+    return DateResult(selected_date, state.allocations, state.depot_summaries, state.engine, time.perf_counter() - started)
+
+
+def dates_with_volumes(db, start: date, end: date):
+    """Dates in the inclusive range that have volumes to route"""
+    rows = db.query(DailyVolume.date).filter(
+        DailyVolume.date >= start,
+        DailyVolume.date <= end
+    ).distinct().order_by(DailyVolume.date).all()
+    return [r[0] for r in rows]
+
+
+def allocate_date_range(start: date, end: date, workers: int = None, engine: str = None):
+    """Route every date in the range across a process pool, yielding each DateResult as it finishes.
+
+    Dates are independent, so each is routed in full by one worker against
+    that worker's own RoutingContext. Results arrive in completion order.
+    """
+    engine = engine or ROUTING_ENGINE
+    db = SessionLocal()
+    try:
+        dates = dates_with_volumes(db, start, end)
+    finally:
+        db.close()
+    if not dates:
+        return
+
+    workers = min(workers or BATCH_WORKERS, len(dates))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(_route_date, d, engine) for d in dates]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def save_results(db, results):
+    """Store each result as a draft plan, leaving published plans untouched. Yields (result, saved)."""
+    for result in results:
+        published = db.query(AllocationRun.id).filter(
+            AllocationRun.date == result.date,
+            AllocationRun.status == "Published"
+        ).first()
+        if published:
+            yield result, False
+            continue
+        save_plan(db, result.date, result)
+        yield result, True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Route a range of dates in parallel")
+    parser.add_argument("start", help="First date, YYYY-MM-DD")
+    parser.add_argument("end", help="Last date, YYYY-MM-DD (inclusive)")
+    parser.add_argument("--workers", type=int, default=None, help=f"Worker processes (default {BATCH_WORKERS})")
+    parser.add_argument("--engine", default=None, help=f"Routing engine (default {ROUTING_ENGINE})")
+    parser.add_argument("--save", action="store_true", help="Store each date as a draft plan")
+    args = parser.parse_args(argv)
+
+    start = datetime.strptime(args.start, "%Y-%m-%d").date()
+    end = datetime.strptime(args.end, "%Y-%m-%d").date()
+
+    started = time.perf_counter()
+    results = allocate_date_range(start, end, workers=args.workers, engine=args.engine)
+
+    db = SessionLocal()
+    try:
+        stream = save_results(db, results) if args.save else ((r, False) for r in results)
+        routed = 0
+        for result, saved in stream:
+            routed += 1
+            peaks = sum(1 for a in result.allocations if a['is_peak_arrival'])
+            cost = sum(a['cost'] for a in result.allocations)
+            note = " (saved)" if saved else " (published, not saved)" if args.save else ""
+            print(f"{result.date}  {len(result.allocations):6d} trailers  £{cost:12,.2f}  "
+                  f"{peaks:4d} peak  {result.seconds:6.2f}s{note}", flush=True)
+    finally:
+        db.close()
+
+    print(f"Routed {routed} dates in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from datetime import date, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import CollectionPoint
+from app.readers import iter_chunks
+from app.volume_import import import_volume_chunks
+import argparse
+import numpy as np
+import os
+import pandas as pd
+import tempfile
+import time
+
+FORMATS = ["xlsx", "csv", "ndjson", "parquet"]
+
+
+def synthetic_volumes(rows: int, cps: int = 2000, seed: int = 0):
+    """A volume file's worth of lines spread over enough dates that every (date, CPID) is unique"""
+    rng = np.random.default_rng(seed)
+    line = np.arange(rows)
+    start = date(2026, 1, 1)
+    return pd.DataFrame({
+        "Date": [(start + timedelta(days=int(d))).isoformat() for d in line // cps],
+        "CPID": [f"CP{c:05d}" for c in line % cps],
+        "Parcels": rng.integers(0, 3000, rows),
+        "Trailers": rng.integers(1, 4, rows),
+        "Collection Time": [f"{h:02d}:{m:02d}" for h, m in zip(rng.integers(6, 20, rows), rng.choice([0, 15, 30, 45], rows))],
+    }), cps
+
+
+def write_file(df: pd.DataFrame, fmt: str, folder: str):
+    """Write df in one import format, returning its path, or None if the writer isn't installed"""
+    path = os.path.join(folder, f"volumes.{fmt}")
+    if fmt == "xlsx":
+        df.to_excel(path, index=False)
+    elif fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "ndjson":
+        df.to_json(path, orient="records", lines=True)
+    elif fmt == "parquet":
+        try:
+            df.to_parquet(path, index=False)
+        except ImportError:
+            return None
+    return path
+
+
+def _scratch_session(cps: int):
+    """In-memory database holding just the CPs the synthetic file refers to"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.execute(insert(CollectionPoint), [
+        {"cpid": f"CP{c:05d}", "name": f"CP {c}", "latitude": 52.0, "longitude": -1.0} for c in range(cps)
+    ])
+    db.commit()
+    return db
+
+
+def bench_format(path: str, cps: int, chunk_rows: int = None):
+    """(read seconds, import seconds, rows imported) for one file.
+
+    Reading alone is timed first, then a full import (read, validate, bulk
+    insert) into a fresh in-memory database, so the difference is the
+    format-independent stage.
+    """
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        for _ in iter_chunks(f, path, chunk_rows):
+            pass
+    read_seconds = time.perf_counter() - started
+
+    db = _scratch_session(cps)
+    try:
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            result = import_volume_chunks(db, iter_chunks(f, path, chunk_rows))
+        db.commit()
+        import_seconds = time.perf_counter() - started
+    finally:
+        db.close()
+    return read_seconds, import_seconds, result.imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare volume import throughput across file formats")
+    parser.add_argument("--rows", type=int, default=50000, help="Lines in the synthetic file (default 50000)")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="Lines per chunk (default IMPORT_CHUNK_ROWS)")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="Comma-separated formats to run")
+    args = parser.parse_args(argv)
+
+    df, cps = synthetic_volumes(args.rows)
+    print(f"{'format':8s} {'size MB':>8s} {'read s':>8s} {'rows/s':>10s} {'import s':>9s} {'rows/s':>10s}")
+    with tempfile.TemporaryDirectory() as folder:
+        for fmt in args.formats.split(","):
+            path = write_file(df, fmt, folder)
+            if path is None:
+                print(f"{fmt:8s} skipped, writer not installed")
+                continue
+            try:
+                read_s, import_s, imported = bench_format(path, cps, args.chunk_rows)
+            except ValueError as e:
+                print(f"{fmt:8s} skipped, {e}")
+                continue
+            size = os.path.getsize(path) / 1e6
+            print(f"{fmt:8s} {size:8.2f} {read_s:8.2f} {args.rows / read_s:10,.0f} "
+                  f"{import_s:9.2f} {imported / import_s:10,.0f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
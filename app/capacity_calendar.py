@@ -0,0 +1,119 @@
+from bisect import bisect_right
+from datetime import date
+from typing import NamedTuple
+from sqlalchemy.orm import Session
+from app.models import CapacityOverride, CapacityRule
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+class CapacitySource(NamedTuple):
+    """Where a depot's capacity for a date comes from"""
+    capacity: int
+    kind: str  # "override" (single date) or "rule" (range or recurring)
+    id: int
+    reason: str
+
+
+def parse_weekdays(value):
+    """Weekday numbers (Monday 0) from a stored "0,5" string; None means every day"""
+    if not value:
+        return None
+    return frozenset(int(v) for v in value.split(","))
+
+
+def format_weekdays(value):
+    days = parse_weekdays(value)
+    if days is None:
+        return "Every day"
+    return ", ".join(WEEKDAY_NAMES[d] for d in sorted(days))
+
+
+class _DepotRules:
+    """Interval index over one depot's rules.
+
+    Rule start and end dates split the calendar into segments in which the
+    same rules apply. Each segment stores the winning source for each
+    weekday, so a lookup is one bisect on the segment starts plus an index.
+    """
+
+    def __init__(self, rules):
+        # rules: (start ordinal, end ordinal or None, weekdays or None, CapacitySource), highest priority first
+        bounds = sorted({r[0] for r in rules} | {r[1] + 1 for r in rules if r[1] is not None})
+        self.starts = bounds
+        self.segments = []
+        for position, start in enumerate(bounds):
+            end = bounds[position + 1] - 1 if position + 1 < len(bounds) else None
+            covering = [
+                r for r in rules
+                if r[0] <= start and (r[1] is None or (end is not None and r[1] >= end))
+            ]
+            self.segments.append(tuple(
+                next((r[3] for r in covering if r[2] is None or weekday in r[2]), None)
+                for weekday in range(7)
+            ))
+
+    def lookup(self, on_date: date):
+        position = bisect_right(self.starts, on_date.toordinal()) - 1
+        if position < 0:
+            return None
+        return self.segments[position][on_date.weekday()]
+
+
+class CapacityCalendar:
+    """Effective depot capacity on any date from single-date overrides and range/recurring rules.
+
+    A single-date override beats any rule; among rules covering the same
+    date the most recently created wins. Depots with neither keep their
+    normal daily capacity.
+    """
+
+    def __init__(self, overrides, rules):
+        self.overrides = {(o.depot_id, o.date): CapacitySource(o.override_capacity, "override", o.id, o.reason or "") for o in overrides}
+
+        by_depot = {}
+        for r in sorted(rules, key=lambda r: r.id, reverse=True):
+            by_depot.setdefault(r.depot_id, []).append((
+                r.start_date.toordinal(),
+                r.end_date.toordinal() if r.end_date else None,
+                parse_weekdays(r.weekdays),
+                CapacitySource(r.override_capacity, "rule", r.id, r.reason or ""),
+            ))
+        self.rules = {depot_id: _DepotRules(depot_rules) for depot_id, depot_rules in by_depot.items()}
+
+    @classmethod
+    def load(cls, db: Session):
+        """Every override and rule, read with one query each"""
+        overrides = db.query(
+            CapacityOverride.id, CapacityOverride.date, CapacityOverride.depot_id,
+            CapacityOverride.override_capacity, CapacityOverride.reason
+        ).all()
+        rules = db.query(
+            CapacityRule.id, CapacityRule.depot_id, CapacityRule.start_date, CapacityRule.end_date,
+            CapacityRule.weekdays, CapacityRule.override_capacity, CapacityRule.reason
+        ).all()
+        return cls(overrides, rules)
+
+    def source(self, depot_id: str, on_date: date):
+        """The CapacitySource setting a depot's capacity on a date, or None for its normal capacity"""
+        override = self.overrides.get((depot_id, on_date))
+        if override is not None:
+            return override
+        depot_rules = self.rules.get(depot_id)
+        return depot_rules.lookup(on_date) if depot_rules else None
+
+    def capacity(self, depot_id: str, on_date: date, normal_capacity: int):
+        found = self.source(depot_id, on_date)
+        return normal_capacity if found is None else found.capacity
+
+    def capacities(self, depots, on_date: date):
+        """{depot_id: capacity} for rows with depot_id and daily_capacity, one lookup per depot"""
+        return {d.depot_id: self.capacity(d.depot_id, on_date, d.daily_capacity) for d in depots}
+
+
+def rule_applies(rule, on_date: date):
+    """Whether a CapacityRule covers a date, for finding the stored plans it affects"""
+    if on_date < rule.start_date or (rule.end_date and on_date > rule.end_date):
+        return False
+    days = parse_weekdays(rule.weekdays)
+    return days is None or on_date.weekday() in days
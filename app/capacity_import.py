@@ -0,0 +1,122 @@
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models import AuditLog, CapacityOverride, Depot
+from app.volume_import import MAX_REPORTED_ERRORS, parse_dates
+import pandas as pd
+
+# Matches the columns of /download-template/capacity
+REQUIRED_COLUMNS = ['Date', 'DepotID', 'OverrideCapacity']
+REASON_COLUMN = 'Reason'
+
+
+class CapacityImport(NamedTuple):
+    """Outcome of validating, and if clean importing, one capacity override file"""
+    created: int
+    updated: int
+    errors: pd.DataFrame  # Row (source line number), Error; the first MAX_REPORTED_ERRORS
+    error_count: int
+    dates: set
+
+
+def validate_capacity(db: Session, df: pd.DataFrame):
+    """Check each line has a valid date, an active depot and a whole capacity of zero or more.
+
+    df is indexed by source line number. Returns (rows, errors): rows with
+    date, depot_id, override_capacity and reason columns for every valid
+    line, and the first problem on each invalid line. A depot repeated for
+    the same date is an error, as the file would contradict itself.
+    """
+    rows = pd.DataFrame(index=df.index)
+    rows['date'] = parse_dates(df['Date'])
+    rows['depot_id'] = df['DepotID'].astype(str).str.strip()
+    capacity = pd.to_numeric(df['OverrideCapacity'], errors='coerce')
+    if REASON_COLUMN in df.columns:
+        rows['reason'] = df[REASON_COLUMN].where(df[REASON_COLUMN].notna(), "").astype(str).str.strip().str[:255]
+    else:
+        rows['reason'] = ""
+
+    active_depots = {d for (d,) in db.query(Depot.depot_id).filter(Depot.is_active == True)}
+
+    # Checked in order; each line reports the first that fails
+    checks = [
+        (rows['date'].isna(), "Invalid date"),
+        (~rows['depot_id'].isin(active_depots), None),
+        (capacity.isna() | (capacity < 0) | (capacity != capacity.round()), "Invalid capacity"),
+    ]
+    messages = pd.Series(None, index=df.index, dtype=object)
+    for failed, message in checks:
+        failed = failed & messages.isna()
+        if message is None:
+            messages[failed] = "Depot '" + rows.loc[failed, 'depot_id'] + "' not found or inactive"
+        else:
+            messages[failed] = message
+
+    repeated = rows[messages.isna()].duplicated(subset=['date', 'depot_id'], keep='first')
+    messages[repeated[repeated].index] = "Repeats an earlier line for the same depot and date"
+
+    invalid = messages.notna()
+    errors = pd.DataFrame({'Row': df.index[invalid], 'Error': messages[invalid].tolist()})
+
+    rows['override_capacity'] = capacity
+    rows = rows[~invalid].astype({'override_capacity': 'int64'})
+    return rows, errors
+
+
+def upsert_statement(db: Session):
+    """INSERT for CapacityOverride that replaces the stored override for a clashing (date, depot_id)"""
+    statement = dialect_insert(db, CapacityOverride)
+    return statement.on_conflict_do_update(
+        index_elements=['date', 'depot_id'],
+        set_={
+            column: statement.excluded[column]
+            for column in ('override_capacity', 'reason', 'created_by', 'created_at')
+        }
+    )
+
+
+def import_capacity_overrides(db: Session, df: pd.DataFrame, user_id: int, ip_address: str = None):
+    """Validate a whole capacity file, then upsert its overrides in one statement with their audit entries. Caller commits.
+
+    Nothing is written unless every line is valid. An override for a depot
+    and date that already has one replaces it. Stored values are read
+    first, with one query, only to write the audit entries.
+    """
+    rows, errors = validate_capacity(db, df)
+    if not errors.empty:
+        return CapacityImport(0, 0, errors.head(MAX_REPORTED_ERRORS), len(errors), set())
+    if rows.empty:
+        return CapacityImport(0, 0, errors, 0, set())
+
+    dates = set(rows['date'])
+    stored = {
+        (o.date, o.depot_id): o.override_capacity
+        for o in db.query(CapacityOverride.date, CapacityOverride.depot_id, CapacityOverride.override_capacity)
+        .filter(CapacityOverride.date.in_(list(dates)), CapacityOverride.depot_id.in_(rows['depot_id'].unique().tolist()))
+    }
+    normal = {d.depot_id: d.daily_capacity for d in db.query(Depot.depot_id, Depot.daily_capacity)}
+
+    created_at = datetime.utcnow()
+    records = rows.assign(created_by=user_id, created_at=created_at).to_dict('records')
+    db.execute(upsert_statement(db), records)
+
+    audits = []
+    for r in records:
+        key = (r['date'], r['depot_id'])
+        replaced = key in stored
+        audits.append({
+            'timestamp': created_at,
+            'user_id': user_id,
+            'action_type': "CAPACITY_OVERRIDE_UPDATED" if replaced else "CAPACITY_OVERRIDE_CREATED",
+            'entity_type': "CapacityOverride",
+            'entity_id': f"{r['depot_id']}-{r['date']}",
+            'old_value': f"Was overridden to {stored[key]}" if replaced else f"Original: {normal.get(r['depot_id'])}",
+            'new_value': f"Override: {r['override_capacity']}. Reason: {r['reason']} (bulk import)",
+            'ip_address': ip_address
+        })
+    db.execute(insert(AuditLog), audits)
+
+    updated = sum(1 for r in records if (r['date'], r['depot_id']) in stored)
+    return CapacityImport(len(records) - updated, updated, errors, 0, dates)
@@ -0,0 +1,181 @@
+from sqlalchemy.orm import Session
+from app.models import CPDepotDistance
+from app.distance_providers import haversine_travel_minutes
+import json
+import numpy as np
+import os
+import struct
+import tempfile
+import threading
+
+# Binary copy of cp_depot_distances that workers map read-only; empty disables it
+DISTANCE_ARTIFACT_PATH = os.getenv("DISTANCE_ARTIFACT_PATH", "data/cp_depot_distances.bin")
+
+MAGIC = b"DXDM"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHHIII")  # magic, version, reserved, CP count, depot count, index length
+ALIGNMENT = 64
+
+_lock = threading.Lock()
+_mapped = None
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class DistanceArtifact:
+    """A read-only memory map of the ranked distance table.
+
+    Layout: a fixed header, a JSON index of CPIDs and depot IDs, then three
+    CP x depot matrices, each 64-byte aligned: float32 distances, float64
+    travel minutes and the int16 depot columns of each CP in rank order,
+    padded with -1. Every
+    worker maps the same file, so the pages are shared between processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        stat = os.stat(path)
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, _, n_cps, n_depots, index_length = HEADER.unpack(bytes(buffer[:HEADER.size]))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} distance artifact")
+
+        index = json.loads(bytes(buffer[HEADER.size:HEADER.size + index_length]).decode("utf-8"))
+        self.cpids = index["cpids"]
+        self.depot_ids = index["depot_ids"]
+        self.cp_index = {cpid: i for i, cpid in enumerate(self.cpids)}
+
+        offset = _aligned(HEADER.size + index_length)
+        cells = n_cps * n_depots
+        self.distance = buffer[offset:offset + cells * 4].view(np.float32).reshape(n_cps, n_depots)
+        offset = _aligned(offset + cells * 4)
+        self.travel = buffer[offset:offset + cells * 8].view(np.float64).reshape(n_cps, n_depots)
+        offset = _aligned(offset + cells * 8)
+        self.rank_order = buffer[offset:offset + cells * 2].view(np.int16).reshape(n_cps, n_depots)
+
+    def ranked(self, cpid):
+        """(depot_ids, distances, travel_minutes) for a CP in rank order, as RoutingContext.ranked_depots returns them"""
+        row = self.cp_index.get(cpid)
+        if row is None:
+            return (), (), ()
+        order = self.rank_order[row]
+        columns = order[order >= 0]
+        depot_ids = tuple(self.depot_ids[c] for c in columns.tolist())
+        # Stored distances have two decimals; rounding undoes the float32 error
+        distances = tuple(round(float(d), 2) for d in self.distance[row, columns])
+        return depot_ids, distances, tuple(self.travel[row, columns].tolist())
+
+
+def write_artifact(path, rows):
+    """Write (cpid, depot_id, distance_miles, travel_minutes) rows, already in (cpid, rank) order, and swap the file in atomically"""
+    cpids = []
+    depot_ids = sorted({r[1] for r in rows})
+    if len(depot_ids) > np.iinfo(np.int16).max:
+        raise ValueError("Too many depots for an int16 rank order")
+    depot_index = {did: i for i, did in enumerate(depot_ids)}
+
+    ranked = {}
+    for cpid, depot_id, distance_miles, travel_minutes in rows:
+        if cpid not in ranked:
+            cpids.append(cpid)
+            ranked[cpid] = []
+        if travel_minutes is None:
+            travel_minutes = haversine_travel_minutes(distance_miles)
+        ranked[cpid].append((depot_index[depot_id], distance_miles, travel_minutes))
+
+    n_cps, n_depots = len(cpids), len(depot_ids)
+    distance = np.full((n_cps, n_depots), np.nan, dtype=np.float32)
+    travel = np.full((n_cps, n_depots), np.nan, dtype=np.float64)
+    rank_order = np.full((n_cps, n_depots), -1, dtype=np.int16)
+    for row, cpid in enumerate(cpids):
+        seen = set()
+        position = 0
+        for col, distance_miles, travel_minutes in ranked[cpid]:
+            # A CP/depot pair appears once in the matrix; the first (best ranked) row wins
+            if col in seen:
+                continue
+            seen.add(col)
+            distance[row, col] = distance_miles
+            travel[row, col] = travel_minutes
+            rank_order[row, position] = col
+            position += 1
+
+    index = json.dumps({"cpids": cpids, "depot_ids": depot_ids}).encode("utf-8")
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, n_cps, n_depots, len(index))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".distances-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(index)
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(distance.tobytes())
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(travel.tobytes())
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(rank_order.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o644)
+        # Readers that already mapped the old file keep it until they re-map
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def build_artifact(db: Session, path: str = None):
+    """Rebuild the artifact from cp_depot_distances. Call after any change to CPs, depots or distances."""
+    path = DISTANCE_ARTIFACT_PATH if path is None else path
+    if not path:
+        return
+    rows = db.query(
+        CPDepotDistance.cpid, CPDepotDistance.depot_id, CPDepotDistance.distance_miles, CPDepotDistance.travel_minutes
+    ).order_by(CPDepotDistance.cpid, CPDepotDistance.rank).all()
+    write_artifact(path, rows)
+
+
+def load_artifact():
+    """The mapped artifact, re-mapped if the file has been swapped since; None if there isn't one"""
+    global _mapped
+    path = DISTANCE_ARTIFACT_PATH
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        if _mapped is not None and _mapped.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return _mapped
+    artifact = DistanceArtifact(path)
+    with _lock:
+        _mapped = artifact
+    return artifact
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import SessionLocal
+
+    if len(sys.argv) != 2 or sys.argv[1] != "build":
+        print("Usage: python -m app.distance_artifact build")
+        sys.exit(2)
+
+    if not DISTANCE_ARTIFACT_PATH:
+        print("DISTANCE_ARTIFACT_PATH is empty; nothing to build.")
+        sys.exit(0)
+
+    db = SessionLocal()
+    build_artifact(db)
+    db.close()
+    artifact = load_artifact()
+    print(f"Wrote {DISTANCE_ARTIFACT_PATH}: {len(artifact.cpids)} CPs x {len(artifact.depot_ids)} depots")
@@ -0,0 +1,156 @@
+from app.distances import haversine_matrix, haversine_miles
+from app.spatial import unit_vectors
+import numpy as np
+import os
+import time
+
+# Where CP -> depot distances and travel times come from: "haversine" (straight line at a
+# flat speed) or "road" (shortest paths over the graph at ROAD_GRAPH_PATH)
+DISTANCE_PROVIDER = os.getenv("DISTANCE_PROVIDER", "haversine")
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "data/road_graph.npz")
+
+# Straight-line travel speed, also used for the legs between a location and the road network
+HAVERSINE_SPEED_MPH = 40
+
+_providers = {}
+
+
+def haversine_travel_minutes(distance_miles):
+    """Travel minutes at the flat straight-line speed"""
+    return (distance_miles / HAVERSINE_SPEED_MPH) * 60
+
+
+class HaversineProvider:
+    """Great-circle distance, travelled at HAVERSINE_SPEED_MPH"""
+
+    name = "haversine"
+
+    def matrix(self, cps, depots):
+        """(miles, minutes) for every CP (rows) to every depot (columns).
+
+        cps and depots are sequences of (id, latitude, longitude). minutes is
+        None: travel time follows from the stored, rounded distance.
+        """
+        miles = haversine_matrix([c[1] for c in cps], [c[2] for c in cps], [d[1] for d in depots], [d[2] for d in depots])
+        return miles, None
+
+
+def _edge_graph(node_count, sources, targets, weights):
+    """CSR adjacency keeping the cheapest of any parallel edges, transposed so searches run towards a node"""
+    from scipy.sparse import csr_matrix
+
+    order = np.lexsort((weights, targets, sources))
+    sources, targets, weights = sources[order], targets[order], weights[order]
+    first = np.ones(len(sources), dtype=bool)
+    first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+
+    # csgraph drops zero-weight entries as missing edges
+    weights = np.maximum(weights[first], 1e-9)
+    return csr_matrix((weights, (targets[first], sources[first])), shape=(node_count, node_count))
+
+
+class RoadGraphProvider:
+    """Shortest road distance and fastest road time over a local graph file.
+
+    The file is an .npz exported from OpenStreetMap with node_lat, node_lon
+    and directed edges as edge_from, edge_to (node indices), edge_miles and
+    edge_minutes; two-way roads appear once in each direction. CPs and
+    depots are snapped to their nearest node and the leg to it is counted at
+    the straight-line speed. Each depot gets one Dijkstra search towards it
+    per weight, which covers every CP at once, so the full matrix costs two
+    searches per depot rather than one per pair. Pairs the graph cannot
+    connect fall back to straight-line values.
+    """
+
+    name = "road"
+
+    def __init__(self, path):
+        from scipy.spatial import cKDTree
+
+        with np.load(path) as data:
+            self.node_lat = data["node_lat"].astype(np.float64)
+            self.node_lon = data["node_lon"].astype(np.float64)
+            sources = data["edge_from"].astype(np.int64)
+            targets = data["edge_to"].astype(np.int64)
+            edge_miles = data["edge_miles"].astype(np.float64)
+            edge_minutes = data["edge_minutes"].astype(np.float64)
+
+        node_count = len(self.node_lat)
+        self.miles_graph = _edge_graph(node_count, sources, targets, edge_miles)
+        self.minutes_graph = _edge_graph(node_count, sources, targets, edge_minutes)
+        self.tree = cKDTree(unit_vectors(self.node_lat, self.node_lon))
+
+    def snap(self, latitudes, longitudes):
+        """Nearest graph node to each point and the straight-line miles to it"""
+        _, nodes = self.tree.query(unit_vectors(latitudes, longitudes))
+        nodes = np.atleast_1d(nodes)
+        access = np.array([
+            haversine_miles(lat, lon, self.node_lat[n], self.node_lon[n])
+            for lat, lon, n in zip(latitudes, longitudes, nodes.tolist())
+        ], dtype=np.float64)
+        return nodes, access
+
+    def matrix(self, cps, depots):
+        from scipy.sparse.csgraph import dijkstra
+
+        cp_nodes, cp_access = self.snap([c[1] for c in cps], [c[2] for c in cps])
+        depot_nodes, depot_access = self.snap([d[1] for d in depots], [d[2] for d in depots])
+
+        miles = np.empty((len(cps), len(depots)), dtype=np.float64)
+        minutes = np.empty((len(cps), len(depots)), dtype=np.float64)
+        searched = {}
+        for col, node in enumerate(depot_nodes.tolist()):
+            if node not in searched:
+                # On the transposed graph a search from the depot gives every node's distance to it
+                searched[node] = (
+                    dijkstra(self.miles_graph, indices=node)[cp_nodes],
+                    dijkstra(self.minutes_graph, indices=node)[cp_nodes],
+                )
+            road_miles, road_minutes = searched[node]
+            access = cp_access + depot_access[col]
+            miles[:, col] = road_miles + access
+            minutes[:, col] = road_minutes + haversine_travel_minutes(access)
+
+        unreachable = ~np.isfinite(miles) | ~np.isfinite(minutes)
+        if unreachable.any():
+            straight, _ = HaversineProvider().matrix(cps, depots)
+            miles[unreachable] = straight[unreachable]
+            minutes[unreachable] = haversine_travel_minutes(straight[unreachable])
+        return miles, minutes
+
+
+def get_provider(name: str = None):
+    """The configured distance provider, loaded once per process"""
+    name = DISTANCE_PROVIDER if name is None else name
+    if name not in _providers:
+        if name == "haversine":
+            _providers[name] = HaversineProvider()
+        elif name == "road":
+            _providers[name] = RoadGraphProvider(ROAD_GRAPH_PATH)
+        else:
+            raise ValueError(f"Unknown distance provider '{name}'")
+    return _providers[name]
+
+
+if __name__ == "__main__":
+    import sys
+    from app.allocation_cache import bump_data_version
+    from app.database import SessionLocal
+    from app.distance_artifact import build_artifact
+    from app.distances import rebuild_distances
+    from app.plans import discard_draft_plans
+
+    if len(sys.argv) != 2 or sys.argv[1] != "rebuild":
+        print("Usage: python -m app.distance_providers rebuild")
+        sys.exit(2)
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    count = rebuild_distances(db)
+    build_artifact(db)
+    # Running web workers re-route with the new distances on their next lookup, stored drafts included
+    bump_data_version(db)
+    db.commit()
+    discard_draft_plans(db)
+    db.close()
+    print(f"Rebuilt {count} distances with the {DISTANCE_PROVIDER} provider in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,206 @@
+from bisect import bisect_right
+from io import StringIO
+from math import radians, sin, cos, sqrt, atan2
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from app.models import CollectionPoint, Depot, CPDepotDistance
+import numpy as np
+
+EARTH_RADIUS_MILES = 3959
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    R = EARTH_RADIUS_MILES
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1-a))
+    return R * c
+
+
+def haversine_matrix(cp_lats, cp_lons, depot_lats, depot_lons):
+    """Miles from every CP (rows) to every depot (columns), same formula as haversine_miles"""
+    lat1 = np.radians(np.asarray(cp_lats, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(cp_lons, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(depot_lats, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(depot_lons, dtype=np.float64))[None, :]
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    return EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+
+def provider_matrix(cps, depots):
+    """(miles, travel minutes) matrices from the configured distance provider, minutes already per cell"""
+    from app.distance_providers import get_provider, haversine_travel_minutes
+
+    miles, minutes = get_provider().matrix(cps, depots)
+    miles = np.vectorize(lambda d: round(float(d), 2), otypes=[np.float64])(miles) if miles.size else miles
+    if minutes is None:
+        # Straight-line travel time comes from the stored distance, so it is the same wherever it is recomputed
+        minutes = haversine_travel_minutes(miles)
+    return miles, minutes
+
+
+def distance_rows(cps, depots):
+    """CPDepotDistance rows for each CP against every depot, ranked nearest first.
+
+    cps and depots are sequences of (id, latitude, longitude). Distances and
+    travel times come from the configured provider. Ties keep depot order,
+    as the old per-CP sort did.
+    """
+    if not cps or not depots:
+        return []
+
+    miles, minutes = provider_matrix(cps, depots)
+    order = np.argsort(miles, axis=1, kind="stable")
+    depot_ids = [d[0] for d in depots]
+
+    rows = []
+    for i, (cpid, _, _) in enumerate(cps):
+        for rank, col in enumerate(order[i].tolist(), 1):
+            rows.append({
+                'cpid': cpid,
+                'depot_id': depot_ids[col],
+                'distance_miles': float(miles[i, col]),
+                'travel_minutes': float(minutes[i, col]),
+                'rank': rank
+            })
+    return rows
+
+
+def write_distance_rows(db: Session, rows):
+    """Bulk insert distance rows in the session's transaction: COPY on PostgreSQL, executemany elsewhere"""
+    if not rows:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        buffer = StringIO()
+        for r in rows:
+            buffer.write(f"{r['cpid']}\t{r['depot_id']}\t{r['distance_miles']}\t{r['travel_minutes']}\t{r['rank']}\n")
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {CPDepotDistance.__tablename__} (cpid, depot_id, distance_miles, travel_minutes, rank) FROM STDIN",
+                buffer
+            )
+        finally:
+            cursor.close()
+        return
+
+    db.execute(insert(CPDepotDistance), rows)
+
+
+def _locations(query):
+    return [(r[0], r[1], r[2]) for r in query.all()]
+
+
+def rebuild_distances(db: Session):
+    """Replace the whole distance table from current CPs and active depots in one transaction. Returns the row count."""
+    cps = _locations(db.query(CollectionPoint.cpid, CollectionPoint.latitude, CollectionPoint.longitude).order_by(CollectionPoint.id))
+    depots = _locations(db.query(Depot.depot_id, Depot.latitude, Depot.longitude).filter(Depot.is_active == True).order_by(Depot.id))
+
+    rows = distance_rows(cps, depots)
+    db.query(CPDepotDistance).delete(synchronize_session=False)
+    write_distance_rows(db, rows)
+    db.commit()
+    return len(rows)
+
+
+def add_cp_distances(db: Session, cpid, latitude, longitude):
+    """Ranked distances from one new CP to every active depot. Caller commits. Returns the row count."""
+    depots = _locations(db.query(Depot.depot_id, Depot.latitude, Depot.longitude).filter(Depot.is_active == True).order_by(Depot.id))
+    rows = distance_rows([(cpid, latitude, longitude)], depots)
+    write_distance_rows(db, rows)
+    return len(rows)
+
+
+def _ranked_entries(db: Session):
+    """Stored distance rows per CP in rank order, as [id, depot_id, distance_miles, rank, travel_minutes] lists"""
+    rows = db.query(
+        CPDepotDistance.id, CPDepotDistance.cpid, CPDepotDistance.depot_id, CPDepotDistance.distance_miles,
+        CPDepotDistance.rank, CPDepotDistance.travel_minutes
+    ).order_by(CPDepotDistance.cpid, CPDepotDistance.rank).all()
+    ranked = {}
+    for row_id, cpid, depot_id, distance_miles, rank, travel_minutes in rows:
+        ranked.setdefault(cpid, []).append([row_id, depot_id, distance_miles, rank, travel_minutes])
+    return ranked
+
+
+def _rank_changes(entries):
+    """Renumber entries 1..n in list order; the {id, rank} updates for rows whose rank moved"""
+    changes = []
+    for rank, entry in enumerate(entries, 1):
+        if entry[0] is not None and entry[3] != rank:
+            changes.append({'id': entry[0], 'rank': rank})
+        entry[3] = rank
+    return changes
+
+
+def update_depot_distances(db: Session, depot_id, latitude, longitude):
+    """Add or move one depot's column of the distance table without rebuilding the rest.
+
+    The new column is computed against every CP in one vectorised pass and
+    slotted into each CP's existing ranking by binary search, so only the
+    depot's own rows and the rows whose rank shifts are written. Caller
+    commits, so this shares the transaction with the depot change itself.
+    Returns the number of rows written.
+    """
+    cps = _locations(db.query(CollectionPoint.cpid, CollectionPoint.latitude, CollectionPoint.longitude).order_by(CollectionPoint.id))
+    if not cps:
+        return 0
+
+    miles, minutes = provider_matrix(cps, [(depot_id, latitude, longitude)])
+    ranked = _ranked_entries(db)
+
+    inserts = []
+    updates = []
+    for i, (cpid, _, _) in enumerate(cps):
+        distance = float(miles[i, 0])
+        travel = float(minutes[i, 0])
+        entries = ranked.get(cpid, [])
+
+        existing = next((e for e in entries if e[1] == depot_id), None)
+        others = [e for e in entries if e[1] != depot_id]
+
+        # Equal distances go after the depots already ranked, as a full rebuild would for a new depot
+        position = bisect_right([e[2] for e in others], distance)
+        entry = [existing[0] if existing else None, depot_id, distance, existing[3] if existing else None, travel]
+        others.insert(position, entry)
+
+        changes = _rank_changes(others)
+        if existing is None:
+            inserts.append({'cpid': cpid, 'depot_id': depot_id, 'distance_miles': distance, 'travel_minutes': travel, 'rank': entry[3]})
+        elif existing[2] != distance or existing[4] != travel:
+            changes = [c for c in changes if c['id'] != existing[0]]
+            changes.append({'id': existing[0], 'distance_miles': distance, 'travel_minutes': travel, 'rank': entry[3]})
+        updates.extend(changes)
+
+    _write_rank_updates(db, updates)
+    write_distance_rows(db, inserts)
+    return len(inserts) + len(updates)
+
+
+def remove_depot_distances(db: Session, depot_id):
+    """Drop one depot's column and close the rank gap it leaves in each CP's list. Caller commits."""
+    ranked = _ranked_entries(db)
+
+    updates = []
+    for entries in ranked.values():
+        if any(e[1] == depot_id for e in entries):
+            updates.extend(_rank_changes([e for e in entries if e[1] != depot_id]))
+
+    removed = db.query(CPDepotDistance).filter(CPDepotDistance.depot_id == depot_id).delete(synchronize_session=False)
+    _write_rank_updates(db, updates)
+    return removed + len(updates)
+
+
+def _write_rank_updates(db: Session, updates):
+    """Bulk UPDATE by primary key, grouped so every statement in a batch sets the same columns"""
+    distance_updates = [u for u in updates if 'distance_miles' in u]
+    rank_updates = [u for u in updates if 'distance_miles' not in u]
+    for batch in (rank_updates, distance_updates):
+        if batch:
+            db.execute(update(CPDepotDistance), batch)
@@ -1,62 +1,64 @@
 import pandas as pd
+from sqlalchemy import insert
+from app.allocation_cache import bump_data_version
 from app.database import SessionLocal
 from app.models import CollectionPoint, Depot, CPDepotDistance
-from math import radians, sin, cos, sqrt, atan2
-
-def haversine_miles(lat1, lon1, lat2, lon2):
-    R = 3959
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    return R * c
+from app.distance_artifact import build_artifact
+from app.distances import rebuild_distances
+from app.readers import iter_xlsx_chunks
 
 def import_collection_points(filepath):
     db = SessionLocal()
-    df = pd.read_excel(filepath)
+    existing = {cpid for (cpid,) in db.query(CollectionPoint.cpid).all()}
     
+    # Streamed in chunks; only CPIDs not already stored are inserted
     count = 0
-    for _, row in df.iterrows():
-        existing = db.query(CollectionPoint).filter(CollectionPoint.cpid == row['CPID']).first()
-        if existing:
+    for chunk in iter_xlsx_chunks(filepath):
+        chunk['CPID'] = chunk['CPID'].astype(str).str.strip()
+        chunk = chunk[~chunk['CPID'].isin(existing)].drop_duplicates(subset='CPID')
+        if chunk.empty:
             continue
-        
-        cp = CollectionPoint(
-            cpid=row['CPID'],
-            name=row['Collection Name'],
-            latitude=row['Latitude'],
-            longitude=row['Longitude'],
-            is_active=True
-        )
-        db.add(cp)
-        count += 1
+        db.execute(insert(CollectionPoint), [
+            {'cpid': cpid, 'name': name, 'latitude': float(lat), 'longitude': float(lon), 'is_active': True}
+            for cpid, name, lat, lon in zip(chunk['CPID'], chunk['Collection Name'], chunk['Latitude'], chunk['Longitude'])
+        ])
+        existing.update(chunk['CPID'])
+        count += len(chunk)
     
+    # Running web workers drop cached routing and re-route draft plans on their next lookup
+    bump_data_version(db)
     db.commit()
     db.close()
     print(f"Imported {count} collection points.")
 
 def import_depots(filepath):
     db = SessionLocal()
-    df = pd.read_excel(filepath)
+    existing = {depot_id for (depot_id,) in db.query(Depot.depot_id).all()}
     
     count = 0
-    for _, row in df.iterrows():
-        existing = db.query(Depot).filter(Depot.depot_id == row['DepotID']).first()
-        if existing:
+    for chunk in iter_xlsx_chunks(filepath):
+        chunk['DepotID'] = chunk['DepotID'].astype(str).str.strip()
+        chunk = chunk[~chunk['DepotID'].isin(existing)].drop_duplicates(subset='DepotID')
+        if chunk.empty:
             continue
-        
-        depot = Depot(
-            depot_id=row['DepotID'],
-            name=row['DepotName'],
-            latitude=row['Latitude'],
-            longitude=row['Longitude'],
-            daily_capacity=int(row['Daily Capacity']) if pd.notna(row['Daily Capacity']) else 0,
-            is_active=True
-        )
-        db.add(depot)
-        count += 1
+        capacity = pd.to_numeric(chunk['Daily Capacity'], errors='coerce').fillna(0).astype(int)
+        db.execute(insert(Depot), [
+            {
+                'depot_id': depot_id,
+                'name': name,
+                'latitude': float(lat),
+                'longitude': float(lon),
+                'daily_capacity': int(cap),
+                'is_active': True
+            }
+            for depot_id, name, lat, lon, cap in zip(
+                chunk['DepotID'], chunk['DepotName'], chunk['Latitude'], chunk['Longitude'], capacity
+            )
+        ])
+        existing.update(chunk['DepotID'])
+        count += len(chunk)
     
+    bump_data_version(db)
     db.commit()
     db.close()
     print(f"Imported {count} depots.")
@@ -70,35 +72,13 @@ def calculate_distances():
         db.close()
         return
     
-    cps = db.query(CollectionPoint).all()
-    depots = db.query(Depot).all()
-    
-    print(f"Calculating distances for {len(cps)} CPs to {len(depots)} depots...")
-    
-    count = 0
-    for cp in cps:
-        distances = []
-        for depot in depots:
-            dist = haversine_miles(cp.latitude, cp.longitude, depot.latitude, depot.longitude)
-            distances.append((depot.depot_id, dist))
-        
-        distances.sort(key=lambda x: x[1])
-        
-        for rank, (depot_id, dist) in enumerate(distances, 1):
-            record = CPDepotDistance(
-                cpid=cp.cpid,
-                depot_id=depot_id,
-                distance_miles=round(dist, 2),
-                rank=rank
-            )
-            db.add(record)
-            count += 1
-        
-        if count % 5000 == 0:
-            print(f"  Processed {count} distance records...")
-            db.commit()
+    print(f"Calculating distances for {db.query(CollectionPoint).count()} CPs to {db.query(Depot).count()} depots...")
     
+    count = rebuild_distances(db)
+    build_artifact(db)
+    bump_data_version(db)
     db.commit()
+    
     db.close()
     print(f"Calculated {count} distance records.")
 
@@ -0,0 +1,294 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.allocation_cache import bump_data_version
+from app.database import SessionLocal
+from app.models import AuditLog, ImportJob
+from app.plans import refresh_plans
+from app.readers import detect_format, iter_chunks
+from app.volume_import import import_volume_chunks
+import hashlib
+import json
+import os
+import socket
+import tempfile
+
+# Where uploaded files wait on disk until the import worker reaches them
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR", "data/import_spool")
+
+# A single worker: jobs write the same tables and SQLite allows one writer at a time
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="volume-import")
+
+# This process, as host-pid. Jobs record the process running them, and watched-folder files are claimed
+# into a folder named after it, so recovery at startup only takes back the work of processes that have gone.
+OWNER = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _process_alive(pid: int):
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows, so ask for its exit code instead
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def owner_gone(owner: str):
+    """Whether the process that claimed a file or job has exited.
+
+    Owners on other hosts can't be checked and are assumed alive. Jobs and
+    files from before owners were recorded have none, and count as gone.
+    """
+    if not owner:
+        return True
+    host, _, pid = owner.rpartition("-")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    return int(pid) != os.getpid() and not _process_alive(int(pid))
+
+
+def file_sha256(path: str):
+    """Hex SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_repeat(db: Session, sha256: str, mode: str):
+    """An earlier job for the same file contents and mode that hasn't failed, or None"""
+    return db.query(ImportJob).filter(
+        ImportJob.sha256 == sha256,
+        ImportJob.mode == mode,
+        ImportJob.status.in_(["Queued", "Running", "Completed"])
+    ).order_by(ImportJob.id).first()
+
+
+def repeat_message(job: ImportJob):
+    """Why a file is rejected as a repeat of job; None when that job failed before it could be found"""
+    if job is None:
+        return "Same file was being imported at the same time"
+    return f"Same file already imported as job {job.id} ({job.filename}, {job.created_at:%Y-%m-%d %H:%M})"
+
+
+def queue_import(db: Session, source, filename: str, user_id: int = None, ip_address: str = None, replace: bool = False):
+    """Spool a file object to disk and queue it as an ImportJob, returning the job.
+
+    Only the copy happens here, hashing as it goes, so an upload request
+    returns as soon as the file is on disk. Raises ValueError for an
+    unsupported file type, or for contents already imported in the same
+    mode; a failed import can be retried. The unique index on (sha256,
+    mode) catches a repeat that arrives while the first is being queued.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    detect_format(filename)
+    mode = "replace" if replace else "skip"
+
+    os.makedirs(IMPORT_SPOOL_DIR, exist_ok=True)
+    handle, path = tempfile.mkstemp(dir=IMPORT_SPOOL_DIR, suffix=extension)
+    digest = hashlib.sha256()
+    with os.fdopen(handle, "wb") as spool:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+            spool.write(block)
+
+    repeat = find_repeat(db, digest.hexdigest(), mode)
+    if repeat:
+        os.remove(path)
+        raise ValueError(repeat_message(repeat))
+
+    job = ImportJob(
+        filename=filename, spool_path=path, status="Queued", mode=mode, sha256=digest.hexdigest(),
+        created_by=user_id, ip_address=ip_address
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        os.remove(path)
+        raise ValueError(repeat_message(find_repeat(db, digest.hexdigest(), mode)))
+    _executor.submit(run_import_job, job.id)
+    return job
+
+
+def _claim(db: Session, job_id: int):
+    """Move a queued job to Running, owned by this process; False if another worker already has it"""
+    claimed = db.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.status == "Queued")
+        .values(status="Running", started_at=datetime.utcnow(), owner=OWNER)
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+
+def _record(job: ImportJob, totals):
+    job.rows_processed = totals.imported + totals.skipped
+    job.imported = totals.imported
+    job.skipped = totals.skipped
+    job.error_count = totals.error_count
+    job.errors = json.dumps([[int(r.Row), r.Error] for r in totals.errors.itertuples()])
+
+
+def process_import_job(db: Session, job: ImportJob, refresh: bool = True):
+    """Import a running job's file, recording the outcome on the job and in the audit log.
+
+    Each chunk is committed with the job's counters, so progress is visible
+    to the polling endpoint while the file is read. If the job fails part
+    way, the chunks already committed stay imported and their dates' plans
+    are refreshed; running the file again skips them as duplicates. Returns
+    the dates that received rows; with refresh=False the caller must
+    refresh their plans.
+    """
+    dates = set()
+
+    def progress(totals):
+        _record(job, totals)
+        dates.update(totals.dates)
+        db.commit()
+
+    try:
+        # The reader is closed before its file, even when the import stops early
+        with open(job.spool_path, "rb") as f, closing(iter_chunks(f, job.filename)) as chunks:
+            result = import_volume_chunks(
+                db, chunks, user_id=job.created_by, progress=progress, replace=job.mode == "replace"
+            )
+        if dates and refresh:
+            bump_data_version(db)
+            db.commit()
+            refresh_plans(db, sorted(dates))
+    except Exception as e:
+        db.rollback()
+        if dates and refresh:
+            # Chunks committed before the failure are kept; the bump is committed with the job below
+            bump_data_version(db)
+        job.status = "Failed"
+        job.message = str(e)
+        if job.imported:
+            job.message += f" (after importing {job.imported} records)"
+        db.add(AuditLog(
+            user_id=job.created_by,
+            action_type="VOLUME_IMPORT_FAILED",
+            entity_type="DailyVolume",
+            entity_id=job.filename,
+            old_value=None,
+            new_value=job.message,
+            ip_address=job.ip_address
+        ))
+    else:
+        _record(job, result)
+        job.status = "Completed"
+        job.message = f"Imported {result.imported} records, skipped {result.skipped}"
+        if job.mode == "replace":
+            job.message += " (existing volumes replaced)"
+        db.add(AuditLog(
+            user_id=job.created_by,
+            action_type="VOLUME_IMPORT",
+            entity_type="DailyVolume",
+            entity_id=job.filename,
+            old_value=None,
+            new_value=f"Imported {result.imported}, skipped {result.skipped}, mode {job.mode}",
+            ip_address=job.ip_address
+        ))
+
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    if job.status == "Failed" and dates and refresh:
+        # Plans stored during or before the import lack the rows it committed
+        refresh_plans(db, sorted(dates))
+    return dates
+
+
+def run_import_job(job_id: int):
+    """Import a queued upload in its own session, then remove its spooled file"""
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id):
+            return
+        job = db.get(ImportJob, job_id)
+        process_import_job(db, job)
+
+        if job.spool_path and os.path.exists(job.spool_path):
+            os.remove(job.spool_path)
+        job.spool_path = None
+        db.commit()
+    finally:
+        db.close()
+
+
+def resume_import_jobs():
+    """Queue again the jobs a previous process left unfinished; call once at startup.
+
+    A job that was running is restarted from the beginning of its file,
+    which is safe because rows it already imported are skipped. Every
+    worker calls this, so a running job is only taken back once the
+    process running it has exited (see owner_gone); queued jobs can go
+    to any worker, as _claim lets only one run them. Watched folder jobs
+    are left to app.watched_folder, which puts their files back in
+    Incoming.
+    """
+    db = SessionLocal()
+    try:
+        pending = db.query(ImportJob).filter(
+            ImportJob.status.in_(["Queued", "Running"]),
+            ImportJob.source.is_distinct_from("folder")
+        ).order_by(ImportJob.id).all()
+        resumed = []
+        for job in pending:
+            if job.status == "Running" and not owner_gone(job.owner):
+                continue
+            if job.spool_path and os.path.exists(job.spool_path):
+                job.status = "Queued"
+                resumed.append(job.id)
+            else:
+                job.status = "Failed"
+                job.message = "Spooled file missing after a restart; upload it again"
+                job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+    for job_id in resumed:
+        _executor.submit(run_import_job, job_id)
+    return resumed
+
+
+def job_progress(job: ImportJob):
+    """A job's state for the progress endpoint"""
+    elapsed = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "source": job.source,
+        "mode": job.mode,
+        "status": job.status,
+        "rows_processed": job.rows_processed,
+        "imported": job.imported,
+        "skipped": job.skipped,
+        "error_count": job.error_count,
+        "errors": json.loads(job.errors) if job.errors else [],
+        "message": job.message,
+        "elapsed_seconds": round(elapsed, 2) if elapsed is not None else None,
+        "rows_per_second": round(job.rows_processed / elapsed) if elapsed else None,
+        "finished": job.status in ("Completed", "Failed", "Duplicate"),
+    }
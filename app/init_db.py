@@ -1,11 +1,28 @@
 from app.database import engine, Base
-from app.models import User, CollectionPoint, Depot, CPDepotDistance, DailyVolume, ManualOverride, CapacityOverride, AuditLog
+from app.models import User, CollectionPoint, Depot, CPDepotDistance, DailyVolume, ManualOverride, CapacityOverride, CapacityRule, SchemaRevision, DataVersion, AuditLog, AllocationRun, TrailerAllocation, ImportJob
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+def upgrade_schema(bind=None):
+    """Create new tables, then run pending schema revisions; changes to existing tables are all revisions"""
+    from app.migrations import upgrade
+
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    for revision, change in upgrade(bind):
+        print(f"{revision}: {change}")
+
+def show_revisions():
+    from app.migrations import REVISIONS, applied_revisions
+
+    applied = applied_revisions(engine)
+    for revision, description, _ in REVISIONS:
+        state = f"applied {applied[revision]:%Y-%m-%d %H:%M}" if revision in applied else "pending"
+        print(f"{revision}  {state}  {description}")
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
     print("All database tables created successfully.")
 
 def create_admin_user():
@@ -31,5 +48,16 @@ def create_admin_user():
     db.close()
 
 if __name__ == "__main__":
-    create_tables()
-    create_admin_user()
+    import sys
+
+    if sys.argv[1:] == ["upgrade"]:
+        # Deploy step: bring an existing schema up to the models without touching users
+        try:
+            upgrade_schema()
+        except ValueError as e:
+            sys.exit(f"Upgrade stopped: {e}")
+    elif sys.argv[1:] == ["revisions"]:
+        show_revisions()
+    else:
+        create_tables()
+        create_admin_user()
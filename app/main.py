@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Request, Depends, Query, UploadFile, File, Form
-from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
@@ -7,7 +7,27 @@ from datetime import date, datetime, timedelta
 from app.routers import auth_router
 from app.auth import get_current_user_from_cookie
 from app.database import get_db
-from app.models import User, CollectionPoint, Depot, DailyVolume, ManualOverride, AuditLog, CPDepotDistance, CapacityOverride
+from app.models import (
+    User, CollectionPoint, Depot, DailyVolume, ManualOverride, AuditLog, CPDepotDistance, CapacityOverride, CapacityRule,
+    ImportJob, AllocationRun
+)
+from app.allocation_cache import (
+    bump_data_version, cache_stats, dates_changed, get_cached_state, get_capacity_calendar, override_changed
+)
+from app.routing import ROUTING_ENGINE, WHOLE_DAY_ENGINES
+from app.distance_artifact import build_artifact
+from app.distances import add_cp_distances, remove_depot_distances, update_depot_distances
+from app.plans import delete_plan, discard_draft_plans, get_plan, refresh_plans, save_plan
+from app.times import DEFAULT_COLLECTION_MINUTES, format_minutes, parse_minutes
+from app.readers import FILE_FORMATS, iter_chunks, read_whole
+from app.override_import import REQUIRED_COLUMNS as OVERRIDE_COLUMNS, import_overrides
+from app.capacity_import import REQUIRED_COLUMNS as CAPACITY_COLUMNS, import_capacity_overrides
+from app.capacity_calendar import WEEKDAY_NAMES, format_weekdays, rule_applies
+from app.import_jobs import job_progress, queue_import, resume_import_jobs
+from app.watched_folder import (
+    WATCHED_FOLDER_ERRORS, WATCHED_FOLDER_INCOMING, WATCHED_FOLDER_INTERVAL_SECONDS, WATCHED_FOLDER_PROCESSED,
+    start_watcher, stop_watcher
+)
 import os
 
 app = FastAPI(title="DX Freight Routing System")
@@ -16,200 +36,25 @@ app = FastAPI(title="DX Freight Routing System")
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.filters["hhmm"] = format_minutes
 
 app.include_router(auth_router.router)
 
-# Configuration for watched folder
-WATCHED_FOLDER_INCOMING = os.getenv("WATCHED_FOLDER_INCOMING", "C:/VolumeImports/Incoming")
-WATCHED_FOLDER_PROCESSED = os.getenv("WATCHED_FOLDER_PROCESSED", "C:/VolumeImports/Processed")
-WATCHED_FOLDER_ERRORS = os.getenv("WATCHED_FOLDER_ERRORS", "C:/VolumeImports/Errors")
-
 # Session timeout in minutes
 SESSION_TIMEOUT_MINUTES = int(os.getenv("SESSION_TIMEOUT_MINUTES", "30"))
 
 
-def calculate_cost(distance_miles):
-    """Calculate transport cost: £150 base + £1.80/mile, minimum £200"""
-    cost = 150 + (distance_miles * 1.80)
-    return max(cost, 200)
-
-
-def get_allocations(db: Session, selected_date: date):
-    """Core routing logic - allocates trailers from CPs to depots based on distance ranking and time-based capacity"""
-    from datetime import datetime, timedelta
-    
-    def time_to_minutes(time_str):
-        """Convert HH:MM to minutes since midnight"""
-        if not time_str:
-            return 540  # Default 09:00
-        h, m = map(int, time_str.split(':'))
-        return h * 60 + m
-    
-    def minutes_to_time(mins):
-        """Convert minutes since midnight to HH:MM"""
-        h = int(mins // 60)
-        m = int(mins % 60)
-        return f"{h:02d}:{m:02d}"
-    
-    def calculate_arrival_time(collection_time_str, distance_miles):
-        """Calculate arrival time: collection + 1hr loading + travel time at 40mph"""
-        collection_mins = time_to_minutes(collection_time_str)
-        loading_mins = 60  # 1 hour loading
-        travel_mins = (distance_miles / 40) * 60  # 40mph
-        return collection_mins + loading_mins + travel_mins
-    
-    def calculate_available_capacity(depot, arrival_mins, base_capacity):
-        """Calculate capacity available at arrival time based on linear reduction"""
-        start_mins = time_to_minutes(depot.sortation_start_time or "08:00")
-        cutoff_mins = time_to_minutes(depot.cutoff_time or "18:00")
-        
-        # If arriving before sortation starts, full capacity
-        if arrival_mins <= start_mins:
-            return base_capacity
-        
-        # If arriving after cutoff, no capacity
-        if arrival_mins >= cutoff_mins:
-            return 0
-        
-        # Linear reduction: capacity reduces as day progresses
-        total_window = cutoff_mins - start_mins
-        time_remaining = cutoff_mins - arrival_mins
-        
-        if total_window <= 0:
-            return 0
-        
-        return int(base_capacity * (time_remaining / total_window))
-    
-    volumes = db.query(DailyVolume).filter(DailyVolume.date == selected_date).all()
-    
-    if not volumes:
-        return [], []
-    
-    overrides = db.query(ManualOverride).filter(ManualOverride.date == selected_date).all()
-    override_map = {(o.cpid, o.trailer_number, o.collection_time): o.to_depot_id for o in overrides}
-    
-    capacity_overrides = db.query(CapacityOverride).filter(CapacityOverride.date == selected_date).all()
-    capacity_override_map = {co.depot_id: co.override_capacity for co in capacity_overrides}
-    
-    depots = db.query(Depot).filter(Depot.is_active == True).all()
-    depot_map = {d.depot_id: d for d in depots}
-    
-    # Track allocated parcels per depot per time slot (we'll track total for simplicity)
-    depot_allocated = {d.depot_id: 0 for d in depots}
-    depot_base_capacities = {}
-    for d in depots:
-        if d.depot_id in capacity_override_map:
-            depot_base_capacities[d.depot_id] = capacity_override_map[d.depot_id]
-        else:
-            depot_base_capacities[d.depot_id] = d.daily_capacity
-    
-    allocations = []
-    
-    # Sort volumes by collection time so earlier collections are allocated first
-    volumes_sorted = sorted(volumes, key=lambda v: time_to_minutes(v.collection_time or "09:00"))
-    
-    for volume in volumes_sorted:
-        cp = db.query(CollectionPoint).filter(CollectionPoint.cpid == volume.cpid).first()
-        if not cp:
-            continue
-        
-        collection_time = volume.collection_time or "09:00"
-        parcels_per_trailer = volume.parcels // volume.trailers if volume.trailers > 0 else volume.parcels
-        remainder = volume.parcels % volume.trailers if volume.trailers > 0 else 0
-        
-        distances = db.query(CPDepotDistance).filter(
-            CPDepotDistance.cpid == volume.cpid
-        ).order_by(CPDepotDistance.rank).all()
-        
-        for trailer_num in range(1, volume.trailers + 1):
-            trailer_parcels = parcels_per_trailer + (1 if trailer_num <= remainder else 0)
-            
-            override_key = (volume.cpid, trailer_num, collection_time)
-            is_peak_arrival = False
-            
-            if override_key in override_map:
-                assigned_depot_id = override_map[override_key]
-                is_override = True
-            else:
-                assigned_depot_id = None
-                
-                # Try each depot in distance order
-                for dist in distances:
-                    depot = depot_map.get(dist.depot_id)
-                    if not depot:
-                        continue
-                    
-                    base_cap = depot_base_capacities.get(dist.depot_id, 0)
-                    if base_cap <= 0:
-                        continue
-                    
-                    # Calculate arrival time for this depot
-                    arrival_mins = calculate_arrival_time(collection_time, dist.distance_miles)
-                    
-                    # Calculate available capacity at arrival time
-                    available_cap = calculate_available_capacity(depot, arrival_mins, base_cap)
-                    
-                    # Check if there's room (considering what's already allocated)
-                    already_allocated = depot_allocated[dist.depot_id]
-                    if already_allocated + trailer_parcels <= available_cap:
-                        assigned_depot_id = dist.depot_id
-                        break
-                
-                # If no depot has capacity, assign to nearest and flag as Peak Arrival
-                if not assigned_depot_id and distances:
-                    for dist in distances:
-                        if depot_base_capacities.get(dist.depot_id, 0) > 0:
-                            assigned_depot_id = dist.depot_id
-                            is_peak_arrival = True
-                            break
-                
-                is_override = False
-            
-            if assigned_depot_id:
-                depot_allocated[assigned_depot_id] += trailer_parcels
-                
-                dist_record = next((d for d in distances if d.depot_id == assigned_depot_id), None)
-                distance = dist_record.distance_miles if dist_record else 0
-                
-                depot = depot_map.get(assigned_depot_id)
-                
-                # Calculate arrival time for display
-                arrival_mins = calculate_arrival_time(collection_time, distance)
-                arrival_time = minutes_to_time(arrival_mins)
-                
-                allocations.append({
-                    'cpid': volume.cpid,
-                    'cp_name': cp.name,
-                    'trailer_num': trailer_num,
-                    'parcels': trailer_parcels,
-                    'depot_id': assigned_depot_id,
-                    'depot_name': depot.name if depot else assigned_depot_id,
-                    'distance': distance,
-                    'cost': calculate_cost(distance),
-                    'is_override': is_override,
-                    'collection_time': collection_time,
-                    'arrival_time': arrival_time,
-                    'is_peak_arrival': is_peak_arrival
-                })
-    
-    # Calculate depot summaries - only include depots with allocations
-    depot_summaries = []
-    for depot in depots:
-        allocated = depot_allocated.get(depot.depot_id, 0)
-        if allocated == 0:
-            continue  # Skip depots with no allocations
-        base_cap = depot_base_capacities.get(depot.depot_id, 0)
-        depot_summaries.append({
-            'depot_id': depot.depot_id,
-            'name': depot.name,
-            'allocated_parcels': allocated,
-            'capacity': base_cap,
-            'utilisation': round((allocated / base_cap * 100), 1) if base_cap > 0 else 0,
-            'sortation_start': depot.sortation_start_time or "08:00",
-            'cutoff_time': depot.cutoff_time or "18:00"
-        })
-    
-    return allocations, depot_summaries
+@app.on_event("startup")
+def resume_imports():
+    """Pick up import jobs left queued or running by the previous process and start watching the folder"""
+    resume_import_jobs()
+    start_watcher()
+
+
+@app.on_event("shutdown")
+def stop_imports():
+    stop_watcher()
+
 
 @app.get("/")
 def home(request: Request, db: Session = Depends(get_db)):
@@ -236,7 +81,7 @@ def dashboard(
         except ValueError:
             pass
     
-    allocations, depot_summary = get_allocations(db, selected_date)
+    allocations, depot_summary, _ = get_plan(db, selected_date)
     
     total_trailers = len(allocations)
     total_parcels = sum(a['parcels'] for a in allocations)
@@ -265,8 +110,7 @@ def dashboard(
             })
     
     # Get depot stats for map popups
-    capacity_overrides = db.query(CapacityOverride).filter(CapacityOverride.date == selected_date).all()
-    capacity_override_map = {co.depot_id: co.override_capacity for co in capacity_overrides}
+    calendar = get_capacity_calendar(db)
     
     depot_stats = []
     for depot_id in active_depot_ids:
@@ -275,7 +119,7 @@ def dashboard(
             depot_allocations = [a for a in allocations if a['depot_id'] == depot_id]
             depot_parcels = sum(a['parcels'] for a in depot_allocations)
             depot_trailers = len(depot_allocations)
-            capacity = capacity_override_map.get(depot_id, depot.daily_capacity)
+            capacity = calendar.capacity(depot_id, selected_date, depot.daily_capacity)
             depot_stats.append({
                 'depot_id': depot_id,
                 'name': depot.name,
@@ -345,7 +189,9 @@ def collections_page(
     db: Session = Depends(get_db),
     date_str: str = Query(None, alias="date"),
     cpid: str = Query(None),
-    depot: str = Query(None)
+    depot: str = Query(None),
+    message: str = Query(None),
+    error: bool = Query(False)
 ):
     user = get_current_user_from_cookie(request, db)
     if not user:
@@ -358,18 +204,16 @@ def collections_page(
         except ValueError:
             pass
     
-    allocations, depot_summary = get_allocations(db, selected_date)
+    # Filters are applied in SQL against the stored plan
+    allocations, depot_summary, plan_run = get_plan(db, selected_date, cpid=cpid, depot_id=depot)
     
-    # Apply filters
     filter_type = None
     filter_value = None
     
     if cpid:
-        allocations = [a for a in allocations if a['cpid'] == cpid]
         filter_type = "CPID"
         filter_value = cpid
     elif depot:
-        allocations = [a for a in allocations if a['depot_id'] == depot]
         filter_type = "Depot"
         depot_obj = db.query(Depot).filter(Depot.depot_id == depot).first()
         filter_value = depot_obj.name if depot_obj else depot
@@ -382,16 +226,92 @@ def collections_page(
         "allocations": allocations,
         "depot_summary": depot_summary,
         "filter_type": filter_type,
-        "filter_value": filter_value
+        "filter_value": filter_value,
+        "plan_run": plan_run,
+        "message": message,
+        "error": error
     })
 
 
+@app.post("/allocations/publish")
+def publish_plan(
+    request: Request,
+    db: Session = Depends(get_db),
+    date: str = Form(...)
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role != 'Admin':
+        return RedirectResponse(url="/dashboard", status_code=303)
+    
+    try:
+        plan_date = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        return RedirectResponse(url="/collections?message=Invalid date&error=true", status_code=303)
+    
+    state = get_cached_state(db, plan_date)
+    if not state.allocations:
+        return RedirectResponse(
+            url=f"/collections?date={date}&message=No allocations to publish for this date&error=true",
+            status_code=303
+        )
+    
+    run = save_plan(db, plan_date, state, status="Published", user_id=user.id)
+    
+    audit = AuditLog(
+        user_id=user.id,
+        action_type="PLAN_PUBLISHED",
+        entity_type="AllocationRun",
+        entity_id=str(plan_date),
+        old_value=None,
+        new_value=f"{run.total_trailers} trailers, £{run.total_cost:.2f}",
+        ip_address=request.client.host
+    )
+    db.add(audit)
+    db.commit()
+    
+    return RedirectResponse(url=f"/collections?date={date}&message=Plan published", status_code=303)
+
+
+@app.post("/allocations/unpublish")
+def unpublish_plan(
+    request: Request,
+    db: Session = Depends(get_db),
+    date: str = Form(...)
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role != 'Admin':
+        return RedirectResponse(url="/dashboard", status_code=303)
+    
+    try:
+        plan_date = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        return RedirectResponse(url="/collections?message=Invalid date&error=true", status_code=303)
+    
+    # Dropping the snapshot lets the next view re-route and store a fresh draft
+    delete_plan(db, plan_date)
+    
+    audit = AuditLog(
+        user_id=user.id,
+        action_type="PLAN_UNPUBLISHED",
+        entity_type="AllocationRun",
+        entity_id=str(plan_date),
+        old_value="Published",
+        new_value=None,
+        ip_address=request.client.host
+    )
+    db.add(audit)
+    db.commit()
+    
+    return RedirectResponse(url=f"/collections?date={date}&message=Plan unpublished", status_code=303)
+
+
 @app.get("/import-volumes")
 def import_volumes_page(
     request: Request,
     db: Session = Depends(get_db),
     message: str = Query(None),
-    error: bool = Query(False)
+    error: bool = Query(False),
+    job: int = Query(None)
 ):
     user = get_current_user_from_cookie(request, db)
     if not user:
@@ -422,7 +342,8 @@ def import_volumes_page(
     folder_info = {
         'incoming': WATCHED_FOLDER_INCOMING,
         'processed': WATCHED_FOLDER_PROCESSED,
-        'errors': WATCHED_FOLDER_ERRORS
+        'errors': WATCHED_FOLDER_ERRORS,
+        'interval_minutes': max(WATCHED_FOLDER_INTERVAL_SECONDS // 60, 1)
     }
     
     return templates.TemplateResponse("import_volumes.html", {
@@ -432,14 +353,18 @@ def import_volumes_page(
         "message": message,
         "error": error,
         "recent_imports": recent_imports,
-        "folder_info": folder_info
+        "folder_info": folder_info,
+        "accepted_extensions": ",".join(FILE_FORMATS),
+        "job_id": job,
+        "recent_jobs": [job_progress(j) for j in db.query(ImportJob).order_by(ImportJob.id.desc()).limit(10)]
     })
 
 
 @app.post("/import-volumes")
-async def import_volumes_upload(
+def import_volumes_upload(
     request: Request,
     file: UploadFile = File(...),
+    replace: bool = Form(False),
     db: Session = Depends(get_db)
 ):
     user = get_current_user_from_cookie(request, db)
@@ -449,102 +374,28 @@ async def import_volumes_upload(
     if user.role not in ["Admin", "Operator"]:
         return RedirectResponse(url="/dashboard", status_code=303)
     
-    import pandas as pd
-    from io import BytesIO
-    
+    # Only spooled and queued here; the page polls the job while a background worker imports it
     try:
-        contents = await file.read()
-        df = pd.read_excel(BytesIO(contents))
-        
-        df.columns = [str(c).strip() for c in df.columns]
-        
-        required_cols = ['Date', 'CPID', 'Parcels', 'Trailers']
-        missing = [c for c in required_cols if c not in df.columns]
-        if missing:
-            return RedirectResponse(
-                url=f"/import-volumes?message=Missing columns: {', '.join(missing)}&error=true",
-                status_code=303
-            )
-        
-        imported = 0
-        skipped = 0
-        errors = []
-        
-        for idx, row in df.iterrows():
-            try:
-                row_date = pd.to_datetime(row['Date']).date()
-                cpid = str(row['CPID']).strip()
-                parcels = int(row['Parcels'])
-                trailers = int(row['Trailers'])
-                
-                cp = db.query(CollectionPoint).filter(CollectionPoint.cpid == cpid).first()
-                if not cp:
-                    errors.append(f"Row {idx+2}: CPID '{cpid}' not found")
-                    skipped += 1
-                    continue
-                
-                existing = db.query(DailyVolume).filter(
-                    DailyVolume.date == row_date,
-                    DailyVolume.cpid == cpid
-                ).first()
-                
-                if existing:
-                    skipped += 1
-                    continue
-                
-                # Get collection time if provided
-                collection_time = "09:00"  # Default
-                if 'Collection Time' in df.columns:
-                    ct = row.get('Collection Time')
-                    if pd.notna(ct):
-                        ct_str = str(ct).strip()
-                        # Handle time formats
-                        if ':' in ct_str:
-                            collection_time = ct_str[:5]  # Take HH:MM
-                        elif len(ct_str) == 4 and ct_str.isdigit():
-                            collection_time = f"{ct_str[:2]}:{ct_str[2:]}"  # 0900 -> 09:00
-                
-                volume = DailyVolume(
-                    date=row_date,
-                    cpid=cpid,
-                    parcels=parcels,
-                    trailers=trailers,
-                    collection_time=collection_time,
-                    imported_by=user.id,
-                    imported_at=datetime.utcnow()
-                )
-                db.add(volume)
-                imported += 1
-                
-            except Exception as e:
-                errors.append(f"Row {idx+2}: {str(e)}")
-                skipped += 1
-        
-        db.commit()
-        
-        audit = AuditLog(
-            user_id=user.id,
-            action_type="VOLUME_IMPORT",
-            entity_type="DailyVolume",
-            entity_id=file.filename,
-            old_value=None,
-            new_value=f"Imported {imported}, skipped {skipped}",
-            ip_address=request.client.host
-        )
-        db.add(audit)
-        db.commit()
-        
-        message = f"Imported {imported} records, skipped {skipped}"
-        if errors:
-            message += f". Errors: {'; '.join(errors[:3])}"
-        
-        return RedirectResponse(url=f"/import-volumes?message={message}", status_code=303)
-        
-    except Exception as e:
-        return RedirectResponse(
-            url=f"/import-volumes?message=Error reading file: {str(e)}&error=true",
-            status_code=303
+        job = queue_import(
+            db, file.file, file.filename, user_id=user.id, ip_address=request.client.host, replace=replace
         )
+    except ValueError as e:
+        return RedirectResponse(url=f"/import-volumes?message={e}&error=true", status_code=303)
+    
+    return RedirectResponse(url=f"/import-volumes?job={job.id}", status_code=303)
+
+
+@app.get("/import-volumes/jobs/{job_id}")
+def import_job_status(job_id: int, request: Request, db: Session = Depends(get_db)):
+    """An import job's progress as JSON, polled by the import page"""
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role not in ["Admin", "Operator"]:
+        return RedirectResponse(url="/dashboard", status_code=303)
+    
+    job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+    if not job:
+        return JSONResponse({"error": "Import job not found"}, status_code=404)
+    return job_progress(job)
 
 
 
@@ -576,6 +427,15 @@ def download_template(template_type: str, request: Request, db: Session = Depend
             'Reason': ['Bank holiday reduced staff', 'Vehicle maintenance']
         })
         filename = "capacity_override_template.xlsx"
+    elif template_type == "overrides":
+        df = pd.DataFrame({
+            'Date': ['2026-01-07', '2026-01-07'],
+            'CPID': ['CP001', 'CP001'],
+            'Trailer': [1, 2],
+            'DepotID': ['D001', 'D002'],
+            'Collection Time': ['09:00', '09:00']
+        })
+        filename = "override_import_template.xlsx"
     elif template_type == "cplist":
         cps = db.query(CollectionPoint).order_by(CollectionPoint.cpid).all()
         df = pd.DataFrame({
@@ -628,7 +488,7 @@ def overrides_page(
             'cpid': o.cpid,
             'cp_name': cp.name if cp else '',
             'trailer_number': o.trailer_number,
-            'collection_time': o.collection_time or '09:00',
+            'collection_minutes': o.collection_minutes,
             'to_depot_id': o.to_depot_id,
             'depot_name': depot.name if depot else '',
             'created_by_name': created_by.username if created_by else '',
@@ -655,7 +515,7 @@ def overrides_page(
             'cpid': cp.cpid,
             'name': cp.name,
             'max_trailers': cp_trailer_counts.get(cp.cpid, 1),
-            'collection_time': volume.collection_time if volume else '09:00'
+            'collection_minutes': volume.collection_minutes if volume else DEFAULT_COLLECTION_MINUTES
         })
     
     depots = db.query(Depot).filter(Depot.is_active == True).order_by(Depot.depot_id).all()
@@ -668,6 +528,7 @@ def overrides_page(
         "overrides": override_list,
         "collection_points": cp_list,
         "depots": depots,
+        "accepted_extensions": ",".join(FILE_FORMATS),
         "message": message,
         "error": error
     })
@@ -688,12 +549,16 @@ def add_override(
         return RedirectResponse(url="/login", status_code=303)
     
     override_date = datetime.strptime(date, "%Y-%m-%d").date()
+    try:
+        collection_minutes = parse_minutes(collection_time)
+    except ValueError as e:
+        return RedirectResponse(url=f"/overrides?date={date}&message={e}&error=true", status_code=303)
     
     existing = db.query(ManualOverride).filter(
         ManualOverride.date == override_date,
         ManualOverride.cpid == cpid,
         ManualOverride.trailer_number == trailer_number,
-        ManualOverride.collection_time == collection_time
+        ManualOverride.collection_minutes == collection_minutes
     ).first()
     
     if existing:
@@ -706,7 +571,7 @@ def add_override(
         date=override_date,
         cpid=cpid,
         trailer_number=trailer_number,
-        collection_time=collection_time,
+        collection_minutes=collection_minutes,
         to_depot_id=to_depot_id,
         created_by=user.id,
         created_at=datetime.utcnow()
@@ -723,7 +588,9 @@ def add_override(
         ip_address=request.client.host
     )
     db.add(audit)
+    override_changed(db, override_date)
     db.commit()
+    refresh_plans(db, [override_date])
     
     return RedirectResponse(
         url=f"/overrides?date={date}&message=Override added successfully",
@@ -731,6 +598,42 @@ def add_override(
     )
 
 
+@app.post("/overrides/import")
+def import_overrides_upload(
+    request: Request,
+    file: UploadFile = File(...),
+    date: str = Form(...),
+    db: Session = Depends(get_db)
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role not in ['Admin', 'Operator']:
+        return RedirectResponse(url="/login", status_code=303)
+    
+    # Validated as a whole before anything is written; the file applies completely or not at all
+    try:
+        result = import_overrides(
+            db, read_whole(iter_chunks(file.file, file.filename), OVERRIDE_COLUMNS), user.id,
+            ip_address=request.client.host
+        )
+    except Exception as e:
+        return RedirectResponse(url=f"/overrides?date={date}&message=Error reading file: {e}&error=true", status_code=303)
+    
+    if result.error_count:
+        errors = [f"Row {r.Row}: {r.Error}" for r in result.errors.head(3).itertuples()]
+        message = f"No overrides imported; {result.error_count} rows have errors. {'; '.join(errors)}"
+        return RedirectResponse(url=f"/overrides?date={date}&message={message}&error=true", status_code=303)
+    
+    for override_date in sorted(result.dates):
+        override_changed(db, override_date)
+    db.commit()
+    refresh_plans(db, sorted(result.dates))
+    
+    return RedirectResponse(
+        url=f"/overrides?date={date}&message=Imported {result.imported} overrides, {result.unchanged} already present",
+        status_code=303
+    )
+
+
 @app.post("/overrides/delete/{override_id}")
 def delete_override(
     request: Request,
@@ -754,9 +657,12 @@ def delete_override(
             new_value=None,
             ip_address=request.client.host
         )
+        override_date = override.date
         db.add(audit)
         db.delete(override)
+        override_changed(db, override_date)
         db.commit()
+        refresh_plans(db, [override_date])
     
     return RedirectResponse(
         url=f"/overrides?date={date}&message=Override deleted",
@@ -918,22 +824,21 @@ def depot_allocations_page(
         except ValueError:
             pass
     
-    allocations, _ = get_allocations(db, selected_date)
+    allocations, _, _ = get_plan(db, selected_date)
     
-    # Get capacity overrides for the date
-    capacity_overrides = db.query(CapacityOverride).filter(CapacityOverride.date == selected_date).all()
-    capacity_override_map = {co.depot_id: co.override_capacity for co in capacity_overrides}
+    # Capacity overrides and rules for the date
+    calendar = get_capacity_calendar(db)
     
     # Initialize ALL depots first
     all_depots = db.query(Depot).filter(Depot.is_active == True).all()
     depot_data = {}
     for depot in all_depots:
-        capacity = capacity_override_map.get(depot.depot_id, depot.daily_capacity)
+        capacity_source = calendar.source(depot.depot_id, selected_date)
         depot_data[depot.depot_id] = {
             'depot_id': depot.depot_id,
             'name': depot.name,
-            'capacity': capacity,
-            'has_override': depot.depot_id in capacity_override_map,
+            'capacity': capacity_source.capacity if capacity_source else depot.daily_capacity,
+            'has_override': capacity_source is not None,
             'allocated_parcels': 0,
             'trailer_count': 0,
             'allocations': []
@@ -978,7 +883,8 @@ def expected_costs_page(
     db: Session = Depends(get_db),
     date_str: str = Query(None, alias="date"),
     cpid: str = Query(None),
-    depot: str = Query(None)
+    depot: str = Query(None),
+    compare: bool = Query(False)
 ):
     user = get_current_user_from_cookie(request, db)
     if not user:
@@ -991,18 +897,32 @@ def expected_costs_page(
         except ValueError:
             pass
     
-    allocations, _ = get_allocations(db, selected_date)
+    allocations, _, _ = get_plan(db, selected_date, cpid=cpid, depot_id=depot)
+    
+    # Whole-day greedy vs optimised plan totals, on request as the optimiser takes longer
+    plan_comparison = None
+    if compare:
+        greedy_engine = ROUTING_ENGINE if ROUTING_ENGINE not in WHOLE_DAY_ENGINES else "python"
+        greedy = get_cached_state(db, selected_date, engine=greedy_engine).allocations
+        optimised = get_cached_state(db, selected_date, engine="flow").allocations
+        greedy_cost = sum(a['cost'] for a in greedy)
+        optimised_cost = sum(a['cost'] for a in optimised)
+        plan_comparison = {
+            'greedy_cost': greedy_cost,
+            'greedy_peak_arrivals': sum(1 for a in greedy if a['is_peak_arrival']),
+            'optimised_cost': optimised_cost,
+            'optimised_peak_arrivals': sum(1 for a in optimised if a['is_peak_arrival']),
+            'difference': optimised_cost - greedy_cost
+        }
     
     # Apply filters for clickable filtering
     filter_type = None
     filter_value = None
     
     if cpid:
-        allocations = [a for a in allocations if a['cpid'] == cpid]
         filter_type = "CPID"
         filter_value = cpid
     elif depot:
-        allocations = [a for a in allocations if a['depot_id'] == depot]
         filter_type = "Depot"
         depot_obj = db.query(Depot).filter(Depot.depot_id == depot).first()
         filter_value = depot_obj.name if depot_obj else depot
@@ -1077,7 +997,8 @@ def expected_costs_page(
         "costs_by_cp": costs_by_cp,
         "costs_by_depot": costs_by_depot,
         "filter_type": filter_type,
-        "filter_value": filter_value
+        "filter_value": filter_value,
+        "plan_comparison": plan_comparison
     })
 
 
@@ -1122,6 +1043,37 @@ def capacity_overrides_page(
         })
     
     depots = db.query(Depot).filter(Depot.is_active == True).order_by(Depot.name).all()
+    depot_names = {d.depot_id: d.name for d in depots}
+    usernames = {u.id: u.username for u in db.query(User.id, User.username)}
+    
+    rule_list = []
+    for r in db.query(CapacityRule).order_by(CapacityRule.depot_id, CapacityRule.start_date, CapacityRule.id):
+        rule_list.append({
+            'id': r.id,
+            'depot_id': r.depot_id,
+            'depot_name': depot_names.get(r.depot_id, ''),
+            'start_date': r.start_date.strftime('%Y-%m-%d'),
+            'end_date': r.end_date.strftime('%Y-%m-%d') if r.end_date else None,
+            'weekdays': format_weekdays(r.weekdays),
+            'override_capacity': r.override_capacity,
+            'reason': r.reason or '',
+            'created_by_name': usernames.get(r.created_by, ''),
+            'applies': rule_applies(r, selected_date)
+        })
+    
+    # Capacity each depot will route with on the selected date, and what sets it
+    calendar = get_capacity_calendar(db)
+    effective = []
+    for d in depots:
+        capacity_source = calendar.source(d.depot_id, selected_date)
+        effective.append({
+            'depot_id': d.depot_id,
+            'depot_name': d.name,
+            'normal_capacity': d.daily_capacity,
+            'capacity': capacity_source.capacity if capacity_source else d.daily_capacity,
+            'source': f"{'Override' if capacity_source.kind == 'override' else 'Rule'} #{capacity_source.id}" if capacity_source else 'Normal',
+            'reason': capacity_source.reason if capacity_source else ''
+        })
     
     return templates.TemplateResponse("capacity_overrides.html", {
         "request": request,
@@ -1129,7 +1081,11 @@ def capacity_overrides_page(
         "active_page": "capacity-overrides",
         "selected_date": selected_date.strftime("%Y-%m-%d"),
         "overrides": override_list,
+        "rules": rule_list,
+        "effective": effective,
+        "weekday_names": WEEKDAY_NAMES,
         "depots": depots,
+        "accepted_extensions": ",".join(FILE_FORMATS),
         "message": message,
         "error": error
     })
@@ -1183,7 +1139,9 @@ def add_capacity_override(
         ip_address=request.client.host
     )
     db.add(audit)
+    dates_changed(db, [override_date])
     db.commit()
+    refresh_plans(db, [override_date])
     
     return RedirectResponse(
         url=f"/capacity-overrides?date={date}&message=Capacity override added successfully",
@@ -1191,6 +1149,41 @@ def add_capacity_override(
     )
 
 
+@app.post("/capacity-overrides/import")
+def import_capacity_overrides_upload(
+    request: Request,
+    file: UploadFile = File(...),
+    date: str = Form(...),
+    db: Session = Depends(get_db)
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role not in ['Admin', 'Operator']:
+        return RedirectResponse(url="/login", status_code=303)
+    
+    # Validated as a whole, then upserted in one statement; the file applies completely or not at all
+    try:
+        result = import_capacity_overrides(
+            db, read_whole(iter_chunks(file.file, file.filename), CAPACITY_COLUMNS), user.id,
+            ip_address=request.client.host
+        )
+    except Exception as e:
+        return RedirectResponse(url=f"/capacity-overrides?date={date}&message=Error reading file: {e}&error=true", status_code=303)
+    
+    if result.error_count:
+        errors = [f"Row {r.Row}: {r.Error}" for r in result.errors.head(3).itertuples()]
+        message = f"No capacity overrides imported; {result.error_count} rows have errors. {'; '.join(errors)}"
+        return RedirectResponse(url=f"/capacity-overrides?date={date}&message={message}&error=true", status_code=303)
+    
+    dates_changed(db, result.dates)
+    db.commit()
+    refresh_plans(db, sorted(result.dates))
+    
+    return RedirectResponse(
+        url=f"/capacity-overrides?date={date}&message=Imported {result.created} capacity overrides, updated {result.updated}",
+        status_code=303
+    )
+
+
 @app.post("/capacity-overrides/delete/{override_id}")
 def delete_capacity_override(
     request: Request,
@@ -1214,9 +1207,12 @@ def delete_capacity_override(
             new_value=None,
             ip_address=request.client.host
         )
+        override_date = override.date
         db.add(audit)
         db.delete(override)
+        dates_changed(db, [override_date])
         db.commit()
+        refresh_plans(db, [override_date])
     
     return RedirectResponse(
         url=f"/capacity-overrides?date={date}&message=Capacity override deleted",
@@ -1224,6 +1220,124 @@ def delete_capacity_override(
     )
 
 
+def _rule_plan_dates(db: Session, rule: CapacityRule):
+    """Dates with a draft plan that a capacity rule covers, so they can be re-routed"""
+    query = db.query(AllocationRun.date).filter(AllocationRun.status == "Draft", AllocationRun.date >= rule.start_date)
+    if rule.end_date:
+        query = query.filter(AllocationRun.date <= rule.end_date)
+    return sorted(d for (d,) in query if rule_applies(rule, d))
+
+
+@app.post("/capacity-rules/add")
+def add_capacity_rule(
+    request: Request,
+    db: Session = Depends(get_db),
+    date: str = Form(...),
+    depot_id: str = Form(...),
+    start_date: str = Form(...),
+    end_date: str = Form(""),
+    weekdays: list[int] = Form([]),
+    override_capacity: int = Form(...),
+    reason: str = Form("")
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role not in ['Admin', 'Operator']:
+        return RedirectResponse(url="/login", status_code=303)
+    
+    try:
+        rule_start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        rule_end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+        if rule_end and rule_end < rule_start:
+            raise ValueError("End date is before start date")
+        if override_capacity < 0:
+            raise ValueError("Capacity can't be negative")
+        if any(d not in range(7) for d in weekdays):
+            raise ValueError("Invalid weekday")
+    except ValueError as e:
+        return RedirectResponse(url=f"/capacity-overrides?date={date}&message={e}&error=true", status_code=303)
+    
+    depot = db.query(Depot).filter(Depot.depot_id == depot_id, Depot.is_active == True).first()
+    if not depot:
+        return RedirectResponse(url=f"/capacity-overrides?date={date}&message=Depot not found&error=true", status_code=303)
+    
+    # Every weekday ticked is the same as none: the rule applies daily
+    days = sorted(set(weekdays))
+    rule = CapacityRule(
+        depot_id=depot_id,
+        start_date=rule_start,
+        end_date=rule_end,
+        weekdays=",".join(str(d) for d in days) if 0 < len(days) < 7 else None,
+        override_capacity=override_capacity,
+        reason=reason,
+        created_by=user.id,
+        created_at=datetime.utcnow()
+    )
+    db.add(rule)
+    db.flush()
+    
+    audit = AuditLog(
+        user_id=user.id,
+        action_type="CAPACITY_RULE_CREATED",
+        entity_type="CapacityRule",
+        entity_id=str(rule.id),
+        old_value=f"Original: {depot.daily_capacity}",
+        new_value=(
+            f"{depot_id} {rule_start} to {rule_end or 'open'}, {format_weekdays(rule.weekdays)}: "
+            f"{override_capacity}. Reason: {reason}"
+        ),
+        ip_address=request.client.host
+    )
+    db.add(audit)
+    # A rule can cover any number of dates, so every cached date is dropped
+    bump_data_version(db)
+    db.commit()
+    refresh_plans(db, _rule_plan_dates(db, rule))
+    
+    return RedirectResponse(
+        url=f"/capacity-overrides?date={date}&message=Capacity rule added successfully",
+        status_code=303
+    )
+
+
+@app.post("/capacity-rules/delete/{rule_id}")
+def delete_capacity_rule(
+    request: Request,
+    rule_id: int,
+    db: Session = Depends(get_db),
+    date: str = Form(...)
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role not in ['Admin', 'Operator']:
+        return RedirectResponse(url="/login", status_code=303)
+    
+    rule = db.query(CapacityRule).filter(CapacityRule.id == rule_id).first()
+    
+    if rule:
+        plan_dates = _rule_plan_dates(db, rule)
+        audit = AuditLog(
+            user_id=user.id,
+            action_type="CAPACITY_RULE_DELETED",
+            entity_type="CapacityRule",
+            entity_id=str(rule.id),
+            old_value=(
+                f"{rule.depot_id} {rule.start_date} to {rule.end_date or 'open'}, "
+                f"{format_weekdays(rule.weekdays)}: {rule.override_capacity}"
+            ),
+            new_value=None,
+            ip_address=request.client.host
+        )
+        db.add(audit)
+        db.delete(rule)
+        bump_data_version(db)
+        db.commit()
+        refresh_plans(db, plan_dates)
+    
+    return RedirectResponse(
+        url=f"/capacity-overrides?date={date}&message=Capacity rule deleted",
+        status_code=303
+    )
+
+
 @app.get("/admin/users")
 def user_management_page(
     request: Request,
@@ -1431,6 +1545,18 @@ def system_setup_page(
     })
 
 
+def _master_data_committed(db: Session):
+    """After committing a change to CPs, depots or distances: rebuild the distance artifact, then re-route everywhere.
+
+    Workers reload routing, artifact included, when the data version moves,
+    so it is bumped only once the artifact on disk matches the committed rows.
+    """
+    build_artifact(db)
+    bump_data_version(db)
+    db.commit()
+    discard_draft_plans(db)
+
+
 @app.post("/admin/setup/add-cp")
 def add_collection_point(
     request: Request,
@@ -1461,50 +1587,183 @@ def add_collection_point(
     db.add(new_cp)
     db.commit()
     
-    from math import radians, sin, cos, sqrt, atan2
+    distance_count = add_cp_distances(db, cpid, latitude, longitude)
+    db.commit()
+    _master_data_committed(db)
     
-    def haversine_miles(lat1, lon1, lat2, lon2):
-        R = 3959
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        return R * c
+    audit = AuditLog(
+        user_id=user.id,
+        action_type="CP_CREATED",
+        entity_type="CollectionPoint",
+        entity_id=cpid,
+        old_value=None,
+        new_value=f"{name} at {latitude}, {longitude}",
+        ip_address=request.client.host
+    )
+    db.add(audit)
+    db.commit()
     
-    depots = db.query(Depot).all()
-    distances = []
-    for depot in depots:
-        dist = haversine_miles(latitude, longitude, depot.latitude, depot.longitude)
-        distances.append((depot.depot_id, dist))
+    return RedirectResponse(
+        url=f"/admin/setup?message=Collection Point {cpid} added with {distance_count} distance calculations",
+        status_code=303
+    )
+
+
+@app.post("/admin/setup/add-depot")
+def add_depot(
+    request: Request,
+    db: Session = Depends(get_db),
+    depot_id: str = Form(...),
+    name: str = Form(...),
+    latitude: float = Form(...),
+    longitude: float = Form(...),
+    capacity: int = Form(...),
+    sortation_start_time: str = Form("08:00"),
+    cutoff_time: str = Form("18:00")
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role != 'Admin':
+        return RedirectResponse(url="/dashboard", status_code=303)
     
-    distances.sort(key=lambda x: x[1])
+    existing = db.query(Depot).filter(Depot.depot_id == depot_id).first()
+    if existing:
+        return RedirectResponse(
+            url=f"/admin/setup?message=Depot {depot_id} already exists&error=true",
+            status_code=303
+        )
     
-    for rank, (depot_id, dist) in enumerate(distances, 1):
-        record = CPDepotDistance(
-            cpid=cpid,
-            depot_id=depot_id,
-            distance_miles=round(dist, 2),
-            rank=rank
+    try:
+        start_minutes = parse_minutes(sortation_start_time)
+        cutoff_minutes = parse_minutes(cutoff_time)
+    except ValueError as e:
+        return RedirectResponse(url=f"/admin/setup?message={e}&error=true", status_code=303)
+    if cutoff_minutes <= start_minutes:
+        return RedirectResponse(
+            url="/admin/setup?message=Cutoff time must be after sortation start&error=true",
+            status_code=303
         )
-        db.add(record)
     
-    db.commit()
+    depot = Depot(
+        depot_id=depot_id,
+        name=name,
+        latitude=latitude,
+        longitude=longitude,
+        daily_capacity=capacity,
+        sortation_start_minutes=start_minutes,
+        cutoff_minutes=cutoff_minutes,
+        is_active=True
+    )
+    db.add(depot)
+    db.flush()
+    
+    # New column of the distance table, in the same transaction as the depot
+    distance_count = update_depot_distances(db, depot_id, latitude, longitude)
     
     audit = AuditLog(
         user_id=user.id,
-        action_type="CP_CREATED",
-        entity_type="CollectionPoint",
-        entity_id=cpid,
+        action_type="DEPOT_CREATED",
+        entity_type="Depot",
+        entity_id=depot_id,
         old_value=None,
+        new_value=f"{name} at {latitude}, {longitude}, capacity {capacity}",
+        ip_address=request.client.host
+    )
+    db.add(audit)
+    db.commit()
+    _master_data_committed(db)
+    
+    return RedirectResponse(
+        url=f"/admin/setup?message=Depot {depot_id} added with {distance_count} distance rows written",
+        status_code=303
+    )
+
+
+@app.post("/admin/setup/update-depot")
+def update_depot(
+    request: Request,
+    db: Session = Depends(get_db),
+    depot_id: str = Form(...),
+    name: str = Form(...),
+    latitude: float = Form(...),
+    longitude: float = Form(...)
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role != 'Admin':
+        return RedirectResponse(url="/dashboard", status_code=303)
+    
+    depot = db.query(Depot).filter(Depot.depot_id == depot_id).first()
+    if not depot:
+        return RedirectResponse(url="/admin/setup?message=Depot not found&error=true", status_code=303)
+    
+    old_value = f"{depot.name} at {depot.latitude}, {depot.longitude}"
+    moved = depot.latitude != latitude or depot.longitude != longitude
+    depot.name = name
+    depot.latitude = latitude
+    depot.longitude = longitude
+    
+    # Inactive depots have no distance rows; they are recomputed on reactivation
+    distance_count = 0
+    if moved and depot.is_active:
+        distance_count = update_depot_distances(db, depot_id, latitude, longitude)
+    
+    audit = AuditLog(
+        user_id=user.id,
+        action_type="DEPOT_UPDATED",
+        entity_type="Depot",
+        entity_id=depot_id,
+        old_value=old_value,
         new_value=f"{name} at {latitude}, {longitude}",
         ip_address=request.client.host
     )
     db.add(audit)
     db.commit()
+    _master_data_committed(db)
+    
+    message = f"Depot {depot_id} updated"
+    if moved:
+        message += f", {distance_count} distance rows rewritten"
+    return RedirectResponse(url=f"/admin/setup?message={message}", status_code=303)
+
+
+@app.post("/admin/setup/depot-status")
+def set_depot_status(
+    request: Request,
+    db: Session = Depends(get_db),
+    depot_id: str = Form(...),
+    is_active: bool = Form(...)
+):
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role != 'Admin':
+        return RedirectResponse(url="/dashboard", status_code=303)
+    
+    depot = db.query(Depot).filter(Depot.depot_id == depot_id).first()
+    if not depot:
+        return RedirectResponse(url="/admin/setup?message=Depot not found&error=true", status_code=303)
+    
+    if depot.is_active == is_active:
+        return RedirectResponse(url=f"/admin/setup?message=No change for {depot.name}", status_code=303)
+    
+    depot.is_active = is_active
+    if is_active:
+        distance_count = update_depot_distances(db, depot_id, depot.latitude, depot.longitude)
+    else:
+        distance_count = remove_depot_distances(db, depot_id)
+    
+    audit = AuditLog(
+        user_id=user.id,
+        action_type="DEPOT_ACTIVATED" if is_active else "DEPOT_DEACTIVATED",
+        entity_type="Depot",
+        entity_id=depot_id,
+        old_value="Inactive" if is_active else "Active",
+        new_value="Active" if is_active else "Inactive",
+        ip_address=request.client.host
+    )
+    db.add(audit)
+    db.commit()
+    _master_data_committed(db)
     
     return RedirectResponse(
-        url=f"/admin/setup?message=Collection Point {cpid} added with {len(distances)} distance calculations",
+        url=f"/admin/setup?message={depot.name} {'activated' if is_active else 'deactivated'}, {distance_count} distance rows written",
         status_code=303
     )
 
@@ -1535,7 +1794,9 @@ def update_depot_capacity(
             ip_address=request.client.host
         )
         db.add(audit)
+        bump_data_version(db)
         db.commit()
+        discard_draft_plans(db)
         
         return RedirectResponse(
             url=f"/admin/setup?message=Capacity updated for {depot.name}",
@@ -1544,6 +1805,16 @@ def update_depot_capacity(
     
     return RedirectResponse(url="/admin/setup?message=Depot not found&error=true", status_code=303)
 
+@app.get("/admin/allocation-cache")
+def allocation_cache_stats(request: Request, db: Session = Depends(get_db)):
+    """Allocation cache hit/miss counters as JSON"""
+    user = get_current_user_from_cookie(request, db)
+    if not user or user.role != 'Admin':
+        return RedirectResponse(url="/dashboard", status_code=303)
+
+    return cache_stats()
+
+
 @app.get("/admin/setup/export-cps")
 def export_collection_points(request: Request, db: Session = Depends(get_db)):
     """Export all collection points to Excel"""
@@ -1635,18 +1906,14 @@ def depot_times_page(
     # Calculate window hours for each depot
     depots = []
     for d in depots_raw:
-        start_time = d.sortation_start_time or "08:00"
-        cutoff_time = d.cutoff_time or "18:00"
-        start_mins = int(start_time.split(':')[0]) * 60 + int(start_time.split(':')[1])
-        cutoff_mins = int(cutoff_time.split(':')[0]) * 60 + int(cutoff_time.split(':')[1])
-        window_hours = round((cutoff_mins - start_mins) / 60, 1)
+        window_hours = round((d.cutoff_minutes - d.sortation_start_minutes) / 60, 1)
         
         depots.append({
             'depot_id': d.depot_id,
             'name': d.name,
             'daily_capacity': d.daily_capacity,
-            'sortation_start_time': start_time,
-            'cutoff_time': cutoff_time,
+            'sortation_start_minutes': d.sortation_start_minutes,
+            'cutoff_minutes': d.cutoff_minutes,
             'window_hours': window_hours
         })
     
@@ -1676,6 +1943,7 @@ async def update_depot_times(
     
     depots = db.query(Depot).filter(Depot.is_active == True).all()
     updated = 0
+    invalid = []
     
     for depot in depots:
         start_key = f"start_{depot.depot_id}"
@@ -1685,14 +1953,30 @@ async def update_depot_times(
         new_cutoff = form_data.get(cutoff_key)
         
         if new_start and new_cutoff:
-            if depot.sortation_start_time != new_start or depot.cutoff_time != new_cutoff:
-                depot.sortation_start_time = new_start
-                depot.cutoff_time = new_cutoff
+            try:
+                start_minutes = parse_minutes(new_start)
+                cutoff_minutes = parse_minutes(new_cutoff)
+            except ValueError:
+                invalid.append(depot.depot_id)
+                continue
+            if cutoff_minutes <= start_minutes:
+                invalid.append(depot.depot_id)
+                continue
+            if depot.sortation_start_minutes != start_minutes or depot.cutoff_minutes != cutoff_minutes:
+                depot.sortation_start_minutes = start_minutes
+                depot.cutoff_minutes = cutoff_minutes
                 updated += 1
     
-    db.commit()
+    # A submit that changes nothing keeps every worker's cache and the stored drafts
+    if updated:
+        bump_data_version(db)
+        db.commit()
+        discard_draft_plans(db)
     
+    message = f"Updated {updated} depot(s)"
+    if invalid:
+        message += f". Invalid window for {', '.join(invalid)}"
     return RedirectResponse(
-        url=f"/depot-times?message=Updated {updated} depot(s)",
+        url=f"/depot-times?message={message}&error={'true' if invalid else 'false'}",
         status_code=303
     )
\ No newline at end of file
@@ -0,0 +1,277 @@
+from datetime import datetime
+from sqlalchemy import DateTime, Float, Integer, String, insert, inspect, select, text
+from app.models import DataVersion, SchemaRevision
+from app.times import (
+    DEFAULT_COLLECTION_MINUTES, DEFAULT_CUTOFF_MINUTES, DEFAULT_SORTATION_START_MINUTES, parse_minutes
+)
+
+# HH:MM string columns replaced by integer minutes: (table, old column, new column, value for blank/invalid times).
+# Only arrival times run past midnight.
+TIME_COLUMNS = [
+    ("daily_volumes", "collection_time", "collection_minutes", DEFAULT_COLLECTION_MINUTES),
+    ("manual_overrides", "collection_time", "collection_minutes", DEFAULT_COLLECTION_MINUTES),
+    ("depots", "sortation_start_time", "sortation_start_minutes", DEFAULT_SORTATION_START_MINUTES),
+    ("depots", "cutoff_time", "cutoff_minutes", DEFAULT_CUTOFF_MINUTES),
+    ("trailer_allocations", "collection_time", "collection_minutes", None),
+    ("trailer_allocations", "arrival_time", "arrival_minutes", None),
+]
+
+
+def migrate_time_columns(engine):
+    """Add the integer minute columns, filling them from any HH:MM string columns, then drop the strings.
+
+    Tables that never had the string column still get the minute column,
+    filled with its default. Each table is handled in its own transaction
+    and skipped once it has the minute column and no string column, so the
+    migration can be run again safely. Returns a description of each
+    column added or converted and how many values were invalid.
+    """
+    inspector = inspect(engine)
+    migrated = []
+    for table, old, new, default in TIME_COLUMNS:
+        if not inspector.has_table(table):
+            continue
+        columns = {c["name"] for c in inspector.get_columns(table)}
+        if new in columns and old not in columns:
+            continue
+
+        with engine.begin() as conn:
+            if new not in columns:
+                column_type = "INTEGER" if default is None else f"INTEGER NOT NULL DEFAULT {default}"
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {new} {column_type}"))
+            if old not in columns:
+                migrated.append(f"{table}.{new} added (existing rows set to {default})")
+                continue
+
+            updates = []
+            invalid = 0
+            for row_id, value in conn.execute(text(f"SELECT id, {old} FROM {table}")).all():
+                minutes = default
+                if value:
+                    try:
+                        minutes = parse_minutes(value, past_midnight=(new == "arrival_minutes"))
+                    except ValueError:
+                        invalid += 1
+                updates.append({"row_id": row_id, "minutes": minutes})
+            if updates:
+                conn.execute(text(f"UPDATE {table} SET {new} = :minutes WHERE id = :row_id"), updates)
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {old}"))
+        migrated.append(f"{table}.{old} -> {new} ({len(updates)} rows, {invalid} invalid set to default)")
+    return migrated
+
+
+# Nullable columns the models gained after their tables first shipped: (table, column, type, SQL default or None).
+# Adding them is its own revision so the index revisions after it can use them.
+NEW_COLUMNS = [
+    ("users", "failed_login_attempts", Integer(), "0"),
+    ("users", "locked_until", DateTime(), None),
+    ("cp_depot_distances", "travel_minutes", Float(), None),
+    ("import_jobs", "source", String(20), None),
+    ("import_jobs", "mode", String(20), None),
+    ("import_jobs", "sha256", String(64), None),
+]
+
+# Indexes on NEW_COLUMNS, in add_indexes form
+NEW_COLUMN_INDEXES = [
+    ("import_jobs", "ix_import_jobs_sha256", ("sha256",), False),
+]
+
+
+# Owner of a watched-folder job, so startup recovery leaves other live processes' files alone
+IMPORT_JOB_OWNER_COLUMNS = [
+    ("import_jobs", "owner", String(100), None),
+]
+
+# Master data version stamps for stored plans; runs from before them are treated as stale
+PLAN_VERSION_COLUMNS = [
+    ("data_version", "master_version", Integer(), "0"),
+    ("allocation_runs", "data_version", Integer(), None),
+]
+
+
+def add_new_columns(engine, columns=None):
+    """Add the columns missing from existing tables, NEW_COLUMNS by default. Returns each column added."""
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table, column, column_type, default in (NEW_COLUMNS if columns is None else columns):
+            if not inspector.has_table(table) or column in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            definition = column_type.compile(dialect=engine.dialect)
+            if default is not None:
+                definition += f" DEFAULT {default}"
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            added.append(f"{table}.{column} added")
+    return added
+
+
+# Indexes the models declare that tables created before them lack: (table, index name, columns, unique)
+UPSERT_INDEXES = [
+    ("daily_volumes", "uq_daily_volumes_date_cpid", ("date", "cpid"), True),
+    ("capacity_overrides", "uq_capacity_overrides_date_depot_id", ("date", "depot_id"), True),
+]
+
+# Composite indexes matching how the hot queries filter and order; see app.query_plans
+HOT_QUERY_INDEXES = [
+    ("manual_overrides", "uq_manual_overrides_date_cpid_trailer", ("date", "cpid", "trailer_number", "collection_minutes"), True),
+    ("cp_depot_distances", "uq_cp_depot_distances_cpid_depot_id", ("cpid", "depot_id"), True),
+    ("cp_depot_distances", "ix_cp_depot_distances_cpid_rank", ("cpid", "rank", "depot_id", "distance_miles", "travel_minutes"), False),
+]
+
+# Single-column date indexes made redundant by a composite index that leads with date
+REDUNDANT_INDEXES = [
+    ("daily_volumes", "ix_daily_volumes_date"),
+    ("manual_overrides", "ix_manual_overrides_date"),
+    ("capacity_overrides", "ix_capacity_overrides_date"),
+]
+
+
+# Repeated keys listed when a unique index can't be added
+MAX_LISTED_REPEATS = 20
+
+
+def repeated_keys(conn, table: str, columns):
+    """[(key values..., row count)] for each key that more than one row of table shares"""
+    column_list = ", ".join(columns)
+    return conn.execute(text(
+        f"SELECT {column_list}, COUNT(*) FROM {table} GROUP BY {column_list} HAVING COUNT(*) > 1 ORDER BY {column_list}"
+    )).all()
+
+
+def add_indexes(engine, indexes):
+    """Create the indexes missing from existing tables.
+
+    create_all only builds indexes along with new tables. A unique index is
+    not added over rows that repeat its key: which row to keep is for
+    someone to decide, so a ValueError lists the repeats and nothing is
+    deleted. Indexes added before it stay, and the revision is run again by
+    the next upgrade. Returns a description of each index added.
+    """
+    inspector = inspect(engine)
+    added = []
+    for table, name, columns, unique in indexes:
+        if not inspector.has_table(table):
+            continue
+        if any(i["name"] == name for i in inspector.get_indexes(table)):
+            continue
+
+        column_list = ", ".join(columns)
+        with engine.begin() as conn:
+            if unique:
+                repeats = repeated_keys(conn, table, columns)
+                if repeats:
+                    listed = "; ".join(
+                        f"{', '.join(str(v) for v in key[:-1])} ({key[-1]} rows)" for key in repeats[:MAX_LISTED_REPEATS]
+                    )
+                    more = f" and {len(repeats) - MAX_LISTED_REPEATS} more" if len(repeats) > MAX_LISTED_REPEATS else ""
+                    raise ValueError(
+                        f"Can't add unique index {name}: {len(repeats)} ({column_list}) keys of {table} have more "
+                        f"than one row: {listed}{more}. Remove the extra rows and upgrade again."
+                    )
+                conn.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({column_list})"))
+                added.append(f"unique index {name} on {table}")
+            else:
+                conn.execute(text(f"CREATE INDEX {name} ON {table} ({column_list})"))
+                added.append(f"index {name} on {table}")
+    return added
+
+
+def drop_indexes(engine, indexes):
+    """Drop indexes by name where they exist. Returns a description of each one dropped."""
+    inspector = inspect(engine)
+    dropped = []
+    for table, name in indexes:
+        if not inspector.has_table(table) or not any(i["name"] == name for i in inspector.get_indexes(table)):
+            continue
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX {name}"))
+        dropped.append(f"index {name} on {table}")
+    return dropped
+
+
+def _new_columns(engine):
+    return add_new_columns(engine) + add_indexes(engine, NEW_COLUMN_INDEXES)
+
+
+def _hot_query_indexes(engine):
+    return add_indexes(engine, HOT_QUERY_INDEXES) + [f"dropped {d}" for d in drop_indexes(engine, REDUNDANT_INDEXES)]
+
+
+def seed_data_version(engine):
+    """Add the single data_version row the allocation caches check"""
+    with engine.begin() as conn:
+        if conn.execute(select(DataVersion.id).where(DataVersion.id == 1)).first():
+            return []
+        conn.execute(insert(DataVersion).values(id=1, version=0))
+    return ["data_version row added"]
+
+
+def add_import_job_sha256_index(engine):
+    """Unique (sha256, mode) over import jobs that haven't failed, first marking repeats left by earlier races Duplicate.
+
+    Before the index, two imports of the same file at once could both pass
+    the repeat check. The later jobs' rows stay imported; only their status
+    changes, so the index can be built.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("import_jobs"):
+        return []
+    if any(i["name"] == "uq_import_jobs_sha256_mode" for i in inspector.get_indexes("import_jobs")):
+        return []
+
+    active = "status IN ('Queued', 'Running', 'Completed')"
+    with engine.begin() as conn:
+        # Each active job paired with the first active job for the same contents and mode, if earlier
+        repeats = conn.execute(text(
+            f"SELECT id, first_id FROM (SELECT j.id, (SELECT MIN(f.id) FROM import_jobs f "
+            f"WHERE f.sha256 = j.sha256 AND f.mode = j.mode AND f.{active}) AS first_id "
+            f"FROM import_jobs j WHERE j.{active}) paired WHERE id > first_id"
+        )).all()
+        if repeats:
+            conn.execute(
+                text("UPDATE import_jobs SET status = 'Duplicate', message = :message WHERE id = :job_id"),
+                [{"job_id": job_id, "message": f"Same file imported at the same time as job {first_id}"} for job_id, first_id in repeats]
+            )
+        conn.execute(text(f"CREATE UNIQUE INDEX uq_import_jobs_sha256_mode ON import_jobs (sha256, mode) WHERE {active}"))
+    return [f"unique index uq_import_jobs_sha256_mode on import_jobs ({len(repeats)} repeated jobs marked Duplicate)"]
+
+
+# Schema revisions in the order they apply: (revision, description, function of the engine returning changes made).
+# Append new ones; never edit or reorder a revision once released. Each must be safe to run on a database that
+# already has its changes, as new databases get the full schema from create_all before any revision runs.
+REVISIONS = [
+    ("0001_time_minutes", "HH:MM time columns to integer minutes", migrate_time_columns),
+    ("0002_new_columns", "Columns added to existing tables", _new_columns),
+    ("0003_upsert_indexes", "Unique indexes for volume and capacity upserts", lambda engine: add_indexes(engine, UPSERT_INDEXES)),
+    ("0004_hot_query_indexes", "Composite indexes for the hot queries", _hot_query_indexes),
+    ("0005_data_version", "Shared data version for the allocation caches", seed_data_version),
+    ("0006_import_job_owner", "Owning process of watched-folder jobs", lambda engine: add_new_columns(engine, IMPORT_JOB_OWNER_COLUMNS)),
+    ("0007_import_job_sha256", "Unique file contents per mode for import jobs", add_import_job_sha256_index),
+    ("0008_plan_data_version", "Master data version stored plans were routed at", lambda engine: add_new_columns(engine, PLAN_VERSION_COLUMNS)),
+]
+
+
+def applied_revisions(engine):
+    """{revision: applied_at} for the revisions recorded in schema_revisions"""
+    SchemaRevision.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return dict(conn.execute(select(SchemaRevision.revision, SchemaRevision.applied_at)).all())
+
+
+def upgrade(engine):
+    """Run each revision not yet recorded, in order, recording it once it succeeds.
+
+    A revision that fails part way is not recorded, so the next upgrade
+    runs it again. Returns (revision, change) for every change made.
+    """
+    applied = applied_revisions(engine)
+    changes = []
+    for revision, description, migrate in REVISIONS:
+        if revision in applied:
+            continue
+        changes.extend((revision, change) for change in migrate(engine))
+        with engine.begin() as conn:
+            conn.execute(insert(SchemaRevision).values(
+                revision=revision, description=description, applied_at=datetime.utcnow()
+            ))
+    return changes
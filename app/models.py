@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, Index, text
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.times import DEFAULT_COLLECTION_MINUTES, DEFAULT_CUTOFF_MINUTES, DEFAULT_SORTATION_START_MINUTES
 from datetime import datetime
 
 
@@ -39,8 +40,8 @@ class Depot(Base):
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     daily_capacity = Column(Integer, nullable=False, default=10000)
-    sortation_start_time = Column(String(5), default="08:00")
-    cutoff_time = Column(String(5), default="18:00")
+    sortation_start_minutes = Column(Integer, nullable=False, default=DEFAULT_SORTATION_START_MINUTES)  # Minutes since midnight
+    cutoff_minutes = Column(Integer, nullable=False, default=DEFAULT_CUTOFF_MINUTES)
     is_active = Column(Boolean, default=True)
 
 
@@ -48,38 +49,85 @@ class DailyVolume(Base):
     __tablename__ = "daily_volumes"
     
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False, index=True)
+    date = Column(Date, nullable=False)  # Date lookups use uq_daily_volumes_date_cpid
     cpid = Column(String(20), ForeignKey("collection_points.cpid"), nullable=False)
     parcels = Column(Integer, nullable=False)
     trailers = Column(Integer, nullable=False)
     imported_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     imported_at = Column(DateTime, default=datetime.utcnow)
-    collection_time = Column(String(5), default="09:00")
+    collection_minutes = Column(Integer, nullable=False, default=DEFAULT_COLLECTION_MINUTES)  # Minutes since midnight
+    
+    __table_args__ = (
+        # One volume per CP per day; imports upsert against it
+        Index("uq_daily_volumes_date_cpid", "date", "cpid", unique=True),
+    )
 
 
 class ManualOverride(Base):
     __tablename__ = "manual_overrides"
     
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False, index=True)
+    date = Column(Date, nullable=False)
     cpid = Column(String(20), ForeignKey("collection_points.cpid"), nullable=False)
     trailer_number = Column(Integer, nullable=False)
-    collection_time = Column(String(5), default="09:00")
+    collection_minutes = Column(Integer, nullable=False, default=DEFAULT_COLLECTION_MINUTES)
     to_depot_id = Column(String(20), ForeignKey("depots.depot_id"), nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # One override per trailer, matched by its collection time; also serves lookups by date
+        Index(
+            "uq_manual_overrides_date_cpid_trailer", "date", "cpid", "trailer_number", "collection_minutes", unique=True
+        ),
+    )
 
 
 class CapacityOverride(Base):
     __tablename__ = "capacity_overrides"
     
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False, index=True)
+    date = Column(Date, nullable=False)
     depot_id = Column(String(20), ForeignKey("depots.depot_id"), nullable=False)
     override_capacity = Column(Integer, nullable=False)
     reason = Column(String(255), nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # One override per depot per day; bulk imports upsert against it
+        Index("uq_capacity_overrides_date_depot_id", "date", "depot_id", unique=True),
+    )
+
+
+class CapacityRule(Base):
+    __tablename__ = "capacity_rules"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    depot_id = Column(String(20), ForeignKey("depots.depot_id"), nullable=False, index=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=True)  # Inclusive; open-ended if null
+    weekdays = Column(String(20), nullable=True)  # Comma-separated, Monday 0; every day if null
+    override_capacity = Column(Integer, nullable=False)
+    reason = Column(String(255), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SchemaRevision(Base):
+    __tablename__ = "schema_revisions"
+    
+    revision = Column(String(50), primary_key=True)  # One row per migration applied by app.migrations.upgrade
+    description = Column(String(255), nullable=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+    
+    id = Column(Integer, primary_key=True)  # A single row, id 1
+    version = Column(Integer, nullable=False, default=0)  # Bumped in the transaction of every write that affects routing
+    master_version = Column(Integer, nullable=False, default=0)  # version at the last write affecting every date
 
 
 class AuditLog(Base):
@@ -103,4 +151,90 @@ class CPDepotDistance(Base):
     cpid = Column(String(20), ForeignKey("collection_points.cpid"), nullable=False)
     depot_id = Column(String(20), ForeignKey("depots.depot_id"), nullable=False)
     distance_miles = Column(Float, nullable=False)
+    travel_minutes = Column(Float, nullable=True)  # From the distance provider; empty on rows that predate it
     rank = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("uq_cp_depot_distances_cpid_depot_id", "cpid", "depot_id", unique=True),
+        # Covers the ranked read routing and the distance artifact make, so neither sorts nor visits the table.
+        # Not unique: re-ranking a CP updates its rows one at a time.
+        Index(
+            "ix_cp_depot_distances_cpid_rank", "cpid", "rank", "depot_id", "distance_miles", "travel_minutes"
+        ),
+    )
+
+
+class AllocationRun(Base):
+    __tablename__ = "allocation_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date, unique=True, index=True, nullable=False)  # One current plan per date
+    status = Column(String(20), nullable=False, default="Draft")  # Draft, Published
+    engine = Column(String(20), nullable=False)
+    total_trailers = Column(Integer, nullable=False, default=0)
+    total_parcels = Column(Integer, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0)
+    depot_summary = Column(Text, nullable=True)  # JSON list of depot summaries
+    created_at = Column(DateTime, default=datetime.utcnow)
+    published_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    published_at = Column(DateTime, nullable=True)
+    data_version = Column(Integer, nullable=True)  # DataVersion.master_version routed at; a draft from an older one is re-routed
+
+
+class TrailerAllocation(Base):
+    __tablename__ = "trailer_allocations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("allocation_runs.id"), nullable=False, index=True)
+    date = Column(Date, nullable=False)
+    position = Column(Integer, nullable=False)  # Routing order within the day
+    cpid = Column(String(20), ForeignKey("collection_points.cpid"), nullable=False)
+    cp_name = Column(String(100), nullable=False)
+    trailer_number = Column(Integer, nullable=False)
+    parcels = Column(Integer, nullable=False)
+    depot_id = Column(String(20), ForeignKey("depots.depot_id"), nullable=False)
+    depot_name = Column(String(100), nullable=False)
+    distance_miles = Column(Float, nullable=False)
+    cost = Column(Float, nullable=False)
+    is_override = Column(Boolean, default=False)
+    is_peak_arrival = Column(Boolean, default=False)
+    collection_minutes = Column(Integer, nullable=True)
+    arrival_minutes = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_trailer_allocations_date_cpid", "date", "cpid"),
+        Index("ix_trailer_allocations_date_depot_id", "date", "depot_id"),
+    )
+
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String(255), nullable=False)
+    source = Column(String(20), nullable=True, default="upload")  # upload, folder
+    owner = Column(String(100), nullable=True)  # host-pid of the process importing a folder file
+    mode = Column(String(20), nullable=True, default="skip")  # skip or replace volumes already stored
+    sha256 = Column(String(64), nullable=True, index=True)  # Of the file's bytes, to reject repeats
+    spool_path = Column(String(500), nullable=True)  # Spooled upload, or the claimed file for folder imports
+    status = Column(String(20), nullable=False, default="Queued", index=True)  # Queued, Running, Completed, Failed, Duplicate
+    rows_processed = Column(Integer, nullable=False, default=0)
+    imported = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    errors = Column(Text, nullable=True)  # JSON list of the first row errors as [row, message]
+    message = Column(Text, nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    ip_address = Column(String(45), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # A file's contents are imported once per mode; failed and duplicate jobs don't count
+        Index(
+            "uq_import_jobs_sha256_mode", "sha256", "mode", unique=True,
+            sqlite_where=text("status IN ('Queued', 'Running', 'Completed')"),
+            postgresql_where=text("status IN ('Queued', 'Running', 'Completed')")
+        ),
+    )
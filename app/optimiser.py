@@ -0,0 +1,206 @@
+import numpy as np
+from app.routing import (
+    CapacityLedger, RoutingContext, allocate_trailers, calculate_cost, nearest_open_depot, trailer_arrival
+)
+import os
+
+# Candidate depots considered per trailer, nearest first among those it can physically reach in time
+FLOW_CANDIDATES = int(os.getenv("FLOW_CANDIDATES", "12"))
+
+# Solver wall-clock limit in seconds; the greedy plan is used if it is hit
+FLOW_TIME_LIMIT = float(os.getenv("FLOW_TIME_LIMIT", "20"))
+
+# Cost of leaving a trailer as a Peak Arrival, on top of its haulage to the nearest depot.
+# Far above any single haulage cost so the solver always places a trailer if it can.
+PEAK_ARRIVAL_PENALTY = 10000
+
+
+def allocate_trailers_flow(context: RoutingContext, trailers, override_map, ledger: CapacityLedger):
+    """Whole-day optimised allocation over a trailer -> depot flow network.
+
+    Same contract as routing.allocate_trailers. Every non-overridden trailer
+    is a unit of supply with an edge to each depot it can reach before cutoff
+    with room in its arrival slot, costed with calculate_cost. Each depot
+    drains through a chain of arrival-slot nodes, latest first, where the
+    edge leaving the node for slot k carries everything arriving in slot k or
+    later and is capped at the ledger's remaining capacity from that slot.
+    Manual overrides are fixed inflows on their depot's chain. A trailer that
+    cannot be placed takes a heavily penalised Peak Arrival edge and, like
+    the greedy router, goes to the nearest open depot.
+
+    The network is solved as a linear program with HiGHS via scipy. A trailer
+    cannot be split between depots, so any trailer the LP splits goes to its
+    largest share that still fits, or its cheapest other depot that fits, and
+    is otherwise a Peak Arrival. If no plan comes back in time the greedy
+    assignment is used instead.
+    """
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+
+    depot_base_capacities = ledger.depot_base_capacities
+
+    # Arrival slots per depot: slot -> fixed override inflow in that slot
+    levels = {d.depot_id: {} for d in context.depots}
+    free = []
+    edges = []
+
+    for position, (cpid, cp_name, trailer_num, trailer_parcels, collection_mins) in enumerate(trailers):
+        override_key = (cpid, trailer_num, collection_mins)
+        if override_key in override_map:
+            depot_id = override_map[override_key]
+            if depot_id in levels:
+                slot = ledger.slot(ledger.depot_index[depot_id], trailer_arrival(context, cpid, collection_mins, depot_id))
+                levels[depot_id][slot] = levels[depot_id].get(slot, 0) + trailer_parcels
+            continue
+
+        free.append(position)
+        candidates = 0
+        for depot_id, distance_miles, offset in context.iter_ranked(cpid):
+            if candidates >= FLOW_CANDIDATES:
+                break
+            if depot_id not in levels or depot_base_capacities.get(depot_id, 0) <= 0:
+                continue
+            arrival_mins = collection_mins + offset
+            if not ledger.fits(depot_id, arrival_mins, trailer_parcels):
+                continue
+            slot = ledger.slot(ledger.depot_index[depot_id], arrival_mins)
+            levels[depot_id].setdefault(slot, 0)
+            edges.append((len(free) - 1, depot_id, slot, calculate_cost(distance_miles), trailer_parcels))
+            candidates += 1
+
+    # Variable layout: one per trailer->depot edge, one Peak Arrival per free trailer, one per chain edge
+    n_edges = len(edges)
+    n_free = len(free)
+    chain_index = {}
+    chain_upper = []
+    for depot_id, depot_levels in levels.items():
+        if not depot_levels:
+            continue
+        col = ledger.depot_index[depot_id]
+        fixed_after = 0
+        for slot in sorted(depot_levels, reverse=True):
+            fixed_after += depot_levels[slot]
+            chain_index[(depot_id, slot)] = n_edges + n_free + len(chain_upper)
+            capacity = max(int(ledger.headroom[col, slot]), 0)
+            # Overrides are honoured even when they alone exceed the capacity
+            chain_upper.append(max(capacity, fixed_after))
+    n_vars = n_edges + n_free + len(chain_upper)
+
+    if n_free == 0:
+        return _collect(context, trailers, override_map, ledger, {})
+
+    cost = np.zeros(n_vars)
+    rows, cols, vals = [], [], []
+
+    # Each free trailer goes to exactly one depot or is a Peak Arrival
+    for e, (trailer_row, depot_id, slot, edge_cost, parcels) in enumerate(edges):
+        cost[e] = edge_cost
+        rows.append(trailer_row)
+        cols.append(e)
+        vals.append(1)
+    for trailer_row, position in enumerate(free):
+        cpid = trailers[position][0]
+        nearest, _ = nearest_open_depot(context, cpid, depot_base_capacities)
+        nearest_cost = calculate_cost(context.distance_to(cpid, nearest)) if nearest else 0
+        cost[n_edges + trailer_row] = PEAK_ARRIVAL_PENALTY + nearest_cost
+        rows.append(trailer_row)
+        cols.append(n_edges + trailer_row)
+        vals.append(1)
+
+    # Chain conservation: flow(slot) - flow(next later slot) - trailer inflow = fixed override inflow
+    chain_row = {}
+    chain_rhs = []
+    for depot_id, depot_levels in levels.items():
+        ordered = sorted(depot_levels)
+        for k, slot in enumerate(ordered):
+            row = n_free + len(chain_rhs)
+            chain_row[(depot_id, slot)] = row
+            chain_rhs.append(depot_levels[slot])
+            rows.append(row)
+            cols.append(chain_index[(depot_id, slot)])
+            vals.append(1)
+            if k + 1 < len(ordered):
+                rows.append(row)
+                cols.append(chain_index[(depot_id, ordered[k + 1])])
+                vals.append(-1)
+    for e, (trailer_row, depot_id, slot, edge_cost, parcels) in enumerate(edges):
+        rows.append(chain_row[(depot_id, slot)])
+        cols.append(e)
+        vals.append(-parcels)
+
+    n_rows = n_free + len(chain_rhs)
+    matrix = coo_matrix((vals, (rows, cols)), shape=(n_rows, n_vars)).tocsr()
+    rhs = np.concatenate([np.ones(n_free), np.array(chain_rhs, dtype=np.float64)])
+
+    lower = np.zeros(n_vars)
+    upper = np.concatenate([np.ones(n_edges + n_free), np.array(chain_upper, dtype=np.float64)])
+
+    # The network LP solves to a mostly integral plan; the few trailers it splits are repaired below
+    result = linprog(
+        cost,
+        A_eq=matrix,
+        b_eq=rhs,
+        bounds=np.column_stack([lower, upper]),
+        method="highs",
+        options={"time_limit": FLOW_TIME_LIMIT}
+    )
+
+    if result.x is None:
+        return allocate_trailers(context, trailers, override_map, ledger)
+
+    chosen = {}
+    split = {}
+    for e, (trailer_row, depot_id, slot, edge_cost, parcels) in enumerate(edges):
+        share = result.x[e]
+        if share > 1 - 1e-6:
+            chosen[free[trailer_row]] = depot_id
+        elif share > 1e-6:
+            split.setdefault(trailer_row, []).append((-share, edge_cost, depot_id, slot, parcels))
+
+    # Trial ledger holding the overrides and the whole trailers the solver placed
+    trial = ledger.copy()
+    for position, (cpid, cp_name, trailer_num, trailer_parcels, collection_mins) in enumerate(trailers):
+        depot_id = override_map.get((cpid, trailer_num, collection_mins)) or chosen.get(position)
+        if depot_id:
+            trial.add(depot_id, trailer_arrival(context, cpid, collection_mins, depot_id), trailer_parcels)
+
+    # Split trailers go to their largest share that still fits, then their cheapest other edge
+    # that fits, else stay Peak Arrivals
+    for trailer_row in sorted(split):
+        position = free[trailer_row]
+        cpid, cp_name, trailer_num, trailer_parcels, collection_mins = trailers[position]
+        options = sorted(split[trailer_row])
+        options += sorted(
+            (0, edge_cost, depot_id, slot, parcels)
+            for row, depot_id, slot, edge_cost, parcels in edges if row == trailer_row
+        )
+        for _, edge_cost, depot_id, slot, parcels in options:
+            arrival_mins = trailer_arrival(context, cpid, collection_mins, depot_id)
+            if trial.fits(depot_id, arrival_mins, parcels):
+                trial.add(depot_id, arrival_mins, parcels)
+                chosen[position] = depot_id
+                break
+
+    return _collect(context, trailers, override_map, ledger, chosen)
+
+
+def _collect(context, trailers, override_map, ledger, chosen):
+    """Assignments in engine form from the solver's choices, Peak Arrival for the rest"""
+    assignments = []
+    for position, (cpid, cp_name, trailer_num, trailer_parcels, collection_mins) in enumerate(trailers):
+        override_key = (cpid, trailer_num, collection_mins)
+        is_peak_arrival = False
+        if override_key in override_map:
+            assigned_depot_id = override_map[override_key]
+            is_override = True
+        else:
+            is_override = False
+            assigned_depot_id = chosen.get(position)
+            if not assigned_depot_id:
+                assigned_depot_id, is_peak_arrival = nearest_open_depot(context, cpid, ledger.depot_base_capacities)
+
+        if assigned_depot_id:
+            ledger.add(assigned_depot_id, trailer_arrival(context, cpid, collection_mins, assigned_depot_id), trailer_parcels)
+
+        assignments.append((assigned_depot_id, is_override, is_peak_arrival))
+    return assignments
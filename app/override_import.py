@@ -0,0 +1,144 @@
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.models import AuditLog, DailyVolume, Depot, ManualOverride
+from app.times import format_minutes
+from app.volume_import import MAX_REPORTED_ERRORS, parse_collection_times, parse_dates
+import pandas as pd
+
+REQUIRED_COLUMNS = ['Date', 'CPID', 'Trailer', 'DepotID']
+TIME_COLUMN = 'Collection Time'
+
+
+class OverrideImport(NamedTuple):
+    """Outcome of validating, and if clean importing, one override file"""
+    imported: int
+    unchanged: int  # Lines matching an override that is already stored
+    errors: pd.DataFrame  # Row (source line number), Error; the first MAX_REPORTED_ERRORS
+    error_count: int
+    dates: set
+
+
+def validate_overrides(db: Session, df: pd.DataFrame):
+    """Check every line against the day's volumes, trailer counts and active depots.
+
+    df is indexed by source line number. Volumes, active depots and stored
+    overrides are each loaded with one query for all the file's dates.
+    Collection Time is optional; when given it must match the CP's volume,
+    since overrides apply to a trailer by its collection time. A line for
+    a trailer already redirected to another depot is an error, as on the
+    single add form; the stored override must be deleted first. Returns
+    (rows, unchanged, errors): rows to insert with date, cpid,
+    trailer_number, collection_minutes and to_depot_id columns, the count
+    of lines already stored, and the first problem on each invalid line.
+    """
+    rows = pd.DataFrame(index=df.index)
+    rows['date'] = parse_dates(df['Date'])
+    rows['cpid'] = df['CPID'].astype(str).str.strip()
+    rows['to_depot_id'] = df['DepotID'].astype(str).str.strip()
+    trailers = pd.to_numeric(df['Trailer'], errors='coerce')
+
+    dates = rows['date'].dropna().unique().tolist()
+    volumes = {}
+    stored = {}
+    if dates:
+        volumes = {
+            (v.date, v.cpid): (v.trailers, v.collection_minutes)
+            for v in db.query(DailyVolume.date, DailyVolume.cpid, DailyVolume.trailers, DailyVolume.collection_minutes)
+            .filter(DailyVolume.date.in_(dates))
+        }
+        stored = {
+            (o.date, o.cpid, o.trailer_number, o.collection_minutes): o.to_depot_id for o in db.query(
+                ManualOverride.date, ManualOverride.cpid, ManualOverride.trailer_number,
+                ManualOverride.collection_minutes, ManualOverride.to_depot_id
+            ).filter(ManualOverride.date.in_(dates))
+        }
+    active_depots = {d for (d,) in db.query(Depot.depot_id).filter(Depot.is_active == True)}
+
+    volume = [volumes.get(pair) for pair in zip(rows['date'], rows['cpid'])]
+    has_volume = pd.Series([v is not None for v in volume], index=df.index)
+    volume_trailers = pd.Series([v[0] if v else 0 for v in volume], index=df.index)
+    volume_minutes = pd.Series([v[1] if v else None for v in volume], index=df.index, dtype=object)
+
+    if TIME_COLUMN in df.columns:
+        times = df[TIME_COLUMN]
+        given = parse_collection_times(times)
+        bad_time = times.notna() & given.isna()
+        wrong_time = given.notna() & has_volume & (given != volume_minutes)
+    else:
+        bad_time = wrong_time = pd.Series(False, index=df.index)
+    rows['collection_minutes'] = volume_minutes
+    rows['trailer_number'] = trailers
+
+    # Checked in order; each line reports the first that fails
+    checks = [
+        (rows['date'].isna(), lambda r: "Invalid date"),
+        (~has_volume, lambda r: f"CPID '{r.cpid}' has no volume on {r.date}"),
+        (trailers.isna() | (trailers != trailers.round()), lambda r: "Invalid trailer number"),
+        ((trailers < 1) | (trailers > volume_trailers),
+         lambda r: f"Trailer {int(r.trailer_number)} out of range for {r.cpid}"),
+        (~rows['to_depot_id'].isin(active_depots), lambda r: f"Depot '{r.to_depot_id}' not found or inactive"),
+        (bad_time, lambda r: "Invalid collection time"),
+        (wrong_time, lambda r: f"Collection time doesn't match {r.cpid}'s volume ({format_minutes(r.collection_minutes)})"),
+    ]
+    messages = pd.Series(None, index=df.index, dtype=object)
+    for failed, message in checks:
+        failed = failed & messages.isna()
+        for line in failed[failed].index:
+            messages[line] = message(rows.loc[line])
+
+    # Lines repeating an earlier one for the same trailer conflict even when they agree
+    key = ['date', 'cpid', 'trailer_number', 'collection_minutes']
+    valid = messages.isna()
+    repeated = rows[valid].duplicated(subset=key, keep='first')
+    messages[repeated[repeated].index] = "Repeats an earlier line for the same trailer"
+
+    valid = messages.isna()
+    stored_depot = pd.Series(
+        [stored.get(tuple(k)) for k in rows.loc[valid, key].itertuples(index=False)], index=rows.index[valid], dtype=object
+    ).reindex(rows.index)
+    conflict = stored_depot.notna() & (stored_depot != rows['to_depot_id'])
+    for line in conflict[conflict].index:
+        messages[line] = (
+            f"Trailer {int(rows.at[line, 'trailer_number'])} for {rows.at[line, 'cpid']} is already redirected to "
+            f"{stored_depot[line]}; delete that override first"
+        )
+
+    invalid = messages.notna()
+    errors = pd.DataFrame({'Row': df.index[invalid], 'Error': messages[invalid].tolist()})
+
+    rows = rows[~invalid].astype({'trailer_number': 'int64', 'collection_minutes': 'int64'})
+    already = stored_depot[rows.index].notna()
+    return rows[~already], int(already.sum()), errors
+
+
+def import_overrides(db: Session, df: pd.DataFrame, user_id: int, ip_address: str = None):
+    """Validate a whole override file, then insert its overrides and their audit entries. Caller commits.
+
+    Nothing is inserted unless every line is valid, so a file is applied
+    completely or not at all. Lines matching a stored override are counted
+    as unchanged.
+    """
+    rows, unchanged, errors = validate_overrides(db, df)
+    if not errors.empty:
+        return OverrideImport(0, unchanged, errors.head(MAX_REPORTED_ERRORS), len(errors), set())
+
+    created_at = datetime.utcnow()
+    records = rows.assign(created_by=user_id, created_at=created_at).to_dict('records')
+    if records:
+        db.execute(insert(ManualOverride), records)
+        db.execute(insert(AuditLog), [
+            {
+                'timestamp': created_at,
+                'user_id': user_id,
+                'action_type': "OVERRIDE_CREATED",
+                'entity_type': "ManualOverride",
+                'entity_id': f"{r['cpid']}-{r['trailer_number']}",
+                'old_value': None,
+                'new_value': f"Redirected to {r['to_depot_id']} (bulk import)",
+                'ip_address': ip_address
+            }
+            for r in records
+        ])
+    return OverrideImport(len(records), unchanged, errors, 0, set(rows['date']))
@@ -0,0 +1,179 @@
+from datetime import date, datetime
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import AllocationRun, TrailerAllocation
+from app import allocation_cache
+import json
+
+
+def _allocation_dict(row):
+    """TrailerAllocation row in the shape get_allocations returns"""
+    return {
+        'cpid': row.cpid,
+        'cp_name': row.cp_name,
+        'trailer_num': row.trailer_number,
+        'parcels': row.parcels,
+        'depot_id': row.depot_id,
+        'depot_name': row.depot_name,
+        'distance': row.distance_miles,
+        'cost': row.cost,
+        'is_override': row.is_override,
+        'collection_minutes': row.collection_minutes,
+        'arrival_minutes': row.arrival_minutes,
+        'is_peak_arrival': row.is_peak_arrival
+    }
+
+
+def save_plan(
+    db: Session, selected_date: date, state, status: str = "Draft", user_id: int = None, replace: bool = True,
+    data_version: int = None
+):
+    """Replace the stored plan for a date with the given AllocationState, in bulk.
+
+    With replace=False an existing plan is left alone and the insert raises
+    IntegrityError on the unique AllocationRun.date instead. data_version is
+    the master data version the state was routed at, the current one if
+    not given.
+    """
+    if replace:
+        delete_plan(db, selected_date)
+    if data_version is None:
+        data_version = allocation_cache.master_data_version(db)
+
+    allocations = state.allocations
+    run = AllocationRun(
+        date=selected_date,
+        status=status,
+        engine=state.engine,
+        total_trailers=len(allocations),
+        total_parcels=sum(a['parcels'] for a in allocations),
+        total_cost=sum(a['cost'] for a in allocations),
+        depot_summary=json.dumps(state.depot_summaries),
+        created_at=datetime.utcnow(),
+        published_by=user_id if status == "Published" else None,
+        published_at=datetime.utcnow() if status == "Published" else None,
+        data_version=data_version
+    )
+    db.add(run)
+    db.flush()
+
+    if allocations:
+        db.execute(insert(TrailerAllocation), [
+            {
+                'run_id': run.id,
+                'date': selected_date,
+                'position': position,
+                'cpid': a['cpid'],
+                'cp_name': a['cp_name'],
+                'trailer_number': a['trailer_num'],
+                'parcels': a['parcels'],
+                'depot_id': a['depot_id'],
+                'depot_name': a['depot_name'],
+                'distance_miles': a['distance'],
+                'cost': a['cost'],
+                'is_override': a['is_override'],
+                'is_peak_arrival': a['is_peak_arrival'],
+                'collection_minutes': a['collection_minutes'],
+                'arrival_minutes': a['arrival_minutes']
+            }
+            for position, a in enumerate(allocations)
+        ])
+    db.commit()
+    return run
+
+
+def delete_plan(db: Session, selected_date: date):
+    """Remove the stored plan for a date. Caller commits."""
+    db.query(TrailerAllocation).filter(TrailerAllocation.date == selected_date).delete(synchronize_session=False)
+    db.query(AllocationRun).filter(AllocationRun.date == selected_date).delete(synchronize_session=False)
+
+
+def _delete_stale_draft(db: Session, run_id: int, master_version: int):
+    """Remove a run if it is still a draft from before master_version. Caller commits; rolls back on False.
+
+    False means another request replaced, published or discarded it first.
+    """
+    db.query(TrailerAllocation).filter(TrailerAllocation.run_id == run_id).delete(synchronize_session=False)
+    return db.query(AllocationRun).filter(
+        AllocationRun.id == run_id,
+        AllocationRun.status == "Draft",
+        or_(AllocationRun.data_version.is_(None), AllocationRun.data_version != master_version)
+    ).delete(synchronize_session=False) == 1
+
+
+def _filtered(allocations, cpid: str = None, depot_id: str = None):
+    if cpid:
+        return [a for a in allocations if a['cpid'] == cpid]
+    if depot_id:
+        return [a for a in allocations if a['depot_id'] == depot_id]
+    return allocations
+
+
+def discard_draft_plans(db: Session, dates=None):
+    """Drop draft plans so they are re-routed on next view; published plans are kept"""
+    query = db.query(AllocationRun.date).filter(AllocationRun.status == "Draft")
+    if dates is not None:
+        query = query.filter(AllocationRun.date.in_(list(dates)))
+    for (run_date,) in query.all():
+        delete_plan(db, run_date)
+    db.commit()
+
+
+def refresh_plans(db: Session, dates):
+    """Re-route and store draft plans for dates whose inputs just changed"""
+    discard_draft_plans(db, dates)
+    for selected_date in dates:
+        get_plan(db, selected_date)
+
+
+def get_plan(db: Session, selected_date: date, cpid: str = None, depot_id: str = None):
+    """The day's plan as (allocations, depot_summaries, run), routing and storing it if there isn't one.
+
+    A draft routed before the last change to master data (see
+    allocation_cache.bump_data_version) is routed and stored again, so no
+    write path has to discard drafts for it to show. Published plans are
+    never re-routed. Filtering by CP or depot is done in SQL against the
+    stored rows. When two requests store the same date at once, the first
+    plan committed is kept and the other request reads it back.
+    """
+    run = db.query(AllocationRun).filter(AllocationRun.date == selected_date).first()
+    master_version = allocation_cache.master_data_version(db)
+
+    if run is None or (run.status == "Draft" and run.data_version != master_version):
+        version = allocation_cache.current_data_version(db)
+        state = allocation_cache.get_cached_state(db, selected_date)
+
+        # Only store if there is something to store and nothing changed while routing
+        if not state.trailers or version != allocation_cache.current_data_version(db):
+            return _filtered(state.allocations, cpid, depot_id), state.depot_summaries, None
+        stored = None
+        if run is not None:
+            # The stale row is deleted in bulk below; its object mustn't linger under a reused id
+            db.expunge(run)
+        if run is None or _delete_stale_draft(db, run.id, master_version):
+            try:
+                stored = save_plan(db, selected_date, state, replace=False, data_version=master_version)
+            except IntegrityError:
+                pass
+        if stored is None:
+            # Another request stored, replaced or published the date's plan first; serve that
+            db.rollback()
+            stored = db.query(AllocationRun).filter(AllocationRun.date == selected_date).first()
+            if stored is None:
+                return _filtered(state.allocations, cpid, depot_id), state.depot_summaries, None
+        run = stored
+
+    query = db.query(
+        TrailerAllocation.cpid, TrailerAllocation.cp_name, TrailerAllocation.trailer_number,
+        TrailerAllocation.parcels, TrailerAllocation.depot_id, TrailerAllocation.depot_name,
+        TrailerAllocation.distance_miles, TrailerAllocation.cost, TrailerAllocation.is_override,
+        TrailerAllocation.collection_minutes, TrailerAllocation.arrival_minutes, TrailerAllocation.is_peak_arrival
+    ).filter(TrailerAllocation.date == selected_date)
+    if cpid:
+        query = query.filter(TrailerAllocation.cpid == cpid)
+    elif depot_id:
+        query = query.filter(TrailerAllocation.depot_id == depot_id)
+    allocations = [_allocation_dict(r) for r in query.order_by(TrailerAllocation.position).all()]
+
+    return allocations, json.loads(run.depot_summary or "[]"), run
@@ -0,0 +1,86 @@
+from datetime import date
+from sqlalchemy import select, text
+from app.models import (
+    AllocationRun, CapacityOverride, CPDepotDistance, DailyVolume, ManualOverride, TrailerAllocation
+)
+import re
+import sys
+
+# The queries routing and the daily pages run on every request or plan, as (name, statement).
+# Each must be answered from an index: a full table scan or a sort means an index is missing.
+HOT_QUERIES = [
+    ("volumes for a date", select(DailyVolume).where(DailyVolume.date == date(2026, 1, 1))),
+    ("volume for a CP on a date", select(DailyVolume.id).where(
+        DailyVolume.date == date(2026, 1, 1), DailyVolume.cpid == "CP001"
+    )),
+    ("ranked distances", select(
+        CPDepotDistance.cpid, CPDepotDistance.depot_id, CPDepotDistance.distance_miles, CPDepotDistance.travel_minutes
+    ).order_by(CPDepotDistance.cpid, CPDepotDistance.rank)),
+    ("ranked distances for a CP", select(CPDepotDistance.depot_id, CPDepotDistance.distance_miles).where(
+        CPDepotDistance.cpid == "CP001"
+    ).order_by(CPDepotDistance.rank)),
+    ("manual overrides for a date", select(ManualOverride).where(ManualOverride.date == date(2026, 1, 1))),
+    ("manual override for a trailer", select(ManualOverride.id).where(
+        ManualOverride.date == date(2026, 1, 1), ManualOverride.cpid == "CP001",
+        ManualOverride.trailer_number == 1, ManualOverride.collection_minutes == 600
+    )),
+    ("capacity overrides for a date", select(CapacityOverride).where(CapacityOverride.date == date(2026, 1, 1))),
+    ("capacity override for a depot", select(CapacityOverride.id).where(
+        CapacityOverride.date == date(2026, 1, 1), CapacityOverride.depot_id == "D001"
+    )),
+    ("plan for a date", select(AllocationRun).where(AllocationRun.date == date(2026, 1, 1))),
+    ("plan rows for a CP", select(TrailerAllocation).where(
+        TrailerAllocation.date == date(2026, 1, 1), TrailerAllocation.cpid == "CP001"
+    )),
+]
+
+
+def explain(conn, statement):
+    """The database's plan for a statement, one line per step"""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        return [row.detail for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    return [line for (line,) in conn.execute(text(f"EXPLAIN {sql}"))]
+
+
+def plan_problems(dialect_name: str, plan):
+    """Steps in a plan that read a whole table or sort rows an index should have ordered"""
+    if dialect_name == "sqlite":
+        # "SCAN table" reads every row; "SCAN table USING [COVERING] INDEX" walks an index in order
+        return [
+            step for step in plan
+            if (re.match(r"SCAN \w+$", step.strip()) or "USE TEMP B-TREE" in step)
+        ]
+    return [step for step in plan if re.search(r"\b(Seq Scan|Sort)\b", step)]
+
+
+def check_query_plans(engine):
+    """(name, plan, problems) for each of HOT_QUERIES against the database's current indexes.
+
+    On PostgreSQL sequential scans are disabled for the check, since the
+    planner prefers them on small tables even when an index would serve;
+    one still appearing means no index can.
+    """
+    results = []
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, statement in HOT_QUERIES:
+            plan = explain(conn, statement)
+            results.append((name, plan, plan_problems(conn.dialect.name, plan)))
+        conn.rollback()
+    return results
+
+
+if __name__ == "__main__":
+    # Deploy or CI check after `python -m app.init_db upgrade`; exits 1 if a hot query misses its index
+    from app.database import engine
+
+    failed = 0
+    for name, plan, problems in check_query_plans(engine):
+        print(f"{'FAIL' if problems else 'ok  '}  {name}")
+        for step in plan:
+            print(f"        {step}")
+        failed += bool(problems)
+    print(f"{failed} of {len(HOT_QUERIES)} hot queries not served by an index")
+    sys.exit(1 if failed else 0)
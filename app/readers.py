@@ -0,0 +1,158 @@
+import os
+import pandas as pd
+
+# Lines per DataFrame when streaming import files; memory use depends on this, not on the file size
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+
+# Import file extensions and the format each is read as
+FILE_FORMATS = {
+    ".xlsx": "xlsx",
+    ".xlsm": "xlsx",
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+def _header(values):
+    return [str(v).strip() if v is not None else f"Unnamed: {i}" for i, v in enumerate(values)]
+
+
+def iter_xlsx_chunks(source, chunk_rows: int = None):
+    """Stream the first sheet of an .xlsx file as DataFrames of up to chunk_rows lines.
+
+    source is a path or a binary file object. The workbook is opened with
+    openpyxl's read-only mode, which parses rows as they are iterated rather
+    than loading the sheet. The first row is the header. Each frame is
+    indexed by spreadsheet row number, and fully blank lines are dropped.
+    """
+    from openpyxl import load_workbook
+
+    chunk_rows = chunk_rows or IMPORT_CHUNK_ROWS
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _header(header)
+
+        width = len(columns)
+        lines = []
+        numbers = []
+        yielded = False
+        for number, values in enumerate(rows, 2):
+            if all(v is None or (isinstance(v, str) and not v.strip()) for v in values):
+                continue
+            # Read-only rows can be ragged when the sheet's recorded dimensions are off
+            lines.append(tuple(values[:width]) + (None,) * (width - len(values)))
+            numbers.append(number)
+            if len(lines) == chunk_rows:
+                yield pd.DataFrame(lines, columns=columns, index=numbers)
+                yielded = True
+                lines, numbers = [], []
+        if lines or not yielded:
+            # A header-only sheet still yields one empty frame, so callers can check its columns
+            yield pd.DataFrame(lines, columns=columns, index=numbers)
+    finally:
+        workbook.close()
+
+
+def _numbered(chunks, first_row: int):
+    """Re-index consecutive chunks by source record number, counting from first_row"""
+    row = first_row
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(row, row + len(chunk))
+        row += len(chunk)
+        yield chunk
+
+
+def iter_csv_chunks(source, chunk_rows: int = None):
+    """Stream a CSV file with pandas' C parser, indexed by line number with the header as line 1.
+
+    CPIDs and collection times are kept as text so leading zeros survive
+    (0900 rather than 900); other columns are left for normalise_volumes to
+    coerce. A UTF-8 byte order mark, as Excel
+    writes, is dropped.
+    """
+    reader = pd.read_csv(
+        source, engine="c", chunksize=chunk_rows or IMPORT_CHUNK_ROWS,
+        dtype={"CPID": str, "Collection Time": str}, skipinitialspace=True, encoding="utf-8-sig"
+    )
+    with reader:
+        yield from _numbered(reader, 2)
+
+
+def iter_ndjson_chunks(source, chunk_rows: int = None):
+    """Stream newline-delimited JSON, one object per line, indexed by line number.
+
+    Values are kept as written; dates and times are parsed with the rest
+    of the validation rather than guessed from column names.
+    """
+    reader = pd.read_json(
+        source, lines=True, chunksize=chunk_rows or IMPORT_CHUNK_ROWS,
+        dtype=False, convert_dates=False
+    )
+    with reader:
+        yield from _numbered(reader, 1)
+
+
+def iter_parquet_chunks(source, chunk_rows: int = None):
+    """Stream a Parquet file by record batches through pyarrow, indexed by record number from 1.
+
+    Only one batch is decoded at a time. A file with no rows yields one
+    empty frame with the file's columns.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet files need pyarrow installed")
+
+    parquet = pq.ParquetFile(source)
+    batches = (batch.to_pandas() for batch in parquet.iter_batches(batch_size=chunk_rows or IMPORT_CHUNK_ROWS))
+    yielded = False
+    for chunk in _numbered(batches, 1):
+        yielded = True
+        yield chunk
+    if not yielded:
+        yield parquet.schema_arrow.empty_table().to_pandas()
+
+
+_READERS = {
+    "xlsx": iter_xlsx_chunks,
+    "csv": iter_csv_chunks,
+    "ndjson": iter_ndjson_chunks,
+    "parquet": iter_parquet_chunks,
+}
+
+
+def read_whole(chunks, required_columns):
+    """Gather a streamed file into one frame, for small files checked as a whole. Raises ValueError.
+
+    Header whitespace is trimmed, and the file must have every column in
+    required_columns.
+    """
+    frames = list(chunks)
+    if not frames:
+        raise ValueError("File has no header row")
+    df = pd.concat(frames) if len(frames) > 1 else frames[0]
+    df.columns = [str(c).strip() for c in df.columns]
+    missing = [c for c in required_columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return df
+
+
+def detect_format(filename: str):
+    """Import format for a file name, from its extension. Raises ValueError if unsupported."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in FILE_FORMATS:
+        raise ValueError(f"Unsupported file type '{extension}'; use {', '.join(FILE_FORMATS)}")
+    return FILE_FORMATS[extension]
+
+
+def iter_chunks(source, filename: str, chunk_rows: int = None):
+    """Stream any supported import file as DataFrames, choosing the reader from filename"""
+    return _READERS[detect_format(filename)](source, chunk_rows)
@@ -0,0 +1,585 @@
+from datetime import date
+from sqlalchemy.orm import Session
+from app.capacity_calendar import CapacityCalendar
+from app.models import CollectionPoint, Depot, DailyVolume, ManualOverride, CPDepotDistance
+from app.distance_providers import haversine_travel_minutes
+import copy
+import math
+import numpy as np
+import os
+
+# Greedy nearest-first: "python" is the reference engine, "numpy" vectorises the per-depot
+# feasibility checks. "flow" optimises the whole day's cost over a flow network instead.
+ROUTING_ENGINE = os.getenv("ROUTING_ENGINE", "python")
+WHOLE_DAY_ENGINES = {"flow"}
+
+# Nearest depots considered per CP before widening the search, from a KD-tree over depot
+# locations. 0 routes over the stored CPDepotDistance rankings instead. The KD-tree ranks
+# by straight-line distance, so it only matches the stored rankings for the haversine provider.
+ROUTING_CANDIDATES_K = int(os.getenv("ROUTING_CANDIDATES_K", "0"))
+
+# Width of the time slots each depot's capacity ledger is kept in
+CAPACITY_SLOT_MINUTES = int(os.getenv("CAPACITY_SLOT_MINUTES", "15"))
+
+LOADING_MINUTES = 60
+
+
+def calculate_cost(distance_miles):
+    """Calculate transport cost: £150 base + £1.80/mile, minimum £200"""
+    cost = 150 + (distance_miles * 1.80)
+    return max(cost, 200)
+
+
+def arrival_offset(travel_mins):
+    """Whole minutes from collection to arrival: 1hr loading + travel time, rounded up to the minute"""
+    # The tolerance stops float noise on an exact minute rounding it up a whole minute
+    return LOADING_MINUTES + math.ceil(travel_mins - 1e-9)
+
+
+def calculate_available_capacity(start_mins, cutoff_mins, arrival_mins, base_capacity):
+    """Calculate capacity available at arrival time based on linear reduction"""
+    # If arriving before sortation starts, full capacity
+    if arrival_mins <= start_mins:
+        return base_capacity
+
+    # If arriving after cutoff, no capacity
+    if arrival_mins >= cutoff_mins:
+        return 0
+
+    # Linear reduction: capacity reduces as day progresses
+    total_window = cutoff_mins - start_mins
+    time_remaining = cutoff_mins - arrival_mins
+
+    if total_window <= 0:
+        return 0
+
+    return int(base_capacity * (time_remaining / total_window))
+
+
+class RoutingContext:
+    """Master data needed to route a day, loaded once in a fixed number of queries.
+
+    Holds active depots (in query order), CP names and, per CP, the ranked
+    candidate depots as three parallel tuples (depot IDs, miles and arrival
+    offsets) so the allocation loop never has to go back to the database.
+    An arrival offset is the whole minutes from collection to arrival, so a
+    trailer's arrival at any candidate is one integer addition.
+
+    When the memory-mapped distance artifact is present the ranked lists are
+    read from it per CP on first use instead of from the database.
+
+    With a spatial index the ranked lists are not loaded up front either.
+    Each CP gets its candidates_k nearest depots from the index on first use,
+    and widen() doubles that list when the router runs out of candidates, so
+    the work per trailer depends on K rather than on the number of depots.
+    """
+
+    def __init__(self, depots, cp_names, cp_depot_ids, cp_distances, cp_offsets, cp_locations=None, depot_index=None,
+                 candidates_k: int = 0, distance_artifact=None):
+        self.depots = depots
+        self.depot_map = {d.depot_id: d for d in depots}
+        self.cp_names = cp_names
+        self.cp_depot_ids = cp_depot_ids
+        self.cp_distances = cp_distances
+        self.cp_offsets = cp_offsets
+        self.cp_locations = cp_locations or {}
+        self.depot_index = depot_index
+        self.candidates_k = candidates_k
+        self.distance_artifact = distance_artifact
+        self._searched = {}
+
+        # Sortation windows in minutes since midnight, as the ledger uses them
+        self.depot_windows = {
+            d.depot_id: (d.sortation_start_minutes, d.cutoff_minutes)
+            for d in depots
+        }
+
+    @classmethod
+    def load(cls, db: Session, candidates_k: int = None):
+        candidates_k = ROUTING_CANDIDATES_K if candidates_k is None else candidates_k
+
+        # Plain rows rather than ORM objects so a cached context outlives its session
+        depots = db.query(
+            Depot.depot_id, Depot.name, Depot.daily_capacity, Depot.sortation_start_minutes, Depot.cutoff_minutes,
+            Depot.latitude, Depot.longitude
+        ).filter(Depot.is_active == True).all()
+
+        if candidates_k > 0:
+            from app.spatial import DepotIndex
+
+            cp_rows = db.query(CollectionPoint.cpid, CollectionPoint.name, CollectionPoint.latitude, CollectionPoint.longitude).all()
+            cp_names = {r.cpid: r.name for r in cp_rows}
+            cp_locations = {r.cpid: (r.latitude, r.longitude) for r in cp_rows}
+            depot_index = DepotIndex([d.depot_id for d in depots], [d.latitude for d in depots], [d.longitude for d in depots])
+            return cls(depots, cp_names, {}, {}, {}, cp_locations=cp_locations, depot_index=depot_index, candidates_k=candidates_k)
+
+        cp_names = dict(db.query(CollectionPoint.cpid, CollectionPoint.name).all())
+
+        from app.distance_artifact import load_artifact
+
+        artifact = load_artifact()
+        if artifact is not None:
+            return cls(depots, cp_names, {}, {}, {}, distance_artifact=artifact)
+
+        ranked = {}
+        rows = db.query(
+            CPDepotDistance.cpid, CPDepotDistance.depot_id, CPDepotDistance.distance_miles, CPDepotDistance.travel_minutes
+        ).order_by(CPDepotDistance.cpid, CPDepotDistance.rank).all()
+        for cpid, depot_id, distance_miles, travel_minutes in rows:
+            if travel_minutes is None:
+                travel_minutes = haversine_travel_minutes(distance_miles)
+            ranked.setdefault(cpid, []).append((depot_id, distance_miles, travel_minutes))
+
+        cp_depot_ids = {}
+        cp_distances = {}
+        cp_offsets = {}
+        for cpid, entries in ranked.items():
+            cp_depot_ids[cpid] = tuple(e[0] for e in entries)
+            cp_distances[cpid] = tuple(e[1] for e in entries)
+            cp_offsets[cpid] = tuple(arrival_offset(e[2]) for e in entries)
+
+        return cls(depots, cp_names, cp_depot_ids, cp_distances, cp_offsets)
+
+    def ranked_depots(self, cpid):
+        """Return (depot_ids, distances, arrival_offsets) for a CP in rank order"""
+        if cpid not in self.cp_depot_ids:
+            if self.depot_index is not None:
+                self._query_nearest(cpid, self.candidates_k)
+            elif self.distance_artifact is not None:
+                depot_ids, distances, travel = self.distance_artifact.ranked(cpid)
+                self.cp_depot_ids[cpid], self.cp_distances[cpid] = depot_ids, distances
+                self.cp_offsets[cpid] = tuple(arrival_offset(t) for t in travel)
+        return self.cp_depot_ids.get(cpid, ()), self.cp_distances.get(cpid, ()), self.cp_offsets.get(cpid, ())
+
+    def widen(self, cpid):
+        """Double a CP's candidate search from the spatial index. False once it already covers every depot."""
+        if self.depot_index is None or cpid not in self.cp_locations:
+            return False
+        self.ranked_depots(cpid)
+        searched = self._searched[cpid]
+        if searched >= len(self.depot_index):
+            return False
+        self._query_nearest(cpid, searched * 2)
+        return True
+
+    def iter_ranked(self, cpid, start: int = 0):
+        """(depot_id, distance, arrival_offset) for a CP in rank order from position start, widening as they run out"""
+        position = start
+        while True:
+            depot_ids, distances, offsets = self.ranked_depots(cpid)
+            while position < len(depot_ids):
+                yield depot_ids[position], distances[position], offsets[position]
+                position += 1
+            if not self.widen(cpid):
+                return
+
+    def _query_nearest(self, cpid, k):
+        location = self.cp_locations.get(cpid)
+        if location is None:
+            return
+        depot_ids, distances = self.depot_index.nearest(location[0], location[1], k)
+        self._searched[cpid] = k
+        self.cp_depot_ids[cpid] = depot_ids
+        self.cp_distances[cpid] = distances
+        self.cp_offsets[cpid] = tuple(arrival_offset(haversine_travel_minutes(d)) for d in distances)
+
+    def route_to(self, cpid, depot_id):
+        """(distance, arrival_offset) from a CP to a depot, (0, loading time) if the pair is not in the ranked list"""
+        depot_ids, distances, offsets = self.ranked_depots(cpid)
+        for i, did in enumerate(depot_ids):
+            if did == depot_id:
+                return distances[i], offsets[i]
+        if self.depot_index is not None and cpid in self.cp_locations and depot_id in self.depot_map:
+            from app.spatial import haversine_miles
+
+            depot = self.depot_map[depot_id]
+            distance = round(haversine_miles(*self.cp_locations[cpid], depot.latitude, depot.longitude), 2)
+            return distance, arrival_offset(haversine_travel_minutes(distance))
+        return 0, LOADING_MINUTES
+
+    def distance_to(self, cpid, depot_id):
+        """Distance from a CP to a depot, 0 if the pair is not in the ranked list"""
+        return self.route_to(cpid, depot_id)[0]
+
+
+class CapacityLedger:
+    """Per-depot sortation capacity for one day, kept in fixed time slots.
+
+    Each depot's window from sortation start to cutoff is cut into
+    CAPACITY_SLOT_MINUTES slots. A trailer arriving in slot k can only be
+    sorted in slots k onward, so the capacity left for it is the capacity
+    from that slot (the linear reduction at the slot's start) less
+    everything arriving in that slot or later. Parcels arriving earlier only
+    count if they spill into later slots, so early and late trailers no
+    longer compete for one pool.
+
+    For each depot the ledger keeps the slack per slot (capacity from the
+    slot less load from the slot) and its running minimum. A trailer fits in
+    slot k when the running minimum at k covers it, which is a single array
+    lookup; booking it subtracts it from slots 0..k and refreshes the
+    running minimum in one vector operation over the day's few dozen slots.
+    Arrivals before sortation start use the first slot; booked trailers
+    arriving after cutoff (overrides, Peak Arrivals) land in the last one.
+    """
+
+    def __init__(self, context: RoutingContext, depot_base_capacities, slot_minutes: int = None):
+        self.slot_minutes = slot_minutes or CAPACITY_SLOT_MINUTES
+        self.depot_base_capacities = depot_base_capacities
+        depot_ids = [d.depot_id for d in context.depots] if context else []
+        self.depot_ids = depot_ids
+        self.depot_index = {did: i for i, did in enumerate(depot_ids)}
+        self.allocated = {did: 0 for did in depot_ids}
+
+        windows = [context.depot_windows[did] for did in depot_ids]
+        self.start = np.array([w[0] for w in windows], dtype=np.int64)
+        self.cutoff = np.array([w[1] for w in windows], dtype=np.int64)
+        self.slot_count = np.array(
+            [max(1, -(-(cutoff - start) // self.slot_minutes)) for start, cutoff in windows], dtype=np.int64
+        )
+        width = int(self.slot_count.max()) if depot_ids else 1
+
+        # Capacity available from the start of each slot onward, as calculate_available_capacity sees it
+        self.capacity_from = np.zeros((len(depot_ids), width), dtype=np.int64)
+        for col, did in enumerate(depot_ids):
+            start, cutoff = windows[col]
+            base_cap = depot_base_capacities.get(did, 0)
+            for k in range(int(self.slot_count[col])):
+                self.capacity_from[col, k] = calculate_available_capacity(start, cutoff, start + k * self.slot_minutes, base_cap)
+
+        self.load = np.zeros_like(self.capacity_from)
+        self.slack = self.capacity_from.copy()
+        self.headroom = np.minimum.accumulate(self.slack, axis=1)
+
+    def copy(self):
+        ledger = copy.copy(self)
+        ledger.allocated = dict(self.allocated)
+        ledger.load = self.load.copy()
+        ledger.slack = self.slack.copy()
+        ledger.headroom = self.headroom.copy()
+        return ledger
+
+    def slot(self, col, arrival_mins):
+        """Slot a depot (by column) receives a trailer arriving at arrival_mins in"""
+        k = int((arrival_mins - self.start[col]) // self.slot_minutes)
+        return min(max(k, 0), int(self.slot_count[col]) - 1)
+
+    def slots(self, cols, arrival):
+        """Vectorised slot over a set of depot columns"""
+        k = np.floor_divide(arrival - self.start[cols], self.slot_minutes).astype(np.int64)
+        return np.clip(k, 0, self.slot_count[cols] - 1)
+
+    def fits(self, depot_id, arrival_mins, parcels):
+        """Whether the depot can still sort these parcels arriving at arrival_mins"""
+        col = self.depot_index.get(depot_id)
+        if col is None or arrival_mins >= self.cutoff[col]:
+            return False
+        return self.headroom[col, self.slot(col, arrival_mins)] >= parcels
+
+    def remaining(self, depot_id, arrival_mins):
+        """Parcels the depot can still take from a trailer arriving at arrival_mins"""
+        col = self.depot_index[depot_id]
+        if arrival_mins >= self.cutoff[col]:
+            return 0
+        return int(self.headroom[col, self.slot(col, arrival_mins)])
+
+    def add(self, depot_id, arrival_mins, parcels):
+        """Book parcels into the depot's slot for arrival_mins; negative parcels release them"""
+        col = self.depot_index.get(depot_id)
+        if col is None:
+            return
+        k = self.slot(col, arrival_mins)
+        self.allocated[depot_id] += parcels
+        self.load[col, k] += parcels
+        self.slack[col, :k + 1] -= parcels
+        self.headroom[col] = np.minimum.accumulate(self.slack[col])
+
+
+def trailer_arrival(context: RoutingContext, cpid, collection_mins, depot_id):
+    """Arrival time of a trailer at the depot it was assigned to"""
+    return collection_mins + context.route_to(cpid, depot_id)[1]
+
+
+def expand_trailers(context: RoutingContext, volumes):
+    """Split each day's volume into trailers, ordered so earlier collections are allocated first"""
+    trailers = []
+
+    volumes_sorted = sorted(volumes, key=lambda v: v.collection_minutes)
+
+    for volume in volumes_sorted:
+        cp_name = context.cp_names.get(volume.cpid)
+        if cp_name is None:
+            continue
+
+        collection_mins = volume.collection_minutes
+        parcels_per_trailer = volume.parcels // volume.trailers if volume.trailers > 0 else volume.parcels
+        remainder = volume.parcels % volume.trailers if volume.trailers > 0 else 0
+
+        for trailer_num in range(1, volume.trailers + 1):
+            trailer_parcels = parcels_per_trailer + (1 if trailer_num <= remainder else 0)
+            trailers.append((volume.cpid, cp_name, trailer_num, trailer_parcels, collection_mins))
+
+    return trailers
+
+
+def allocate_trailers(context: RoutingContext, trailers, override_map, ledger: CapacityLedger):
+    """Greedy nearest-first allocation in pure Python.
+
+    Returns one (depot_id, is_override, is_peak_arrival) tuple per trailer and
+    books each trailer's parcels into the ledger as it goes.
+    """
+    depot_map = context.depot_map
+    depot_base_capacities = ledger.depot_base_capacities
+    assignments = []
+
+    for cpid, cp_name, trailer_num, trailer_parcels, collection_mins in trailers:
+        override_key = (cpid, trailer_num, collection_mins)
+        is_peak_arrival = False
+
+        if override_key in override_map:
+            assigned_depot_id = override_map[override_key]
+            is_override = True
+        else:
+            assigned_depot_id = None
+
+            # Try each depot in distance order
+            for depot_id, distance_miles, offset in context.iter_ranked(cpid):
+                if depot_id not in depot_map:
+                    continue
+
+                base_cap = depot_base_capacities.get(depot_id, 0)
+                if base_cap <= 0:
+                    continue
+
+                # Calculate arrival time for this depot
+                arrival_mins = collection_mins + offset
+
+                # Check there's room from the arrival slot onward (considering what's already booked)
+                if ledger.fits(depot_id, arrival_mins, trailer_parcels):
+                    assigned_depot_id = depot_id
+                    break
+
+            # If no depot has capacity, assign to nearest and flag as Peak Arrival
+            if not assigned_depot_id:
+                assigned_depot_id, is_peak_arrival = nearest_open_depot(context, cpid, depot_base_capacities)
+
+            is_override = False
+
+        if assigned_depot_id:
+            ledger.add(assigned_depot_id, trailer_arrival(context, cpid, collection_mins, assigned_depot_id), trailer_parcels)
+
+        assignments.append((assigned_depot_id, is_override, is_peak_arrival))
+
+    return assignments
+
+
+def nearest_open_depot(context: RoutingContext, cpid, depot_base_capacities):
+    """Peak Arrival fallback: the nearest depot with any capacity at all"""
+    for depot_id, _, _ in context.iter_ranked(cpid):
+        if depot_base_capacities.get(depot_id, 0) > 0:
+            return depot_id, True
+    return None, False
+
+
+def build_allocation_row(context: RoutingContext, trailer, assignment):
+    """Turn one engine assignment into the allocation dict the pages render, None if unassigned"""
+    cpid, cp_name, trailer_num, trailer_parcels, collection_mins = trailer
+    assigned_depot_id, is_override, is_peak_arrival = assignment
+    if not assigned_depot_id:
+        return None
+
+    distance, offset = context.route_to(cpid, assigned_depot_id)
+    depot = context.depot_map.get(assigned_depot_id)
+
+    # Calculate arrival time for display
+    arrival_mins = collection_mins + offset
+
+    return {
+        'cpid': cpid,
+        'cp_name': cp_name,
+        'trailer_num': trailer_num,
+        'parcels': trailer_parcels,
+        'depot_id': assigned_depot_id,
+        'depot_name': depot.name if depot else assigned_depot_id,
+        'distance': distance,
+        'cost': calculate_cost(distance),
+        'is_override': is_override,
+        'collection_minutes': collection_mins,
+        'arrival_minutes': arrival_mins,
+        'is_peak_arrival': is_peak_arrival
+    }
+
+
+def build_depot_summaries(context: RoutingContext, depot_base_capacities, depot_allocated):
+    """Calculate depot summaries - only include depots with allocations"""
+    depot_summaries = []
+    for depot in context.depots:
+        allocated = depot_allocated.get(depot.depot_id, 0)
+        if allocated == 0:
+            continue  # Skip depots with no allocations
+        base_cap = depot_base_capacities.get(depot.depot_id, 0)
+        depot_summaries.append({
+            'depot_id': depot.depot_id,
+            'name': depot.name,
+            'allocated_parcels': allocated,
+            'capacity': base_cap,
+            'utilisation': round((allocated / base_cap * 100), 1) if base_cap > 0 else 0,
+            'sortation_start_minutes': depot.sortation_start_minutes,
+            'cutoff_minutes': depot.cutoff_minutes
+        })
+    return depot_summaries
+
+
+def run_engine(engine, context: RoutingContext, trailers, override_map, ledger: CapacityLedger):
+    """Dispatch to the selected allocation engine"""
+    if engine == "numpy":
+        from app.routing_numpy import allocate_trailers_numpy
+        return allocate_trailers_numpy(context, trailers, override_map, ledger)
+    if engine == "python":
+        return allocate_trailers(context, trailers, override_map, ledger)
+    if engine == "flow":
+        from app.optimiser import allocate_trailers_flow
+        return allocate_trailers_flow(context, trailers, override_map, ledger)
+    raise ValueError(f"Unknown routing engine '{engine}'")
+
+
+class AllocationState:
+    """Everything from one routing run needed to replay part of it.
+
+    Keeps the ordered trailers, each trailer's assignment and the final
+    capacity ledger. A trailer's assignment depends only on the trailers
+    routed before it, so when one trailer's override changes the ledger is
+    rolled back to that trailer and only the rest of the day is re-routed.
+    """
+
+    def __init__(self, context: RoutingContext, trailers, override_map, depot_base_capacities, engine):
+        self.context = context
+        self.trailers = trailers
+        self.override_map = override_map
+        self.depot_base_capacities = depot_base_capacities
+        self.engine = engine
+
+        # First position of each (cpid, trailer, collection time) override key
+        self.trailer_index = {}
+        for i, (cpid, cp_name, trailer_num, trailer_parcels, collection_mins) in enumerate(trailers):
+            self.trailer_index.setdefault((cpid, trailer_num, collection_mins), i)
+
+        # Parcels booked per depot and arrival slot
+        self.ledger = CapacityLedger(context, depot_base_capacities)
+        self.assignments = []
+        self.rows = []
+        self.allocations = []
+        self.depot_summaries = []
+
+    def route_from(self, position):
+        """Re-route trailers from position onward, keeping everything before it"""
+        ledger = self.ledger.copy()
+        for trailer, (depot_id, is_override, is_peak_arrival) in zip(self.trailers[position:], self.assignments[position:]):
+            if depot_id:
+                cpid, cp_name, trailer_num, trailer_parcels, collection_mins = trailer
+                ledger.add(depot_id, trailer_arrival(self.context, cpid, collection_mins, depot_id), -trailer_parcels)
+
+        tail = self.trailers[position:]
+        assignments = run_engine(self.engine, self.context, tail, self.override_map, ledger)
+
+        self.assignments = self.assignments[:position] + assignments
+        self.rows = self.rows[:position] + [build_allocation_row(self.context, t, a) for t, a in zip(tail, assignments)]
+        self.ledger = ledger
+        self.allocations = [r for r in self.rows if r is not None]
+        self.depot_summaries = build_depot_summaries(self.context, self.depot_base_capacities, ledger.allocated)
+
+    def with_overrides(self, override_map):
+        """New state for the same day with a different set of manual overrides.
+
+        Only trailers from the earliest one whose override changed are
+        re-routed; the result matches routing the whole day from scratch.
+        """
+        state = copy.copy(self)
+        state.override_map = override_map
+
+        changed = [
+            key for key in set(self.override_map) | set(override_map)
+            if self.override_map.get(key) != override_map.get(key)
+        ]
+        positions = [self.trailer_index[key] for key in changed if key in self.trailer_index]
+        if positions:
+            # The flow engine plans the whole day at once, so any change re-plans it all
+            state.route_from(0 if self.engine in WHOLE_DAY_ENGINES else min(positions))
+        return state
+
+
+def load_override_map(db: Session, selected_date: date):
+    """Manual overrides for a date keyed by (cpid, trailer number, collection time)"""
+    overrides = db.query(ManualOverride).filter(ManualOverride.date == selected_date).all()
+    return {(o.cpid, o.trailer_number, o.collection_minutes): o.to_depot_id for o in overrides}
+
+
+def route_day(db: Session, selected_date: date, context: RoutingContext = None, engine: str = None, calendar=None):
+    """Route every trailer for a date and return the AllocationState.
+
+    calendar is a CapacityCalendar, loaded here if not given.
+    """
+    engine = engine or ROUTING_ENGINE
+
+    volumes = db.query(DailyVolume).filter(DailyVolume.date == selected_date).all()
+
+    if not volumes:
+        return AllocationState(None, [], {}, {}, engine)
+
+    if context is None:
+        context = RoutingContext.load(db)
+
+    override_map = load_override_map(db, selected_date)
+
+    if calendar is None:
+        calendar = CapacityCalendar.load(db)
+    depot_base_capacities = calendar.capacities(context.depots, selected_date)
+
+    state = AllocationState(context, expand_trailers(context, volumes), override_map, depot_base_capacities, engine)
+    state.route_from(0)
+    return state
+
+
+def get_allocations(db: Session, selected_date: date, context: RoutingContext = None, engine: str = None):
+    """Core routing logic - allocates trailers from CPs to depots based on distance ranking and time-based capacity"""
+    state = route_day(db, selected_date, context=context, engine=engine)
+    return state.allocations, state.depot_summaries
+
+
+def compare_engines(db: Session, selected_date: date):
+    """A/B the python and numpy engines for a date. Returns a list of differences, empty if they agree exactly."""
+    context = RoutingContext.load(db)
+    python_result = get_allocations(db, selected_date, context=context, engine="python")
+    numpy_result = get_allocations(db, selected_date, context=context, engine="numpy")
+
+    differences = []
+    python_allocations, numpy_allocations = python_result[0], numpy_result[0]
+    if len(python_allocations) != len(numpy_allocations):
+        differences.append(f"Trailer count: python {len(python_allocations)}, numpy {len(numpy_allocations)}")
+    for p, n in zip(python_allocations, numpy_allocations):
+        if p != n:
+            differences.append(f"{p['cpid']} trailer {p['trailer_num']}: python {p['depot_id']}, numpy {n['depot_id']}")
+    if python_result[1] != numpy_result[1]:
+        differences.append("Depot summaries differ")
+    return differences
+
+
+if __name__ == "__main__":
+    import sys
+    from datetime import datetime
+    from app.database import SessionLocal
+
+    if len(sys.argv) != 3 or sys.argv[1] != "compare":
+        print("Usage: python -m app.routing compare YYYY-MM-DD")
+        sys.exit(2)
+
+    db = SessionLocal()
+    compare_date = datetime.strptime(sys.argv[2], "%Y-%m-%d").date()
+    differences = compare_engines(db, compare_date)
+    db.close()
+
+    if differences:
+        print(f"Engines disagree on {compare_date}:")
+        for d in differences:
+            print(f"  {d}")
+        sys.exit(1)
+    print(f"Engines agree on {compare_date}.")
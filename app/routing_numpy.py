@@ -0,0 +1,106 @@
+import numpy as np
+from app.routing import (
+    CapacityLedger, RoutingContext, nearest_open_depot, trailer_arrival
+)
+
+
+class NumpyRoutingTables:
+    """Array form of a RoutingContext for the vectorised engine.
+
+    Depots are indexed in context order. Each CP's ranked candidate list is
+    turned into an array of depot indices and the arrival offset to each on
+    first use, so a trailer's arrival time and arrival slot at every
+    candidate depot come from a handful of array operations.
+    """
+
+    def __init__(self, context: RoutingContext):
+        self.context = context
+        depot_ids = [d.depot_id for d in context.depots]
+        self.depot_ids = depot_ids
+        self.depot_index = {did: i for i, did in enumerate(depot_ids)}
+        self.cutoff = np.array([context.depot_windows[did][1] for did in depot_ids], dtype=np.int64)
+        self._rows = {}
+
+    @classmethod
+    def for_context(cls, context: RoutingContext):
+        """Build once per context and keep the tables on it"""
+        tables = getattr(context, "_numpy_tables", None)
+        if tables is None:
+            tables = cls(context)
+            context._numpy_tables = tables
+        return tables
+
+    def candidates(self, cpid):
+        """Ranked candidate depot indices for a CP, the arrival offset to each and how much of the ranked list they cover"""
+        row = self._rows.get(cpid)
+        if row is None:
+            depot_ids, _, offsets = self.context.ranked_depots(cpid)
+
+            # Inactive depots are dropped from the candidates; the python engine skips them too
+            pairs = [(self.depot_index[did], offset) for did, offset in zip(depot_ids, offsets) if did in self.depot_index]
+            candidates = np.array([p[0] for p in pairs], dtype=np.int64)
+            offset = np.array([p[1] for p in pairs], dtype=np.int64)
+            row = (candidates, offset, len(depot_ids))
+            self._rows[cpid] = row
+        return row
+
+
+def allocate_trailers_numpy(context: RoutingContext, trailers, override_map, ledger: CapacityLedger):
+    """Greedy nearest-first allocation with vectorised feasibility checks.
+
+    Same contract as routing.allocate_trailers. Arrival times and arrival
+    slots are computed once per (CP, collection time) over every candidate
+    depot; each trailer then needs one lookup into the ledger's headroom, and
+    the ledger is still booked trailer by trailer so the greedy order holds.
+    """
+    tables = NumpyRoutingTables.for_context(context)
+    depot_base_capacities = ledger.depot_base_capacities
+    base = np.array([depot_base_capacities.get(did, 0) for did in tables.depot_ids], dtype=np.int64)
+
+    assignments = []
+    group_key = None
+    candidates = slots = open_mask = None
+
+    for cpid, cp_name, trailer_num, trailer_parcels, collection_mins in trailers:
+        override_key = (cpid, trailer_num, collection_mins)
+
+        if override_key in override_map:
+            assigned_depot_id = override_map[override_key]
+            ledger.add(assigned_depot_id, trailer_arrival(context, cpid, collection_mins, assigned_depot_id), trailer_parcels)
+            assignments.append((assigned_depot_id, True, False))
+            continue
+
+        if group_key != (cpid, collection_mins):
+            group_key = (cpid, collection_mins)
+            candidates, offsets, ranked_count = tables.candidates(cpid)
+            arrival = collection_mins + offsets
+            open_mask = (base[candidates] > 0) & (arrival < tables.cutoff[candidates])
+            slots = ledger.slots(candidates, arrival)
+
+        assigned_depot_id = None
+        is_peak_arrival = False
+
+        if len(candidates):
+            fits = open_mask & (ledger.headroom[candidates, slots] >= trailer_parcels)
+            hit = np.flatnonzero(fits)
+            if len(hit):
+                assigned_depot_id = tables.depot_ids[candidates[hit[0]]]
+
+        if not assigned_depot_id and context.depot_index is not None:
+            # Spatial candidates all full: widen the search one depot at a time
+            for depot_id, _, offset in context.iter_ranked(cpid, start=ranked_count):
+                if depot_base_capacities.get(depot_id, 0) <= 0:
+                    continue
+                if ledger.fits(depot_id, collection_mins + offset, trailer_parcels):
+                    assigned_depot_id = depot_id
+                    break
+
+        if not assigned_depot_id:
+            assigned_depot_id, is_peak_arrival = nearest_open_depot(context, cpid, depot_base_capacities)
+
+        if assigned_depot_id:
+            ledger.add(assigned_depot_id, trailer_arrival(context, cpid, collection_mins, assigned_depot_id), trailer_parcels)
+
+        assignments.append((assigned_depot_id, False, is_peak_arrival))
+
+    return assignments
@@ -0,0 +1,52 @@
+from app.distances import haversine_miles
+import numpy as np
+
+
+def unit_vectors(latitudes, longitudes):
+    """Points on the unit sphere; straight-line distance between them orders pairs as great-circle distance does"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class DepotIndex:
+    """KD-tree over depot locations for nearest-depot queries.
+
+    Depots are stored as unit vectors, so the tree's nearest neighbours by
+    chord length are the nearest by haversine distance. Candidates come back
+    ranked and with distances worked out exactly as the stored
+    CPDepotDistance rows are, so routing over them gives the same result.
+    """
+
+    def __init__(self, depot_ids, latitudes, longitudes):
+        from scipy.spatial import cKDTree
+
+        self.depot_ids = list(depot_ids)
+        self.latitudes = list(latitudes)
+        self.longitudes = list(longitudes)
+        self.tree = cKDTree(unit_vectors(self.latitudes, self.longitudes)) if self.depot_ids else None
+
+    def __len__(self):
+        return len(self.depot_ids)
+
+    def nearest(self, latitude, longitude, k):
+        """Up to the k nearest depots to a point as (depot_ids, distances in miles), nearest first"""
+        k = min(k, len(self.depot_ids))
+        if k <= 0:
+            return (), ()
+
+        point = unit_vectors([latitude], [longitude])[0]
+        if k < len(self.depot_ids):
+            # One extra so depots tied at the boundary are either all in or all out,
+            # keeping every list a prefix of the full ranking
+            chord, found = self.tree.query(point, k=k + 1)
+            found = found[chord < chord[-1]]
+        else:
+            _, found = self.tree.query(point, k=k)
+            found = np.atleast_1d(found)
+
+        ranked = sorted(
+            (haversine_miles(latitude, longitude, self.latitudes[i], self.longitudes[i]), i)
+            for i in found
+        )
+        return tuple(self.depot_ids[i] for _, i in ranked), tuple(round(dist, 2) for dist, _ in ranked)
@@ -0,0 +1,47 @@
+from datetime import datetime, time
+import numbers
+
+# Times are stored as whole minutes since midnight and only formatted as HH:MM for display
+DEFAULT_COLLECTION_MINUTES = 9 * 60
+DEFAULT_SORTATION_START_MINUTES = 8 * 60
+DEFAULT_CUTOFF_MINUTES = 18 * 60
+
+
+def parse_minutes(value, past_midnight: bool = False):
+    """Minutes since midnight from HH:MM, HH:MM:SS, HHMM, a time or an Excel day fraction. Raises ValueError.
+
+    past_midnight accepts hours beyond 23, as arrival times have.
+    """
+    if isinstance(value, (datetime, time)):
+        return value.hour * 60 + value.minute
+    if isinstance(value, float) and 0 <= value < 1:
+        return int(round(value * 24 * 60)) % (24 * 60)
+    if isinstance(value, numbers.Real) and float(value).is_integer():
+        value = f"{int(value):04d}"  # 900 read as a number from 0900, including numpy integers from a DataFrame
+
+    text = str(value).strip()
+    if ':' in text:
+        parts = text.split(':')
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Invalid time '{value}'")
+        hours, minutes = parts[0], parts[1]
+    elif len(text) == 4:
+        hours, minutes = text[:2], text[2:]
+    else:
+        raise ValueError(f"Invalid time '{value}'")
+
+    if not (hours.isdigit() and minutes.isdigit() and len(minutes) == 2):
+        raise ValueError(f"Invalid time '{value}'")
+    hours, minutes = int(hours), int(minutes)
+    if (hours > 23 and not past_midnight) or minutes > 59:
+        raise ValueError(f"Invalid time '{value}'")
+    return hours * 60 + minutes
+
+
+def format_minutes(mins):
+    """HH:MM for minutes since midnight; past midnight keeps counting hours (25:10)"""
+    if mins is None:
+        return ""
+    h = int(mins // 60)
+    m = int(mins % 60)
+    return f"{h:02d}:{m:02d}"
@@ -0,0 +1,199 @@
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models import CollectionPoint, DailyVolume
+from app.times import DEFAULT_COLLECTION_MINUTES, parse_minutes
+import pandas as pd
+
+REQUIRED_COLUMNS = ['Date', 'CPID', 'Parcels', 'Trailers']
+TIME_COLUMN = 'Collection Time'
+
+# Row errors kept for reporting; the rest are only counted, so a bad file can't grow memory
+MAX_REPORTED_ERRORS = 100
+
+
+class VolumeImport(NamedTuple):
+    """Outcome of importing one volume file"""
+    imported: int
+    skipped: int
+    errors: pd.DataFrame  # Row (source line number), Error; the first MAX_REPORTED_ERRORS
+    dates: set
+    error_count: int = 0
+
+
+def missing_columns(df: pd.DataFrame):
+    """Required columns the file doesn't have, after trimming header whitespace"""
+    df.columns = [str(c).strip() for c in df.columns]
+    return [c for c in REQUIRED_COLUMNS if c not in df.columns]
+
+
+def parse_collection_times(values: pd.Series):
+    """Parse each distinct collection time once and map the result back; None where invalid"""
+    parsed = {}
+    for value in values.dropna().unique():
+        try:
+            parsed[value] = parse_minutes(value)
+        except ValueError:
+            parsed[value] = None
+    return values.map(parsed)
+
+
+def parse_dates(values: pd.Series):
+    """Dates parsed in one pass, with a per-value retry for lines in a different format from the rest"""
+    parsed = pd.to_datetime(values, errors='coerce')
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors='coerce', format='mixed')
+    return parsed.dt.date
+
+
+def normalise_volumes(df: pd.DataFrame, known_cpids):
+    """Validate a volume DataFrame column by column.
+
+    df is indexed by source line number, as the app.readers iterators yield
+    it. Returns (rows, errors): rows has date, cpid, parcels, trailers,
+    collection_minutes and row columns for every valid line; errors has the
+    first problem found on each invalid line.
+    """
+    rows = pd.DataFrame({'row': df.index}, index=df.index)
+    rows['date'] = parse_dates(df['Date'])
+    rows['cpid'] = df['CPID'].astype(str).str.strip()
+    parcels = pd.to_numeric(df['Parcels'], errors='coerce')
+    trailers = pd.to_numeric(df['Trailers'], errors='coerce')
+
+    if TIME_COLUMN in df.columns:
+        times = df[TIME_COLUMN]
+        minutes = parse_collection_times(times)
+        bad_time = times.notna() & minutes.isna()
+        rows['collection_minutes'] = minutes.fillna(DEFAULT_COLLECTION_MINUTES)
+    else:
+        bad_time = pd.Series(False, index=df.index)
+        rows['collection_minutes'] = DEFAULT_COLLECTION_MINUTES
+
+    # Checked in order; each line reports the first that fails
+    checks = [
+        (rows['date'].isna(), "Invalid date"),
+        (~rows['cpid'].isin(known_cpids), None),
+        (parcels.isna() | (parcels < 0), "Invalid parcels"),
+        (trailers.isna() | (trailers < 0), "Invalid trailers"),
+        (bad_time, "Invalid collection time"),
+    ]
+    messages = pd.Series(None, index=df.index, dtype=object)
+    for failed, message in checks:
+        failed = failed & messages.isna()
+        if message is None:
+            messages[failed] = "CPID '" + rows.loc[failed, 'cpid'] + "' not found"
+        else:
+            messages[failed] = message
+
+    invalid = messages.notna()
+    errors = pd.DataFrame({'Row': rows.loc[invalid, 'row'], 'Error': messages[invalid]})
+
+    rows['parcels'] = parcels
+    rows['trailers'] = trailers
+    rows = rows[~invalid].astype({'parcels': 'int64', 'trailers': 'int64', 'collection_minutes': 'int64'})
+    return rows, errors.reset_index(drop=True)
+
+
+def upsert_statement(db: Session, replace: bool = False):
+    """INSERT for DailyVolume that resolves a clash on (date, cpid) in the database.
+
+    Without replace, clashing lines are left out; with it, they overwrite
+    the stored volume. Both rely on the unique index over (date, cpid), so
+    concurrent imports can't both insert the same pair.
+    """
+    statement = dialect_insert(db, DailyVolume)
+    if not replace:
+        return statement.on_conflict_do_nothing(index_elements=['date', 'cpid'])
+    return statement.on_conflict_do_update(
+        index_elements=['date', 'cpid'],
+        set_={
+            column: statement.excluded[column]
+            for column in ('parcels', 'trailers', 'collection_minutes', 'imported_by', 'imported_at')
+        }
+    )
+
+
+def import_volumes(db: Session, df: pd.DataFrame, user_id: int = None, known_cpids=None, replace: bool = False):
+    """Validate and bulk upsert one volume DataFrame, indexed by source line number. Caller commits.
+
+    Lines for a (date, CPID) already stored are skipped, or with replace
+    overwrite the stored volume. When a pair repeats within the frame the
+    first line is kept, or the last with replace. Pass known_cpids when
+    importing several frames to load the CPIDs only once.
+    """
+    if known_cpids is None:
+        known_cpids = {cpid for (cpid,) in db.query(CollectionPoint.cpid).all()}
+
+    rows, errors = normalise_volumes(df, known_cpids)
+    rows = rows.drop_duplicates(subset=['date', 'cpid'], keep='last' if replace else 'first')
+
+    imported_at = datetime.utcnow()
+    records = [
+        {
+            'date': row_date,
+            'cpid': cpid,
+            'parcels': parcels,
+            'trailers': trailers,
+            'collection_minutes': minutes,
+            'imported_by': user_id,
+            'imported_at': imported_at
+        }
+        for row_date, cpid, parcels, trailers, minutes in zip(
+            rows['date'], rows['cpid'], rows['parcels'].tolist(), rows['trailers'].tolist(),
+            rows['collection_minutes'].tolist()
+        )
+    ]
+    written = []
+    if records:
+        # RETURNING gives back only the rows written, so a skipped clash isn't counted
+        written = db.execute(
+            upsert_statement(db, replace).returning(DailyVolume.date), records
+        ).scalars().all()
+
+    return VolumeImport(len(written), len(df) - len(written), errors, set(written), len(errors))
+
+
+def _error_frame(kept):
+    return pd.concat(kept, ignore_index=True) if kept else pd.DataFrame(columns=['Row', 'Error'])
+
+
+def import_volume_chunks(db: Session, chunks, user_id: int = None, progress=None, replace: bool = False):
+    """Import a file streamed as DataFrame chunks, flushing each one as it comes. Caller commits.
+
+    progress, if given, is called after each chunk with the running totals
+    as a VolumeImport; a caller that commits there makes each chunk durable
+    and its progress visible to other sessions. replace is passed to
+    import_volumes for every chunk. Raises ValueError if the
+    file is empty or its first chunk is missing a required column.
+    """
+    known_cpids = {cpid for (cpid,) in db.query(CollectionPoint.cpid).all()}
+    imported = skipped = error_count = 0
+    errors = []
+    dates = set()
+    position = -1
+
+    for position, chunk in enumerate(chunks):
+        if position == 0:
+            missing = missing_columns(chunk)
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(missing)}")
+        else:
+            chunk.columns = [str(c).strip() for c in chunk.columns]
+
+        result = import_volumes(db, chunk, user_id=user_id, known_cpids=known_cpids, replace=replace)
+        imported += result.imported
+        skipped += result.skipped
+        error_count += result.error_count
+        dates |= result.dates
+        kept = sum(len(e) for e in errors)
+        if kept < MAX_REPORTED_ERRORS and not result.errors.empty:
+            errors.append(result.errors.head(MAX_REPORTED_ERRORS - kept))
+        if progress is not None:
+            progress(VolumeImport(imported, skipped, _error_frame(errors), dates, error_count))
+
+    if position < 0:
+        raise ValueError("File has no header row")
+
+    return VolumeImport(imported, skipped, _error_frame(errors), dates, error_count)
@@ -0,0 +1,300 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app.allocation_cache import bump_data_version
+from app.database import DATABASE_URL, SessionLocal
+from app.import_jobs import OWNER, file_sha256, find_repeat, owner_gone, process_import_job, repeat_message
+from app.models import AuditLog, ImportJob
+from app.plans import refresh_plans
+from app.readers import FILE_FORMATS
+import errno
+import json
+import os
+import shutil
+import time
+
+# Configuration for watched folder
+WATCHED_FOLDER_INCOMING = os.getenv("WATCHED_FOLDER_INCOMING", "C:/VolumeImports/Incoming")
+WATCHED_FOLDER_PROCESSED = os.getenv("WATCHED_FOLDER_PROCESSED", "C:/VolumeImports/Processed")
+WATCHED_FOLDER_ERRORS = os.getenv("WATCHED_FOLDER_ERRORS", "C:/VolumeImports/Errors")
+
+# Seconds between scans of the incoming folder
+WATCHED_FOLDER_INTERVAL_SECONDS = int(os.getenv("WATCHED_FOLDER_INTERVAL_SECONDS", "300"))
+
+# Files modified more recently than this may still be being written, so wait for the next scan
+WATCHED_FOLDER_SETTLE_SECONDS = int(os.getenv("WATCHED_FOLDER_SETTLE_SECONDS", "10"))
+
+# Files imported at once; SQLite allows one writer, so it always gets one
+WATCHED_FOLDER_WORKERS = 1 if DATABASE_URL.startswith("sqlite") else int(os.getenv("WATCHED_FOLDER_WORKERS", "4"))
+
+# Whether folder imports overwrite volumes already stored rather than skipping them
+WATCHED_FOLDER_REPLACE = os.getenv("WATCHED_FOLDER_REPLACE", "false").lower() == "true"
+
+# Files are renamed into this subfolder of Incoming while imported, so no other scan takes them.
+# Each process claims into a subfolder of it named after its OWNER.
+CLAIMED_FOLDER = ".processing"
+
+_scheduler = None
+
+
+def move_atomic(path: str, folder: str):
+    """Move a file into folder without it ever appearing there half written. Returns the new path.
+
+    A rename is atomic on one filesystem. Across filesystems the file is
+    copied under a hidden name first and renamed into place. An existing
+    file of the same name is kept and the new one gets a timestamp suffix.
+    """
+    os.makedirs(folder, exist_ok=True)
+    name = os.path.basename(path)
+    target = os.path.join(folder, name)
+    if os.path.exists(target):
+        stem, extension = os.path.splitext(name)
+        target = os.path.join(folder, f"{stem}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}{extension}")
+
+    try:
+        os.rename(path, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        partial = os.path.join(folder, f".{os.path.basename(target)}.partial")
+        shutil.copy2(path, partial)
+        os.replace(partial, target)
+        os.remove(path)
+    return target
+
+
+def _error_report(path: str, job: ImportJob):
+    """Write the failure and any row errors next to a file moved to Errors"""
+    with open(f"{path}.errors.txt", "w") as report:
+        report.write(f"{job.filename}: {job.message}\n")
+        for row, message in json.loads(job.errors or "[]"):
+            report.write(f"Row {row}: {message}\n")
+
+
+def ready_files(incoming: str = None):
+    """Files in incoming that have stopped changing, oldest first, skipping hidden and Office lock files"""
+    incoming = incoming or WATCHED_FOLDER_INCOMING
+    if not os.path.isdir(incoming):
+        return []
+
+    settled = time.time() - WATCHED_FOLDER_SETTLE_SECONDS
+    files = []
+    for entry in os.scandir(incoming):
+        if not entry.is_file() or entry.name.startswith((".", "~$")):
+            continue
+        modified = entry.stat().st_mtime
+        if modified <= settled:
+            files.append((modified, entry.path))
+    return [path for _, path in sorted(files)]
+
+
+def _claim(path: str):
+    """Rename a file into this process's claimed folder; None if another scan got there first"""
+    try:
+        return move_atomic(path, os.path.join(os.path.dirname(path), CLAIMED_FOLDER, OWNER))
+    except FileNotFoundError:
+        return None
+
+
+def import_file(path: str):
+    """Import one claimed file as a folder ImportJob, then move it to Processed or Errors.
+
+    A file whose contents were already imported in the same mode is not
+    read again; its job is marked Duplicate and the file moved to Processed.
+    Any error is recorded on the job and the file moved to Errors, so one
+    bad file never stops the rest of a scan. Returns (job id, status,
+    dates that received rows). Plans are left for the caller to refresh
+    once every file in the scan is in.
+    """
+    filename = os.path.basename(path)
+    mode = "replace" if WATCHED_FOLDER_REPLACE else "skip"
+    dates = set()
+    job = None
+    db = SessionLocal()
+    try:
+        sha256 = file_sha256(path)
+        repeat = find_repeat(db, sha256, mode)
+        if repeat is None:
+            job = ImportJob(
+                filename=filename, source="folder", owner=OWNER, spool_path=path, mode=mode, sha256=sha256,
+                status="Running", started_at=datetime.utcnow()
+            )
+            db.add(job)
+            try:
+                db.commit()
+            except IntegrityError:
+                # An upload or another scan of the same contents got in after the check
+                db.rollback()
+                job = None
+                repeat = find_repeat(db, sha256, mode)
+
+        extension = os.path.splitext(filename)[1].lower()
+        if job is None:
+            # Stored as Duplicate from the start; a Running row would clash with the unique index
+            job = ImportJob(
+                filename=filename, source="folder", owner=OWNER, spool_path=path, mode=mode, sha256=sha256,
+                status="Duplicate", message=repeat_message(repeat),
+                started_at=datetime.utcnow(), finished_at=datetime.utcnow()
+            )
+            db.add(job)
+            db.add(AuditLog(
+                action_type="VOLUME_IMPORT_DUPLICATE",
+                entity_type="DailyVolume",
+                entity_id=filename,
+                new_value=job.message
+            ))
+            db.commit()
+        elif extension in FILE_FORMATS:
+            dates = process_import_job(db, job, refresh=False)
+        else:
+            _fail(db, job, f"Unsupported file type '{extension}'")
+
+        if job.status in ("Completed", "Duplicate"):
+            job.spool_path = move_atomic(path, WATCHED_FOLDER_PROCESSED)
+        else:
+            job.spool_path = move_atomic(path, WATCHED_FOLDER_ERRORS)
+            _error_report(job.spool_path, job)
+        db.commit()
+        return job.id, job.status, dates
+    except Exception as e:
+        db.rollback()
+        job = _fail(db, job or ImportJob(filename=filename, source="folder", owner=OWNER, mode=mode), str(e))
+        if os.path.exists(path):
+            job.spool_path = move_atomic(path, WATCHED_FOLDER_ERRORS)
+            _error_report(job.spool_path, job)
+            db.commit()
+        # Rows committed before the error stay imported, so their dates still need refreshing
+        return job.id, job.status, dates
+    finally:
+        db.close()
+
+
+def _fail(db, job: ImportJob, message: str):
+    """Mark a folder job Failed with an audit entry, and commit"""
+    job.status = "Failed"
+    job.message = message
+    job.finished_at = datetime.utcnow()
+    db.add(job)
+    db.add(AuditLog(
+        action_type="VOLUME_IMPORT_FAILED",
+        entity_type="DailyVolume",
+        entity_id=job.filename,
+        new_value=message
+    ))
+    db.commit()
+    return job
+
+
+def _import_claimed(path: str):
+    """import_file for the scan's pool; a failure to even record the error leaves the file for recovery.
+
+    That case is written to the audit log on a fresh session, since the
+    scan runs in the scheduler's thread where nothing printed is seen.
+    """
+    try:
+        return import_file(path)
+    except Exception as e:
+        filename = os.path.basename(path)
+        message = f"Left in {os.path.join(CLAIMED_FOLDER, OWNER)} until a restart recovers it: {e}"
+        db = SessionLocal()
+        try:
+            db.add(AuditLog(
+                action_type="VOLUME_IMPORT_FAILED",
+                entity_type="DailyVolume",
+                entity_id=filename,
+                new_value=message
+            ))
+            db.commit()
+        except Exception:
+            # The database is what failed; the console is all that is left
+            print(f"Watched folder: {filename}: {message}")
+        finally:
+            db.close()
+        return None, "Failed", set()
+
+
+def scan_incoming():
+    """Claim every settled file in Incoming and import them in parallel. Returns (job id, status) per file."""
+    claimed = [c for c in (_claim(path) for path in ready_files()) if c]
+    if not claimed:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(WATCHED_FOLDER_WORKERS, len(claimed))) as pool:
+        outcomes = list(pool.map(_import_claimed, claimed))
+
+    # Plans are refreshed once for the whole scan, so files sharing a date don't route it twice
+    dates = set().union(*(d for _, _, d in outcomes))
+    if dates:
+        db = SessionLocal()
+        try:
+            bump_data_version(db)
+            db.commit()
+            refresh_plans(db, sorted(dates))
+        finally:
+            db.close()
+    return [(job_id, status) for job_id, status, _ in outcomes]
+
+
+def recover_claimed_files():
+    """Put files that exited processes were importing back in Incoming, failing their jobs.
+
+    Every worker calls this at startup, so files claimed by processes still
+    running, here or on another host, are left to them.
+    """
+    claimed_folder = os.path.join(WATCHED_FOLDER_INCOMING, CLAIMED_FOLDER)
+    db = SessionLocal()
+    try:
+        for job in db.query(ImportJob).filter(ImportJob.source == "folder", ImportJob.status == "Running"):
+            if not owner_gone(job.owner):
+                continue
+            job.status = "Failed"
+            job.message = "Interrupted by a restart; the file was returned to Incoming"
+            job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+    if not os.path.isdir(claimed_folder):
+        return
+    for entry in os.scandir(claimed_folder):
+        if entry.is_dir() and owner_gone(entry.name):
+            for claimed in os.scandir(entry.path):
+                if claimed.is_file() and not claimed.name.endswith(".partial"):
+                    move_atomic(claimed.path, WATCHED_FOLDER_INCOMING)
+            try:
+                os.rmdir(entry.path)
+            except OSError:
+                pass  # A partial copy is still in it
+        elif entry.is_file() and not entry.name.endswith(".partial"):
+            # Claimed before files were kept per owner
+            move_atomic(entry.path, WATCHED_FOLDER_INCOMING)
+
+
+def start_watcher():
+    """Scan Incoming every WATCHED_FOLDER_INTERVAL_SECONDS in a background scheduler thread"""
+    global _scheduler
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    if _scheduler is not None:
+        return _scheduler
+    recover_claimed_files()
+    _scheduler = BackgroundScheduler()
+    _scheduler.add_job(
+        scan_incoming, "interval", seconds=WATCHED_FOLDER_INTERVAL_SECONDS,
+        id="watched_folder", max_instances=1, coalesce=True, next_run_time=datetime.now()
+    )
+    _scheduler.start()
+    return _scheduler
+
+
+def stop_watcher():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+
+
+if __name__ == "__main__":
+    # One scan, for running from cron instead of inside the web process
+    for job_id, status in scan_incoming():
+        print(f"Job {job_id}: {status}")
@@ -1,11 +1,15 @@
-import pandas as pd
+from sqlalchemy import insert
+from app.allocation_cache import bump_data_version
 from app.database import SessionLocal, engine, Base
 from app.models import Depot, CollectionPoint, CPDepotDistance, User
 from app.auth import get_password_hash
-from math import radians, sin, cos, sqrt, atan2
+from app.distance_artifact import build_artifact
+from app.distances import rebuild_distances
+from app.init_db import upgrade_schema
+from app.readers import iter_xlsx_chunks
 
 # Create tables
-Base.metadata.create_all(bind=engine)
+upgrade_schema()
 
 db = SessionLocal()
 
@@ -20,62 +24,53 @@ if existing_depots > 0:
 
 # Load Depots
 print("Loading depots...")
-depots_df = pd.read_excel(r"C:\PowerBI God Forsaken Files\Depot Listing D numbers with Capacities.xlsx")
-for _, row in depots_df.iterrows():
-    depot = Depot(
-        depot_id=str(row.iloc[0]).strip(),
-        name=str(row.iloc[1]).strip(),
-        latitude=float(row.iloc[2]),
-        longitude=float(row.iloc[3]),
-        daily_capacity=int(row.iloc[4]),
-        is_active=True
-    )
-    db.add(depot)
+count = 0
+for chunk in iter_xlsx_chunks(r"C:\PowerBI God Forsaken Files\Depot Listing D numbers with Capacities.xlsx"):
+    if chunk.empty:
+        continue
+    db.execute(insert(Depot), [
+        {
+            'depot_id': str(row[0]).strip(),
+            'name': str(row[1]).strip(),
+            'latitude': float(row[2]),
+            'longitude': float(row[3]),
+            'daily_capacity': int(row[4]),
+            'is_active': True
+        }
+        for row in chunk.itertuples(index=False)
+    ])
+    count += len(chunk)
 db.commit()
-print(f"Loaded {len(depots_df)} depots")
+print(f"Loaded {count} depots")
 
 # Load Collection Points
 print("Loading collection points...")
-cps_df = pd.read_excel(r"C:\PowerBI God Forsaken Files\CPID list with Lon And Lat.xlsx")
-for _, row in cps_df.iterrows():
-    cp = CollectionPoint(
-        cpid=str(row.iloc[0]).strip(),
-        name=str(row.iloc[1]).strip(),
-        latitude=float(row.iloc[2]),
-        longitude=float(row.iloc[3]),
-        is_active=True
-    )
-    db.add(cp)
+count = 0
+for chunk in iter_xlsx_chunks(r"C:\PowerBI God Forsaken Files\CPID list with Lon And Lat.xlsx"):
+    if chunk.empty:
+        continue
+    db.execute(insert(CollectionPoint), [
+        {
+            'cpid': str(row[0]).strip(),
+            'name': str(row[1]).strip(),
+            'latitude': float(row[2]),
+            'longitude': float(row[3]),
+            'is_active': True
+        }
+        for row in chunk.itertuples(index=False)
+    ])
+    count += len(chunk)
 db.commit()
-print(f"Loaded {len(cps_df)} collection points")
+print(f"Loaded {count} collection points")
 
 # Calculate distances
-print("Calculating distances (this may take a minute)...")
-def haversine(lat1, lon1, lat2, lon2):
-    R = 3959
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1)*cos(lat2)*sin(dlon/2)**2
-    return R * 2 * atan2(sqrt(a), sqrt(1-a))
-
-depots = db.query(Depot).all()
-cps = db.query(CollectionPoint).all()
-
-for i, cp in enumerate(cps):
-    distances = []
-    for d in depots:
-        dist = haversine(cp.latitude, cp.longitude, d.latitude, d.longitude)
-        distances.append((d.depot_id, dist))
-    distances.sort(key=lambda x: x[1])
-    for rank, (depot_id, dist) in enumerate(distances, 1):
-        db.add(CPDepotDistance(cpid=cp.cpid, depot_id=depot_id, distance_miles=round(dist, 2), rank=rank))
-    if (i + 1) % 50 == 0:
-        print(f"  Processed {i + 1}/{len(cps)} collection points...")
-        db.commit()
-
+print("Calculating distances...")
+count = rebuild_distances(db)
+print(f"Distances calculated! ({count} records)")
+build_artifact(db)
+# Running web workers drop cached routing and re-route draft plans on their next lookup
+bump_data_version(db)
 db.commit()
-print("Distances calculated!")
 
 # Make sure admin user exists
 admin = db.query(User).filter(User.username == "admin").first()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import create_engine, text
+from app.database import Base
+from app.migrations import upgrade
+from app.query_plans import check_query_plans
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+
+# The database committed with the repo, which predates most of the schema
+LEGACY_DATABASE = os.path.join(os.path.dirname(__file__), os.pardir, "freight_routing.db")
+
+
+class QueryPlanTests(unittest.TestCase):
+    """Every hot query must be answered from an index once the schema is upgraded"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "plans.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _upgrade(self):
+        engine = create_engine(f"sqlite:///{self.path}")
+        self.addCleanup(engine.dispose)
+        # As upgrade_schema does on deploy: new tables first, then the revisions
+        Base.metadata.create_all(bind=engine)
+        upgrade(engine)
+        return engine
+
+    def assertIndexedPlans(self, engine):
+        for name, plan, problems in check_query_plans(engine):
+            with self.subTest(query=name):
+                self.assertEqual(problems, [], f"{name}: {plan}")
+
+    def test_fresh_database(self):
+        engine = self._upgrade()
+        self.assertIndexedPlans(engine)
+        self.assertEqual(upgrade(engine), [])
+
+    @unittest.skipUnless(os.path.exists(LEGACY_DATABASE), "freight_routing.db not present")
+    def test_upgraded_legacy_database(self):
+        shutil.copy(LEGACY_DATABASE, self.path)
+        engine = self._upgrade()
+        self.assertIndexedPlans(engine)
+        self.assertEqual(upgrade(engine), [])
+
+    def test_missing_index_is_reported(self):
+        engine = self._upgrade()
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_cp_depot_distances_cpid_rank"))
+        # A pooled SQLite connection can keep planning against the schema it last read
+        engine.dispose()
+        failing = {name for name, _, problems in check_query_plans(engine) if problems}
+        self.assertEqual(failing, {"ranked distances", "ranked distances for a CP"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from app.readers import iter_chunks
+from app.volume_import import normalise_volumes
+
+# Zero-padded HHMM collection times, as a spreadsheet or upstream system writes them
+TIMES = ["0900", "0745", "1400"]
+MINUTES = [9 * 60, 7 * 60 + 45, 14 * 60]
+CPIDS = ["CP001", "CP002", "CP003"]
+
+
+class ZeroPaddedTimeTests(unittest.TestCase):
+    """Every line of a file whose collection times are all HHMM imports, whichever reader parses it"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def assertTimesImported(self, filename):
+        rows, errors = normalise_volumes(next(iter_chunks(os.path.join(self.folder, filename), filename)), set(CPIDS))
+        self.assertTrue(errors.empty, errors)
+        self.assertEqual(list(rows['collection_minutes']), MINUTES)
+
+    def test_csv(self):
+        with open(os.path.join(self.folder, "volumes.csv"), "w") as f:
+            f.write("Date,CPID,Parcels,Trailers,Collection Time\n")
+            f.writelines(f"2027-01-04,{cpid},100,1,{t}\n" for cpid, t in zip(CPIDS, TIMES))
+        self.assertTimesImported("volumes.csv")
+
+    def test_ndjson(self):
+        # Written as JSON numbers, the way 0900 comes out of a numeric column upstream
+        with open(os.path.join(self.folder, "volumes.ndjson"), "w") as f:
+            f.writelines(
+                f'{{"Date": "2027-01-04", "CPID": "{cpid}", "Parcels": 100, "Trailers": 1, "Collection Time": {int(t)}}}\n'
+                for cpid, t in zip(CPIDS, TIMES)
+            )
+        self.assertTimesImported("volumes.ndjson")
+
+    def test_xlsx(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["Date", "CPID", "Parcels", "Trailers", "Collection Time"])
+        for cpid, t in zip(CPIDS, TIMES):
+            sheet.append(["2027-01-04", cpid, 100, 1, int(t)])
+        workbook.save(os.path.join(self.folder, "volumes.xlsx"))
+        self.assertTimesImported("volumes.xlsx")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow not installed")
+    def test_parquet(self):
+        pd.DataFrame({
+            "Date": ["2027-01-04"] * 3, "CPID": CPIDS, "Parcels": [100] * 3, "Trailers": [1] * 3,
+            "Collection Time": [int(t) for t in TIMES],
+        }).to_parquet(os.path.join(self.folder, "volumes.parquet"))
+        self.assertTimesImported("volumes.parquet")
+
+
+if __name__ == "__main__":
+    unittest.main()